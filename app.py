@@ -1,14 +1,25 @@
 import streamlit as st
+import hashlib
 import os
+import uuid
 from datetime import datetime
+from pathlib import Path
+from typing import Optional, Tuple
 import json
-import time
-import pandas as pd
 
-from utils.pdf import extract_text_from_pdf
-from utils.ai import get_ai_feedback, parse_scores_enhanced, extract_enhanced_feedback
+from utils.ai import PARSE_STATS, failed_categories
+from utils.resilience import LLM_STATS
+from utils.resubmission import RESUBMISSION_STATS
+from utils.routing import ROUTING_STATS
+from utils.chunked import DEFAULT_CHUNK_TOKENS
+from utils.evaluation import EVALUATION_FLIGHTS, EvaluationRequest, run_evaluation
+from utils.jobs import JobRejected, get_job_manager
+from utils.pdf import EXTRACTION_FLIGHTS
 from utils.visuals import create_enhanced_radar_chart, create_score_history_chart
-from utils.helpers import get_score_color_class, calculate_weighted_score, get_file_hash
+from utils.cache import get_evaluation_cache
+from utils.helpers import DEFAULT_CATEGORIES, get_score_color_class
+from utils.history import HISTORY_PAGE_SIZE, get_history_store
+from utils.timing import TIMINGS, StageTimer
 
 # Page Config - Must be first
 st.set_page_config(
@@ -17,316 +28,78 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-# Clean CSS for embedding
+# Clean CSS for embedding, kept in static/scorescope.css
+STYLESHEET = Path(__file__).parent / "static" / "scorescope.css"
+
+@st.cache_resource
+def _stylesheet() -> Tuple[str, str]:
+    css = STYLESHEET.read_text(encoding="utf-8")
+    return css, hashlib.md5(css.encode("utf-8")).hexdigest()[:10]
+
 def load_clean_css():
-    st.markdown("""
-    <style>
-    /* Hide all Streamlit branding and UI elements */
-    #MainMenu {visibility: hidden;}
-    .stDeployButton {display: none;}
-    footer {visibility: hidden;}
-    .stApp > header {visibility: hidden;}
-    header[data-testid="stHeader"] {visibility: hidden;}
-    
-    /* Import Figtree font */
-    @import url('https://fonts.googleapis.com/css2?family=Figtree:wght@300;400;500;600;700;800&display=swap');
-    
-    /* Global app styling */
-    .stApp {
-        background: transparent;
-        font-family: 'Figtree', sans-serif;
-        color: #ffffff;
-    }
-    
-    /* Remove default padding for clean embedding */
-    .block-container {
-        padding-top: 1rem !important;
-        padding-bottom: 1rem !important;
-        max-width: 100% !important;
-    }
-    
-    /* Content cards */
-    .content-card {
-        background: rgba(20, 20, 20, 0.9);
-        border: 1px solid rgba(129, 74, 200, 0.3);
-        border-radius: 16px;
-        padding: 32px;
-        margin-bottom: 24px;
-        backdrop-filter: blur(20px);
-        box-shadow: 0 20px 60px rgba(0, 0, 0, 0.3);
-    }
-    
-    .section-title {
-        font-size: 24px;
-        font-weight: 700;
-        color: #ffffff;
-        margin-bottom: 20px;
-        display: flex;
-        align-items: center;
-        gap: 12px;
-    }
-    
-    .section-icon {
-        width: 32px;
-        height: 32px;
-        background: rgba(129, 74, 200, 0.2);
-        border-radius: 8px;
-        display: flex;
-        align-items: center;
-        justify-content: center;
-        font-size: 16px;
-    }
-    
-    /* Enhanced input styling */
-    .stTextArea textarea {
-        background: rgba(255, 255, 255, 0.05) !important;
-        border: 1px solid rgba(129, 74, 200, 0.4) !important;
-        border-radius: 12px !important;
-        color: rgba(255, 255, 255, 0.9) !important;
-        font-family: 'Figtree', sans-serif !important;
-        font-size: 15px !important;
-        line-height: 1.6 !important;
-        padding: 16px !important;
-        transition: all 0.3s ease !important;
-    }
-    
-    .stTextArea textarea:focus {
-        border-color: #814AC8 !important;
-        box-shadow: 0 0 0 3px rgba(129, 74, 200, 0.2) !important;
-        background: rgba(255, 255, 255, 0.08) !important;
-    }
-    
-    .stTextArea label {
-        color: rgba(255, 255, 255, 0.9) !important;
-        font-weight: 600 !important;
-        font-size: 16px !important;
-        margin-bottom: 8px !important;
-    }
-    
-    /* File uploader styling */
-    .stFileUploader > div {
-        background: rgba(129, 74, 200, 0.08) !important;
-        border: 2px dashed rgba(129, 74, 200, 0.4) !important;
-        border-radius: 16px !important;
-        padding: 32px !important;
-        text-align: center !important;
-        transition: all 0.3s ease !important;
-    }
-    
-    .stFileUploader:hover > div {
-        border-color: #814AC8 !important;
-        background: rgba(129, 74, 200, 0.12) !important;
-        transform: translateY(-2px) !important;
-    }
-    
-    .stFileUploader label {
-        color: rgba(255, 255, 255, 0.9) !important;
-        font-weight: 600 !important;
-        font-size: 16px !important;
-    }
-    
-    /* Premium button styling */
-    .stButton > button {
-        background: linear-gradient(135deg, #814AC8 0%, #5B4FC7 100%) !important;
-        color: white !important;
-        border: none !important;
-        border-radius: 12px !important;
-        padding: 16px 32px !important;
-        font-weight: 700 !important;
-        font-size: 16px !important;
-        font-family: 'Figtree', sans-serif !important;
-        transition: all 0.3s ease !important;
-        box-shadow: 0 8px 32px rgba(129, 74, 200, 0.3) !important;
-        width: 100% !important;
-        height: 56px !important;
-        letter-spacing: 0.5px !important;
-    }
-    
-    .stButton > button:hover {
-        transform: translateY(-3px) !important;
-        box-shadow: 0 12px 40px rgba(129, 74, 200, 0.4) !important;
-        background: linear-gradient(135deg, #9557e5 0%, #6f4fc7 100%) !important;
-    }
-    
-    /* Results styling */
-    .results-container {
-        background: rgba(20, 20, 20, 0.9);
-        border: 1px solid rgba(129, 74, 200, 0.3);
-        border-radius: 20px;
-        padding: 40px;
-        margin: 24px 0;
-        backdrop-filter: blur(20px);
-        box-shadow: 0 24px 80px rgba(0, 0, 0, 0.4);
-    }
-    
-    .score-display {
-        text-align: center;
-        padding: 32px;
-        background: rgba(129, 74, 200, 0.1);
-        border-radius: 20px;
-        border: 1px solid rgba(129, 74, 200, 0.3);
-        margin: 24px 0;
-    }
-    
-    .overall-score {
-        font-size: 64px;
-        font-weight: 800;
-        background: linear-gradient(135deg, #814AC8 0%, #A855F7 100%);
-        -webkit-background-clip: text;
-        -webkit-text-fill-color: transparent;
-        margin: 0;
-        line-height: 1;
-        letter-spacing: -2px;
-    }
-    
-    .score-label {
-        font-size: 16px;
-        color: rgba(255, 255, 255, 0.6);
-        margin-top: 12px;
-        font-weight: 500;
-    }
-    
-    /* Processing animation */
-    .processing-container {
-        text-align: center;
-        padding: 40px;
-        background: rgba(129, 74, 200, 0.05);
-        border-radius: 16px;
-        border: 1px solid rgba(129, 74, 200, 0.2);
-        margin: 24px 0;
-    }
-    
-    .processing-text {
-        font-size: 18px;
-        color: #814AC8;
-        font-weight: 600;
-        margin-bottom: 16px;
-        animation: pulse 2s infinite;
-    }
-    
-    /* Progress bar enhancement */
-    .stProgress > div > div {
-        background: linear-gradient(90deg, #814AC8, #A855F7) !important;
-        border-radius: 10px !important;
-        height: 8px !important;
-    }
-    
-    .stProgress > div {
-        background: rgba(255, 255, 255, 0.1) !important;
-        border-radius: 10px !important;
-        height: 8px !important;
-    }
-    
-    /* Alert styling */
-    .stSuccess {
-        background: rgba(76, 175, 80, 0.1) !important;
-        border: 1px solid rgba(76, 175, 80, 0.3) !important;
-        border-radius: 12px !important;
-        color: #4CAF50 !important;
-        font-weight: 600 !important;
-    }
-    
-    .stInfo {
-        background: rgba(33, 150, 243, 0.1) !important;
-        border: 1px solid rgba(33, 150, 243, 0.3) !important;
-        border-radius: 12px !important;
-        color: #2196F3 !important;
-        font-weight: 600 !important;
-    }
-    
-    .stError {
-        background: rgba(244, 67, 54, 0.1) !important;
-        border: 1px solid rgba(244, 67, 54, 0.3) !important;
-        border-radius: 12px !important;
-        color: #F44336 !important;
-        font-weight: 600 !important;
-    }
-    
-    /* Sidebar styling */
-    .stSidebar {
-        background: rgba(10, 10, 10, 0.95) !important;
-        border-right: 1px solid rgba(129, 74, 200, 0.2) !important;
-    }
-    
-    /* Download button styling */
-    .stDownloadButton > button {
-        background: linear-gradient(135deg, #4CAF50 0%, #45a049 100%) !important;
-        color: white !important;
-        border: none !important;
-        border-radius: 8px !important;
-        padding: 12px 24px !important;
-        font-weight: 600 !important;
-        font-family: 'Figtree', sans-serif !important;
-        transition: all 0.3s ease !important;
-    }
-    
-    .stDownloadButton > button:hover {
-        transform: translateY(-2px) !important;
-        box-shadow: 0 6px 20px rgba(76, 175, 80, 0.3) !important;
-    }
-    
-    /* Expander styling */
-    .streamlit-expanderHeader {
-        background: rgba(255, 255, 255, 0.03) !important;
-        border-radius: 8px !important;
-        border: 1px solid rgba(129, 74, 200, 0.2) !important;
-        color: rgba(255, 255, 255, 0.9) !important;
-        font-weight: 600 !important;
-    }
-    
-    /* Chart container */
-    .stPlotlyChart {
-        background: transparent !important;
-        border-radius: 16px !important;
-    }
-    
-    /* Animations */
-    @keyframes pulse {
-        0%, 100% { opacity: 1; }
-        50% { opacity: 0.6; }
-    }
-    
-    @keyframes slideIn {
-        from {
-            opacity: 0;
-            transform: translateY(20px);
-        }
-        to {
-            opacity: 1;
-            transform: translateY(0);
-        }
-    }
-    
-    .results-container {
-        animation: slideIn 0.6s ease-out;
-    }
-    
-    /* Mobile responsiveness */
-    @media (max-width: 768px) {
-        .content-card {
-            padding: 24px;
-        }
-        
-        .overall-score {
-            font-size: 48px;
-        }
-    }
-    </style>
-    """, unsafe_allow_html=True)
+    # With static serving on, each rerun sends a one-line <link> and the browser caches the file (revalidated
+    # by ETag; the version query changes with the contents). Otherwise fall back to inlining it.
+    css, version = _stylesheet()
+    if st.get_option("server.enableStaticServing"):
+        st.markdown(f'<link rel="stylesheet" href="app/static/scorescope.css?v={version}">', unsafe_allow_html=True)
+    else:
+        st.markdown(f"<style>{css}</style>", unsafe_allow_html=True)
 
 # Load clean styling
 load_clean_css()
 
-# Default categories with weights
-DEFAULT_CATEGORIES = {
-    "Requirements Fulfillment": 25,
-    "Content Quality & Depth": 20,
-    "Clarity & Communication": 18,
-    "Structure & Organization": 15,
-    "Critical Thinking": 12,
-    "Presentation & Format": 10
+# Analysis stages in pipeline order, with the status shown while each one runs
+ANALYSIS_STAGES = {
+    "hashing": "Fingerprinting your submission...",
+    "cache_lookup": "Checking for a previous evaluation...",
+    "coalesced_wait": "Waiting for an identical evaluation already in progress...",
+    "pdf_extraction": "Extracting text from PDF...",
+    "diffing": "Comparing with your previous draft...",
+    "similarity": "Checking for near-identical submissions...",
+    "prompt_build": "Preparing the evaluation...",
+    "llm_call": "Evaluating against requirements...",
+    "repair": "Re-checking categories that could not be read...",
+    "escalation": "Taking a closer look with the larger model...",
+    "parsing": "Generating category scores...",
+    "weighting": "Calculating your overall score...",
+    "chart_rendering": "Rendering charts...",
+}
+
+# Radar chart benchmark options: cohort percentile to draw, or None for the fixed target
+RADAR_BENCHMARKS = {
+    "Cohort median": 50,
+    "Cohort 75th percentile": 75,
+    "Fixed target (7/10)": None,
 }
 
+# Live view of a running job, polled without rerunning the rest of the page; the finished
+# results replace it through a full rerun
+@st.fragment(run_every=1.0)
+def show_job_progress(job_id: str):
+    job = get_job_manager().get(job_id)
+    if job is None or job.done:
+        st.rerun()
+
+    stage = job.stage or "hashing"
+    st.markdown("""
+    <div class="processing-container">
+        <div class="processing-text">Processing your submission...</div>
+    </div>
+    """, unsafe_allow_html=True)
+    st.progress(list(ANALYSIS_STAGES).index(stage) / len(ANALYSIS_STAGES))
+    st.text("Waiting for a free worker..." if job.status == "queued" else ANALYSIS_STAGES[stage])
+
+    scores = dict(job.partial_scores)
+    if scores:
+        st.markdown("### Detailed Category Analysis")
+        if len(scores) >= 3:
+            st.plotly_chart(create_enhanced_radar_chart(scores), use_container_width=True)
+        for category, (score, explanation) in scores.items():
+            with st.expander(f"{category}: {score}/10", expanded=False):
+                st.markdown(f"**Analysis:** {explanation}")
+    if job.partial_summary:
+        st.markdown("### Overall Assessment\n" + job.partial_summary)
+
 # Sidebar configuration (collapsed by default for clean embedding)
 with st.sidebar:
     st.markdown("### Configuration")
@@ -349,8 +122,56 @@ with st.sidebar:
         categories = DEFAULT_CATEGORIES
 
     with st.expander("Advanced Settings"):
-        max_pages = st.slider("Max pages to analyze", 5, 30, 15)
+        max_pages = st.slider("Max pages to analyze", 5, 30, 15,
+                              help="Unless grading in full, the most informative pages are chosen, not the first ones")
         show_raw_response = st.checkbox("Show raw AI response")
+        structured_output = st.checkbox("Structured JSON output", value=False,
+                                        help="Ask the model for schema-constrained JSON instead of free text (not streamed)")
+        stream_results = st.checkbox("Stream results as they arrive", value=True, disabled=structured_output)
+        routed = st.checkbox("Tiered model routing", value=True,
+                             help="Grade with a fast model first and re-grade borderline results with the larger one")
+        repair_unparsed = st.checkbox("Re-ask for unreadable scores", value=True,
+                                      help="Send a short follow-up for any category whose score could not be read, "
+                                           "instead of leaving it out of the overall score")
+        incremental = st.checkbox("Re-grade only what changed in resubmissions", value=True,
+                                  help="A new draft of the same task is compared with your last one; unchanged "
+                                       "categories keep their scores and only the changed passages are re-assessed")
+        reuse_near_duplicates = st.checkbox("Reuse evaluations of near-identical submissions", value=True,
+                                            help="A re-exported or lightly edited copy of a submission already "
+                                                 "graded for this task reuses that evaluation")
+        full_document = st.checkbox("Grade long documents in full", value=True,
+                                    help="Evaluate long submissions in parts and combine the results instead of "
+                                         "grading only the pages that fit one prompt")
+        chunk_tokens = st.slider("Tokens per part", 1000, 8000, DEFAULT_CHUNK_TOKENS, step=500, disabled=not full_document)
+        radar_benchmark = st.selectbox("Radar chart benchmark", list(RADAR_BENCHMARKS),
+                                       help="Compare against other submissions for the same task and rubric")
+        if st.checkbox("Show stage timings"):
+            st.dataframe([{"stage": stage, **stats} for stage, stats in TIMINGS.snapshot().items()],
+                         use_container_width=True)
+            parse_stats = PARSE_STATS.snapshot()
+            st.caption(f"Parsing: {parse_stats['responses']} responses • {parse_stats['failed_categories']} unparsed categories"
+                       f" • {parse_stats['structured_fallbacks']} JSON fallbacks"
+                       f" • {parse_stats['repaired_categories']} repaired in {parse_stats['repairs']} follow-ups")
+            routing_stats = ROUTING_STATS.snapshot()
+            st.caption(f"Routing: {routing_stats['evaluations']} evaluations • {routing_stats['escalation_rate']:.0%} escalated"
+                       f" • p50 {routing_stats['p50_latency_s']:.1f}s • ~${routing_stats['cost_usd']:.2f} spent")
+            llm_stats = LLM_STATS.snapshot()
+            st.caption(f"LLM calls: p50 {llm_stats['p50_s']:.1f}s / p95 {llm_stats['p95_s']:.1f}s / p99 {llm_stats['p99_s']:.1f}s"
+                       f" • {llm_stats['retries']} retries ({llm_stats['timeouts']} timeouts)"
+                       f" • {llm_stats['hedges']} hedged, {llm_stats['hedge_wins']} won • {llm_stats['failures']} failed")
+            resubmission_stats = RESUBMISSION_STATS.snapshot()
+            st.caption(f"Resubmissions: {resubmission_stats['resubmissions']} • {resubmission_stats['reused']} unchanged"
+                       f" • {resubmission_stats['incremental']} re-graded incrementally • {resubmission_stats['full']} in full"
+                       f" • ~{resubmission_stats['tokens_saved']:,} tokens and {resubmission_stats['seconds_saved']:.0f}s saved")
+            from utils.similarity import get_similarity_index  # NumPy stays off the start-up path
+
+            st.caption(f"Similarity index: {get_similarity_index().stats()['entries']} submissions")
+        cache_stats = get_evaluation_cache().stats()
+        st.caption(f"Evaluation cache: {cache_stats['entries']} entries • {cache_stats['total_hits']} hits / {cache_stats['total_misses']} misses")
+        job_stats = get_job_manager().stats()
+        st.caption(f"Evaluation jobs: {job_stats['running']} running • {job_stats['queued']} queued")
+        st.caption(f"Coalesced duplicates: {EVALUATION_FLIGHTS.stats()['coalesced']} API evaluations • "
+                   f"{EXTRACTION_FLIGHTS.stats()['coalesced']} PDF extractions saved")
 
 # Main content area - clean layout for embedding
 col1, col2 = st.columns([1, 1], gap="large")
@@ -389,131 +210,43 @@ with col2:
     if uploaded_pdf:
         st.success(f"Successfully uploaded: {uploaded_pdf.name} ({uploaded_pdf.size / (1024*1024):.1f}MB)")
 
-# Analysis button and results
-if uploaded_pdf and task_outline:
-    if st.button("Analyze with ScoreScope AI", key="analyze_btn"):
-        start_time = time.time()
-        file_hash = get_file_hash(uploaded_pdf)
-
-        # Processing section
-        st.markdown("""
-        <div class="processing-container">
-            <div class="processing-text">Processing your submission...</div>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # Progress tracking
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        
-        steps = [
-            "Extracting text from PDF...",
-            "Analyzing content structure...",
-            "Evaluating against requirements...",
-            "Generating category scores...",
-            "Preparing detailed feedback..."
-        ]
-        
-        for i, step in enumerate(steps):
-            status_text.text(step)
-            progress_bar.progress((i + 1) * 20)
-            time.sleep(0.6)
-        
-        # Extract and analyze
-        submission_text = extract_text_from_pdf(file_hash, uploaded_pdf, max_pages)
-        if not submission_text:
-            st.error("Failed to extract text from PDF. Please try again with a different file.")
-            st.stop()
-
-        ai_response = get_ai_feedback(task_outline, submission_text, categories, eval_style)
-        if ai_response.startswith("ERROR"):
-            st.error(ai_response)
-            st.stop()
-
-        # Parse results
-        scores = parse_scores_enhanced(ai_response, categories)
-        feedback_data = extract_enhanced_feedback(ai_response)
-        weighted_score = calculate_weighted_score(scores, categories)
-        
-        # Clear progress indicators
-        progress_bar.empty()
-        status_text.empty()
-
-        # Display results
-        processing_time = time.time() - start_time
-        
-        st.markdown('<div class="results-container">', unsafe_allow_html=True)
-        
-        # Overall score display
-        st.markdown(f"""
-        <div class="score-display">
-            <div class="overall-score">{weighted_score}/10</div>
-            <div class="score-label">Overall Score • Processed in {processing_time:.1f}s</div>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # Radar chart
-        st.plotly_chart(create_enhanced_radar_chart(scores), use_container_width=True, key="radar_chart")
-        
-        # Detailed category analysis
-        st.markdown("### Detailed Category Analysis")
-        
-        for category, (score, explanation) in scores.items():
-            with st.expander(f"{category}: {score}/10", expanded=False):
-                st.markdown(f"**Weight:** {categories[category]}%")
-                st.markdown(f"**Analysis:** {explanation}")
-        
-        # Overall assessment and action plan
-        st.markdown("### Overall Assessment")
-        st.write(feedback_data["overall"])
-        
-        st.markdown("### Action Plan")
-        for i, action in enumerate(feedback_data["actions"], 1):
-            st.markdown(f"**{i}.** {action}")
-        
-        st.markdown('</div>', unsafe_allow_html=True)
-
-        # Score history tracking
-        if "evaluation_history" not in st.session_state:
-            st.session_state.evaluation_history = []
-        
-        st.session_state.evaluation_history.append({
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M"),
-            "overall_score": weighted_score,
-            **{cat: score for cat, (score, _) in scores.items()}
-        })
-
-        # Show progress over time if multiple evaluations
-        if len(st.session_state.evaluation_history) > 1:
-            st.markdown("### Your Progress Over Time")
-            st.plotly_chart(create_score_history_chart(st.session_state.evaluation_history), use_container_width=True)
-            
-            # History table
-            df_history = pd.DataFrame(st.session_state.evaluation_history)
-            st.dataframe(df_history, use_container_width=True)
-
-        # Export options
-        with st.expander("Export Results", expanded=False):
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                export_data = {
-                    "task": task_outline,
-                    "scores": {cat: score for cat, (score, _) in scores.items()},
-                    "weighted_score": weighted_score,
-                    "feedback": feedback_data,
-                    "processing_time": f"{processing_time:.1f}s",
-                    "timestamp": datetime.now().isoformat()
-                }
-                st.download_button(
-                    "Download JSON",
-                    data=json.dumps(export_data, indent=2),
-                    file_name=f"scorescope_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-                    mime="application/json"
-                )
-            
-            with col2:
-                report = f"""SCORESCOPE EVALUATION REPORT
+# Figures and export blobs are memoized per job, so reruns reuse them instead of rebuilding them
+@st.cache_resource(max_entries=128, show_spinner=False)
+def radar_figure(job_id: str, benchmark: Optional[tuple], benchmark_label: str, _scores: dict, _stage_timings: dict):
+    # The job's first build is timed into its stage breakdown (which the JSON export reports); reruns are cache hits
+    if "chart_rendering" in _stage_timings:
+        return create_enhanced_radar_chart(_scores, dict(benchmark) if benchmark else None, benchmark_label)
+    with StageTimer(durations=_stage_timings).stage("chart_rendering"):
+        return create_enhanced_radar_chart(_scores, dict(benchmark) if benchmark else None, benchmark_label)
+
+@st.cache_resource(max_entries=128, show_spinner=False)
+def history_figure(user_id: str, job_id: str, history_count: int):
+    return create_score_history_chart(get_history_store().series(user_id))
+
+@st.cache_data(max_entries=128, show_spinner=False)
+def export_payloads(job_id: str, _result: dict) -> Tuple[str, str]:
+    request = _result["request"]
+    categories = request["categories"]
+    scores = _result["scores"]
+    feedback_data = _result["feedback"]
+    weighted_score = _result["weighted_score"]
+    processing_time = _result["processing_time"]
+
+    export_data = {
+        "task": request["task_outline"],
+        "scores": {cat: score for cat, (score, _) in scores.items()},
+        "weighted_score": weighted_score,
+        "feedback": feedback_data,
+        "processing_time": f"{processing_time:.1f}s",
+        "stage_timings": {stage: round(seconds, 4) for stage, seconds in _result["stage_timings"].items()},
+        "routing": _result.get("routing"),
+        "repaired_categories": _result.get("repaired", []),
+        "resubmission": _result.get("resubmission"),
+        "similarity": _result.get("similarity"),
+        "timestamp": datetime.now().isoformat()
+    }
+
+    report = f"""SCORESCOPE EVALUATION REPORT
 
 Overall Score: {weighted_score}/10
 Processing Time: {processing_time:.1f}s
@@ -526,18 +259,203 @@ OVERALL ASSESSMENT:
 
 ACTION PLAN:
 """ + "\n".join([f"{i}. {action}" for i, action in enumerate(feedback_data['actions'], 1)])
-                
-                st.download_button(
-                    "Download Report",
-                    data=report,
-                    file_name=f"scorescope_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
-                    mime="text/plain"
-                )
-
-        # Show raw AI response if requested
-        if show_raw_response:
-            with st.expander("Raw AI Response (Debug)"):
-                st.text(ai_response)
 
+    return json.dumps(export_data, indent=2), report
+
+# Each results section is a fragment: its own widgets rerun only that section, not the page
+@st.fragment
+def render_radar(job_id: str, result: dict, radar_benchmark: str):
+    # (imported here: cohort analytics pulls in NumPy and pandas, which the landing page never needs)
+    from utils.cohort import MIN_COHORT_SIZE, cohort_key, get_cohort_analytics
+
+    request = result["request"]
+    scores = result["scores"]
+    cohorts = get_cohort_analytics()
+    cohort = cohort_key(request["task_outline"], request["categories"])
+    cohort_size = cohorts.size(cohort)
+    percentile = RADAR_BENCHMARKS[radar_benchmark]
+    benchmark = cohorts.benchmark(cohort, scores, percentile) if percentile else None
+    benchmark_label = f"{radar_benchmark} (n={cohort_size})" if benchmark else "Target Score"
+    figure = radar_figure(job_id, tuple(benchmark.items()) if benchmark else None, benchmark_label, scores,
+                          result["stage_timings"])
+    st.plotly_chart(figure, use_container_width=True, key="radar_chart")
+    if cohort_size >= MIN_COHORT_SIZE:
+        with st.expander(f"Cohort Statistics ({cohort_size} submissions)", expanded=False):
+            st.dataframe(cohorts.histogram(cohort).summary(), use_container_width=True)
+
+@st.fragment
+def render_history(job_id: str):
+    history = get_history_store()
+    history_count = history.count(user_id)
+
+    # Show progress over time if multiple evaluations
+    if history_count > 1:
+        st.markdown("### Your Progress Over Time")
+        st.plotly_chart(history_figure(user_id, job_id, history_count), use_container_width=True)
+
+        # History table, newest first, one page at a time
+        pages = -(-history_count // HISTORY_PAGE_SIZE)
+        page = st.number_input("History page", min_value=1, max_value=pages, value=1) if pages > 1 else 1
+        st.dataframe(history.page(user_id, page - 1), use_container_width=True)
+
+@st.fragment
+def render_exports(job_id: str, result: dict):
+    results_json, report = export_payloads(job_id, result)
+    with st.expander("Export Results", expanded=False):
+        col1, col2 = st.columns(2)
+
+        # Downloads don't need a rerun at all
+        with col1:
+            st.download_button(
+                "Download JSON",
+                data=results_json,
+                file_name=f"scorescope_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+                mime="application/json",
+                on_click="ignore"
+            )
+
+        with col2:
+            st.download_button(
+                "Download Report",
+                data=report,
+                file_name=f"scorescope_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
+                mime="text/plain",
+                on_click="ignore"
+            )
+
+def render_results(job_id: str, result: dict):
+    categories = result["request"]["categories"]
+    scores = result["scores"]
+    feedback_data = result["feedback"]
+    weighted_score = result["weighted_score"]
+    processing_time = result["processing_time"]
+    source = "Loaded from cache" if result["cached"] else "Shared with an identical evaluation" if result["coalesced"] else "Processed"
+
+    unparsed = failed_categories(scores)
+    if unparsed:
+        st.warning(f"Could not read a score for: {', '.join(unparsed)}. "
+                   "These categories are excluded from the overall score.")
+
+    st.markdown('<div class="results-container">', unsafe_allow_html=True)
+
+    # Overall score display
+    st.markdown(f"""
+    <div class="score-display">
+        <div class="overall-score">{weighted_score}/10</div>
+        <div class="score-label">Overall Score • {source} in {processing_time:.1f}s</div>
+    </div>
+    """, unsafe_allow_html=True)
+
+    routing = result.get("routing")
+    if routing:
+        graded_by = f"Graded by {routing['model']}"
+        if routing["escalated"]:
+            graded_by += f" after escalation ({'; '.join(routing['reasons'])})"
+        st.caption(f"{graded_by} • model time {routing['latency_s']:.1f}s • ~${routing['cost_usd']:.4f}")
+    if result.get("repaired"):
+        st.caption(f"Re-asked for {', '.join(result['repaired'])}: the first response's scores could not be read")
+    resubmission = result.get("resubmission")
+    if resubmission:
+        changed = f"{resubmission['changed_ratio']:.0%} of the text changed since your previous draft"
+        if resubmission["mode"] == "full":
+            st.caption(f"Resubmission: {changed} • graded in full")
+        else:
+            rescored = ", ".join(resubmission["rescored"]) or "no categories"
+            detail = "scores carried over" if resubmission["mode"] == "reused" else f"re-assessed {rescored}"
+            st.caption(f"Resubmission: {changed} • {detail} • saved ~{resubmission['tokens_saved']:,} tokens"
+                       f" and {max(0.0, resubmission['seconds_saved']):.1f}s")
+    similarity = result.get("similarity")
+    if similarity and "reused_from" in similarity:
+        st.caption(f"Reused the evaluation of a near-identical submission ({similarity['reused_similarity']:.0%} similar)")
+    elif similarity:
+        st.caption(f"Similar to {similarity['similar_submissions']} other submission(s) for this task"
+                   f" (up to {similarity['max_similarity']:.0%})")
+
+    # Radar chart, benchmarked against the cohort once it is large enough
+    render_radar(job_id, result, radar_benchmark)
+
+    # Detailed category analysis
+    st.markdown("### Detailed Category Analysis")
+
+    for category, (score, explanation) in scores.items():
+        with st.expander(f"{category}: {score}/10", expanded=False):
+            st.markdown(f"**Weight:** {categories[category]}%")
+            st.markdown(f"**Analysis:** {explanation}")
+
+    # Overall assessment and action plan
+    st.markdown("### Overall Assessment")
+    st.write(feedback_data["overall"])
+
+    st.markdown("### Action Plan")
+    for i, action in enumerate(feedback_data["actions"], 1):
+        st.markdown(f"**{i}.** {action}")
+
+    st.markdown('</div>', unsafe_allow_html=True)
+
+    # Score history tracking, once per job however many times the results are redrawn
+    get_history_store().record(user_id, job_id, weighted_score, scores)
+    render_history(job_id)
+
+    # Export options
+    render_exports(job_id, result)
+
+    # Show raw AI response if requested
+    if show_raw_response:
+        with st.expander("Raw AI Response (Debug)"):
+            st.text(result["ai_response"])
+
+# Analysis button: the evaluation runs as a background job so reruns and reconnects don't lose it
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
+# History follows a user ID kept in the URL, so a bookmarked link keeps its progress across sessions
+user_id = st.query_params.get("uid")
+if not user_id:
+    user_id = st.query_params["uid"] = uuid.uuid4().hex
+
+if uploaded_pdf and task_outline:
+    if st.button("Analyze with ScoreScope AI", key="analyze_btn"):
+        # Load NumPy/pandas here rather than in the job worker: Plotly picks up a half-imported pandas from
+        # sys.modules if this session's progress fragment draws a chart while a worker thread is importing it.
+        import utils.cohort
+
+        request = EvaluationRequest(
+            file_name=uploaded_pdf.name,
+            upload=uploaded_pdf,
+            task_outline=task_outline,
+            categories=dict(categories),
+            evaluation_style=eval_style,
+            max_pages=max_pages,
+            full_document=full_document,
+            chunk_tokens=chunk_tokens,
+            structured=structured_output,
+            stream=stream_results,
+            routed=routed,
+            repair=repair_unparsed,
+            user_id=user_id,
+            incremental=incremental,
+            reuse_near_duplicates=reuse_near_duplicates,
+        )
+        try:
+            job = get_job_manager().submit(st.session_state.session_id, run_evaluation, request)
+        except JobRejected as e:
+            st.warning(str(e))
+        else:
+            st.session_state.active_job = job.job_id
+            st.query_params["job"] = job.job_id
 elif uploaded_pdf or task_outline:
-    st.info("Please provide both task instructions and upload a PDF to begin analysis.")
\ No newline at end of file
+    st.info("Please provide both task instructions and upload a PDF to begin analysis.")
+
+# A reconnecting browser finds its job again through the URL
+active_job_id = st.session_state.get("active_job") or st.query_params.get("job")
+if active_job_id:
+    active_job = get_job_manager().get(active_job_id)
+    if active_job is None:
+        st.session_state.pop("active_job", None)
+        st.query_params.pop("job", None)
+    elif not active_job.done:
+        show_job_progress(active_job_id)
+    elif active_job.status == "failed":
+        st.error(active_job.error)
+    else:
+        render_results(active_job_id, active_job.result)
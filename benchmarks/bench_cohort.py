@@ -0,0 +1,59 @@
+"""Cohort analytics query latency at scale: cold load from SQLite, warm summary, benchmark and incremental update.
+
+Run from the repository root:  python -m benchmarks.bench_cohort [--evaluations 100000]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from utils.cohort import CohortAnalytics
+from utils.helpers import DEFAULT_CATEGORIES
+
+def median_ms(fn, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--evaluations", type=int, default=100_000)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="scorescope-cohort-"), "cohorts.sqlite")
+    rng = random.Random(0)
+    results = [
+        (f"file-{i}", {cat: (min(10, max(0, round(rng.gauss(6.5, 1.8)))), "ok") for cat in DEFAULT_CATEGORIES})
+        for i in range(args.evaluations)
+    ]
+    started = time.perf_counter()
+    CohortAnalytics(path).record_many("cohort", results)
+    print(f"Recorded {args.evaluations} evaluations in {time.perf_counter() - started:.1f}s")
+
+    def cold_summary():
+        CohortAnalytics(path).histogram("cohort").summary()
+
+    analytics = CohortAnalytics(path)
+    analytics.histogram("cohort")
+    counter = iter(range(10 ** 9))
+
+    rows = [
+        ("cold load + summary", median_ms(cold_summary, args.repeats)),
+        ("warm summary", median_ms(lambda: analytics.histogram("cohort").summary(), args.repeats)),
+        ("radar benchmark (p50)", median_ms(lambda: analytics.benchmark("cohort", DEFAULT_CATEGORIES), args.repeats)),
+        ("record one result", median_ms(lambda: analytics.record("cohort", f"new-{next(counter)}", results[0][1]),
+                                        args.repeats)),
+    ]
+    print(f"{'query':<24} {'median ms':>10}")
+    for name, ms in rows:
+        print(f"{name:<24} {ms:>10.2f}")
+    print(analytics.histogram("cohort").summary())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""End-to-end latency, throughput and memory of the analysis pipeline against a local stub LLM.
+
+Synthetic PDFs of several page counts and text densities go through extraction, the LLM call, parsing,
+weighting and chart building; per-stage p50/p95, throughput and peak RSS are printed and saved as JSON
+so a later run can be compared against it. Runs fully offline.
+
+Run from the repository root:
+    python -m benchmarks.bench_end_to_end [--pages 1 5 15 30] [--latency 0.5] [--compare benchmarks/results/<run>.json]
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Caches and credentials must be redirected before the app modules read them at import time.
+os.environ["SCORESCOPE_CACHE_DIR"] = tempfile.mkdtemp(prefix="scorescope-bench-")
+os.environ.setdefault("OPENAI_API_KEY", "stub")
+
+import fitz  # PyMuPDF
+
+from benchmarks.bench_pdf_extraction import PARAGRAPH
+from benchmarks.stub_llm import StubLLMServer
+from utils.ai import get_ai_feedback, parse_scores_enhanced
+from utils.helpers import DEFAULT_CATEGORIES, calculate_weighted_score, get_bytes_hash
+from utils.pdf import extract_text_from_pdf
+from utils.timing import StageTimer, TimingRegistry
+from utils.visuals import _build_radar_chart, _build_score_history_chart
+
+DENSITIES = {"sparse": 3, "dense": 12}
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+def synthetic_pdf(pages: int, paragraphs_per_page: int) -> bytes:
+    # A unique heading per document so content-hash caches never turn a run into a cache benchmark.
+    doc = fitz.open()
+    nonce = uuid.uuid4().hex
+    for i in range(pages):
+        page = doc.new_page()
+        text = f"Submission {nonce} section {i + 1}\n\n" + "\n".join(PARAGRAPH for _ in range(paragraphs_per_page))
+        page.insert_textbox(fitz.Rect(54, 54, 558, 738), text, fontsize=9)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is kilobytes on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def evaluate_submission(data: bytes, task_outline: str, registry: TimingRegistry, history: list) -> float:
+    timer = StageTimer(registry)
+    with timer.stage("pdf_extraction"):
+        submission_text = extract_text_from_pdf(get_bytes_hash(data), io.BytesIO(data), max_pages=30)
+    with timer.stage("llm_call"):
+        ai_response = get_ai_feedback(task_outline, submission_text, DEFAULT_CATEGORIES)
+    with timer.stage("parsing"):
+        scores = parse_scores_enhanced(ai_response, DEFAULT_CATEGORIES)
+    with timer.stage("weighting"):
+        weighted_score = calculate_weighted_score(scores, DEFAULT_CATEGORIES)
+    with timer.stage("chart_rendering"):
+        history.append({"timestamp": datetime.now().strftime("%Y-%m-%d %H:%M"), "overall_score": weighted_score,
+                        **{cat: score for cat, (score, _) in scores.items()}})
+        # Built without the FIGURES memo: every stub response has the same scores, so it would only time cache hits.
+        _build_radar_chart(scores, None, "Target Score")
+        _build_score_history_chart(history[-20:])
+    registry.record("total", timer.total)
+    return timer.total
+
+def run_scenario(pages: int, density: str, iterations: int, concurrency: int) -> dict:
+    documents = [synthetic_pdf(pages, DENSITIES[density]) for _ in range(iterations)]
+    registry = TimingRegistry(window=iterations)
+    history = []
+    task_outline = "Analyze a company's compliance program and recommend improvements."
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda data: evaluate_submission(data, task_outline, registry, history), documents))
+    wall_s = time.perf_counter() - started
+    return {
+        "pages": pages,
+        "density": density,
+        "iterations": iterations,
+        "concurrency": concurrency,
+        "wall_s": round(wall_s, 3),
+        "throughput_per_min": round(iterations / wall_s * 60, 1),
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": registry.snapshot(),
+    }
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    print(f"\nCompared with {baseline['meta']['timestamp']} (tolerance {tolerance:.0%}):")
+    for name, scenario in current["scenarios"].items():
+        previous = baseline["scenarios"].get(name)
+        if not previous:
+            continue
+        for stage, stats in scenario["stages"].items():
+            before = previous["stages"].get(stage)
+            if not before or not before["p50_s"]:
+                continue
+            ratio = stats["p50_s"] / before["p50_s"]
+            flag = ""
+            if ratio > 1 + tolerance:
+                flag = "  REGRESSION"
+                regressions.append(f"{name}/{stage}")
+            print(f"  {name:<14} {stage:<16} p50 {before['p50_s']:.4f}s -> {stats['p50_s']:.4f}s ({ratio:.2f}x){flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 5, 15, 30])
+    parser.add_argument("--densities", nargs="+", choices=list(DENSITIES), default=list(DENSITIES))
+    parser.add_argument("--iterations", type=int, default=10, help="Submissions per scenario")
+    parser.add_argument("--concurrency", type=int, default=1, help="Submissions evaluated at once")
+    parser.add_argument("--latency", type=float, default=0.5, help="Stub LLM response latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Uniform +/- jitter on the stub latency")
+    parser.add_argument("--output", help="Where to save results (default: benchmarks/results/e2e-<timestamp>.json)")
+    parser.add_argument("--compare", help="Earlier results file to compare p50 latencies against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed p50 slowdown before flagging a regression")
+    args = parser.parse_args()
+
+    # get_ai_feedback's spinner and the st.cache_data layer warn on every call outside a Streamlit session.
+    for name in [name for name in logging.root.manager.loggerDict if name.startswith("streamlit")]:
+        logging.getLogger(name).setLevel(logging.ERROR)
+
+    with StubLLMServer(args.latency, args.jitter) as stub:
+        os.environ["OPENAI_BASE_URL"] = stub.base_url
+        results = {
+            "meta": {
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "args": vars(args),
+            },
+            "scenarios": {},
+        }
+        print(f"{'scenario':<14} {'subs/min':>9} {'total p50':>10} {'total p95':>10} {'extract p95':>12} "
+              f"{'parse p95':>10} {'charts p95':>11} {'peak RSS MB':>12}")
+        for pages in args.pages:
+            for density in args.densities:
+                name = f"{pages}p-{density}"
+                scenario = run_scenario(pages, density, args.iterations, args.concurrency)
+                results["scenarios"][name] = scenario
+                stages = scenario["stages"]
+                print(f"{name:<14} {scenario['throughput_per_min']:>9.1f} {stages['total']['p50_s']:>10.3f} "
+                      f"{stages['total']['p95_s']:>10.3f} {stages['pdf_extraction']['p95_s']:>12.4f} "
+                      f"{stages['parsing']['p95_s']:>10.4f} {stages['chart_rendering']['p95_s']:>11.4f} "
+                      f"{scenario['peak_rss_mb']:>12.1f}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"e2e-{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nSaved results to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} stage(s) regressed: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Tail latency and failure rate of LLM calls against a flaky, slow-tailed stub, with and without hedging.
+
+The stub fails a share of requests (429 with Retry-After, or 503) and sends another share into a slow tail.
+Each policy sends the same number of requests through AsyncEvaluationClient and reports the request
+latency percentiles, the calls that still failed, and the retries, timeouts and hedges spent doing it.
+
+Run from the repository root:
+    python -m benchmarks.bench_resilience [--requests 300] [--error-rate 0.05] [--slow-rate 0.05] [--slow-latency 3]
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "stub")
+
+from benchmarks.stub_llm import StubLLMServer
+from utils.llm import AsyncEvaluationClient
+from utils.resilience import LLM_STATS, RetryPolicy
+
+PROMPT = "Evaluate this submission."
+
+def run_policy(name: str, policy: RetryPolicy, requests: int, concurrency: int) -> dict:
+    # A fresh window per policy, so hedge delays are learned from this run alone.
+    LLM_STATS.__init__()
+    client = AsyncEvaluationClient(max_concurrency=concurrency, rpm=1_000_000, tpm=10 ** 9, retry_policy=policy)
+    latencies, failures = [], 0
+    started = time.perf_counter()
+
+    def submit():
+        submitted = time.perf_counter()
+        future = client.submit(PROMPT)
+        future.add_done_callback(lambda f: latencies.append(time.perf_counter() - submitted))
+        return future
+
+    # Submitted in waves so the early requests fill the latency window the later ones hedge against.
+    for wave in range(0, requests, concurrency):
+        for future in [submit() for _ in range(min(concurrency, requests - wave))]:
+            failures += future.result().startswith("ERROR")
+    elapsed = time.perf_counter() - started
+    client.close()
+
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))]
+    stats = LLM_STATS.snapshot()
+    return {"policy": name, "p50": pct(50), "p95": pct(95), "p99": pct(99), "failed": failures,
+            "retries": stats["retries"], "timeouts": stats["timeouts"], "hedges": stats["hedges"],
+            "hedge_wins": stats["hedge_wins"], "seconds": elapsed}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-latency", type=float, default=3.0)
+    args = parser.parse_args()
+
+    policies = {
+        "no retries": RetryPolicy(max_attempts=1),
+        "retries": RetryPolicy(base_delay_s=0.1),
+        "retries+hedge": RetryPolicy(base_delay_s=0.1, hedge=True),
+    }
+    with StubLLMServer(args.latency, args.jitter, error_rate=args.error_rate, slow_rate=args.slow_rate,
+                       slow_latency_s=args.slow_latency) as stub:
+        os.environ["OPENAI_BASE_URL"] = stub.base_url
+        print(f"{args.requests} requests, {args.error_rate:.0%} errors, {args.slow_rate:.0%} at {args.slow_latency}s")
+        print(f"{'policy':<14} {'p50':>6} {'p95':>6} {'p99':>6} {'failed':>7} {'retries':>8} {'timeouts':>9} "
+              f"{'hedges':>7} {'won':>5} {'seconds':>8}")
+        for name, policy in policies.items():
+            r = run_policy(name, policy, args.requests, args.concurrency)
+            print(f"{name:<14} {r['p50']:>6.2f} {r['p95']:>6.2f} {r['p99']:>6.2f} {r['failed']:>7} {r['retries']:>8} "
+                  f"{r['timeouts']:>9} {r['hedges']:>7} {r['hedge_wins']:>5} {r['seconds']:>8.1f}")
+
+if __name__ == "__main__":
+    main()
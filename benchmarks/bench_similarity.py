@@ -0,0 +1,74 @@
+"""Near-duplicate index at scale: signature cost, bulk insert, query latency and recall over 100k submissions.
+
+Indexed signatures are random, so unrelated submissions share no buckets; queries are copies of indexed
+signatures with a share of their values replaced, which sets their similarity to the original exactly.
+
+Run from the repository root:  python -m benchmarks.bench_similarity [--documents 100000] [--queries 1000]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from utils.similarity import NEAR_DUPLICATE_THRESHOLD, NUM_PERM, SIMILAR_THRESHOLD, SimilarityIndex, minhash
+
+BATCH = 5_000
+
+def perturbed(signature: np.ndarray, similarity: float, rng: np.random.RandomState) -> np.ndarray:
+    copy = signature.copy()
+    changed = rng.choice(NUM_PERM, int(NUM_PERM * (1 - similarity)), replace=False)
+    copy[changed] = rng.randint(0, 2 ** 32, len(changed), dtype=np.uint64).astype(np.uint32)
+    return copy
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=1_000)
+    parser.add_argument("--words", type=int, default=6_000, help="Length of the document timed for minhash()")
+    args = parser.parse_args()
+
+    words = random.Random(0).choices([f"word{i}" for i in range(5_000)], k=args.words)
+    text = " ".join(words)
+    timings = []
+    for _ in range(20):
+        started = time.perf_counter()
+        minhash(text)
+        timings.append(time.perf_counter() - started)
+    print(f"minhash() of {args.words} words: {statistics.median(timings) * 1000:.1f} ms")
+
+    path = os.path.join(tempfile.mkdtemp(prefix="scorescope-similarity-"), "similarity.sqlite")
+    index = SimilarityIndex(path)
+    rng = np.random.RandomState(0)
+    signatures = rng.randint(0, 2 ** 32, (args.documents, NUM_PERM), dtype=np.uint64).astype(np.uint32)
+    started = time.perf_counter()
+    for start in range(0, args.documents, BATCH):
+        index.add_many("cohort", ((f"file-{i}", signatures[i], f"submission-{i}")
+                                  for i in range(start, min(start + BATCH, args.documents))))
+    elapsed = time.perf_counter() - started
+    print(f"Indexed {args.documents} submissions in {elapsed:.1f}s ({args.documents / elapsed:,.0f}/s), "
+          f"{os.path.getsize(path) / 2 ** 20:.0f} MB on disk")
+
+    # "candidate": the LSH buckets led to the original; "similar"/"reusable": it also passed that threshold.
+    print(f"{'similarity':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'candidate':>10} {'similar':>8} {'reusable':>9}")
+    for similarity in (0.95, NEAR_DUPLICATE_THRESHOLD, 0.85, SIMILAR_THRESHOLD, 0.7, 0.5):
+        latencies, candidates, similar, reusable = [], 0, 0, 0
+        for target in rng.choice(args.documents, args.queries, replace=False):
+            query = perturbed(signatures[target], similarity, rng)
+            started = time.perf_counter()
+            matches = index.query("cohort", query, threshold=0.0)
+            latencies.append(time.perf_counter() - started)
+            estimate = next((m[2] for m in matches if m[0] == f"file-{target}"), None)
+            candidates += estimate is not None
+            similar += estimate is not None and estimate >= SIMILAR_THRESHOLD
+            reusable += estimate is not None and estimate >= NEAR_DUPLICATE_THRESHOLD
+        latencies.sort()
+        pct = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))] * 1000
+        print(f"{similarity:>10.2f} {pct(50):>8.2f} {pct(95):>8.2f} {pct(99):>8.2f} "
+              f"{candidates / args.queries:>10.1%} {similar / args.queries:>8.1%} {reusable / args.queries:>9.1%}")
+
+if __name__ == "__main__":
+    main()
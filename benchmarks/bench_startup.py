@@ -0,0 +1,60 @@
+"""Cold-start import cost of the app modules, measured with `python -X importtime` in fresh interpreters.
+
+Reports the median cumulative import time of each target, the slowest modules it pulls in, and whether any
+of the heavy libraries that should load lazily (pandas, NumPy, PyMuPDF, OpenAI) were imported at start-up.
+
+Run from the repository root:  python -m benchmarks.bench_startup [--targets utils.evaluation app] [--repeats 5]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+LAZY_MODULES = ("pandas", "numpy", "fitz", "pymupdf", "openai")
+DEFAULT_TARGETS = ("streamlit", "utils.ai", "utils.pdf", "utils.visuals", "utils.evaluation", "app")
+
+def import_profile(target: str) -> tuple:
+    """Import `target` in a fresh interpreter; returns ({module: cumulative_us}, [lazy modules that were loaded])."""
+    probe = (
+        f"import sys; import {target}; "
+        f"print('LOADED', ','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    )
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", probe], cwd=repo_root,
+                          capture_output=True, text=True, check=True)
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        cumulative[name] = int(cumulative_us)
+    loaded = next(line for line in proc.stdout.splitlines() if line.startswith("LOADED"))
+    return cumulative, [m for m in loaded[len("LOADED "):].split(",") if m]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--targets", nargs="+", default=list(DEFAULT_TARGETS))
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5, help="Slowest dependencies to list per target")
+    args = parser.parse_args()
+
+    print(f"{'target':<18} {'import ms':>10}  heavy libraries loaded")
+    for target in args.targets:
+        samples = defaultdict(list)
+        loaded = []
+        for _ in range(args.repeats):
+            cumulative, loaded = import_profile(target)
+            for name, us in cumulative.items():
+                samples[name].append(us)
+        medians = {name: statistics.median(values) for name, values in samples.items()}
+        total_ms = medians.get(target.lstrip("."), 0) / 1000
+        print(f"{target:<18} {total_ms:>10.1f}  {', '.join(loaded) or '-'}")
+        dependencies = sorted(((us, name) for name, us in medians.items() if name != target and "." not in name),
+                              reverse=True)
+        for us, name in dependencies[:args.top]:
+            print(f"    {name:<28} {us / 1000:>8.1f} ms")
+
+if __name__ == "__main__":
+    main()
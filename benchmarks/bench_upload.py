@@ -0,0 +1,87 @@
+"""Peak memory of ingesting a large upload: reading, hashing and extracting it the old way versus utils.upload.
+
+Each case runs in a fresh interpreter and reports the peak RSS it adds on top of what is resident once the
+upload exists (for `memory` inputs the upload is already held in a BytesIO, as Streamlit holds it; `stream`
+inputs are read from an open file).
+
+Run from the repository root:  python -m benchmarks.bench_upload [--size-mb 200] [--max-pages 15]
+"""
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+PAGES = 40
+
+def build_pdf(path: str, size_mb: int):
+    """A PDF of PAGES text pages padded to roughly `size_mb` with an incompressible attachment."""
+    import fitz
+
+    doc = fitz.open()
+    for i in range(PAGES):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Page {i + 1}: " + "Lorem ipsum dolor sit amet. " * 3)
+    doc.embfile_add("padding", os.urandom(size_mb * 1024 * 1024))
+    doc.save(path)
+    doc.close()
+
+def _status_mb(field: str) -> float:
+    # From /proc rather than getrusage: ru_maxrss survives exec, so it would include the parent's peak.
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+def child(mode: str, kind: str, path: str, max_pages: int):
+    from utils.helpers import get_bytes_hash
+    from utils.pdf import extract_text_from_bytes
+    from utils.upload import ingest_upload
+
+    upload = io.BytesIO(open(path, "rb").read()) if kind == "memory" else open(path, "rb")
+    baseline = _status_mb("VmRSS")
+    started = time.perf_counter()
+    if mode == "before":
+        data = upload.getvalue() if kind == "memory" else upload.read()
+        get_bytes_hash(data)
+        text = extract_text_from_bytes(data, max_pages, workers=None)
+    else:
+        with ingest_upload(upload) as ingested:
+            text = extract_text_from_bytes(ingested.source, max_pages, workers=None)
+    print(json.dumps({"added_peak_mb": max(0.0, _status_mb("VmHWM") - baseline),
+                      "seconds": time.perf_counter() - started, "chars": len(text)}))
+
+def run_case(mode: str, kind: str, path: str, max_pages: int) -> dict:
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.run([sys.executable, "-m", "benchmarks.bench_upload", "--child", mode, kind, path,
+                           str(max_pages)], cwd=repo_root, capture_output=True, text=True, check=True)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=200)
+    parser.add_argument("--max-pages", type=int, default=15)
+    parser.add_argument("--child", nargs=4, metavar=("MODE", "KIND", "PATH", "MAX_PAGES"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        mode, kind, path, max_pages = args.child
+        child(mode, kind, path, int(max_pages))
+        return
+
+    with tempfile.TemporaryDirectory(prefix="scorescope-upload-") as tmp:
+        path = os.path.join(tmp, "upload.pdf")
+        build_pdf(path, args.size_mb)
+        print(f"Upload: {os.path.getsize(path) / 2 ** 20:.0f} MB, {PAGES} pages, extracting {args.max_pages}")
+        print(f"{'input':<8} {'path':<8} {'added peak MB':>14} {'seconds':>8}")
+        for kind in ("memory", "stream"):
+            for mode in ("before", "after"):
+                result = run_case(mode, kind, path, args.max_pages)
+                print(f"{kind:<8} {mode:<8} {result['added_peak_mb']:>14.1f} {result['seconds']:>8.2f}")
+
+if __name__ == "__main__":
+    main()
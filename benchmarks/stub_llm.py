@@ -0,0 +1,310 @@
+"""Local OpenAI-compatible chat completions server with configurable latency and canned responses.
+
+Point the app or a benchmark at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1 (any OPENAI_API_KEY works).
+It also stands in for the Files and Batches APIs used by utils.batch_api: an uploaded batch job file is
+answered after --batch-latency seconds.
+
+Run from the repository root:  python -m benchmarks.stub_llm [--port 8765] [--latency 0.5] [--jitter 0.1]
+                               [--error-rate 0.1] [--slow-rate 0.05 --slow-latency 10] [--batch-latency 2]
+Or answer a job file offline, without a server:
+                               python -m benchmarks.stub_llm --batch-input jobs.jsonl --batch-output results.jsonl
+"""
+import argparse
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+from utils.helpers import DEFAULT_CATEGORIES
+
+def canned_response(categories: dict = DEFAULT_CATEGORIES, score: int = 7) -> str:
+    lines = [
+        f"{cat}: {score}/10 - The submission addresses this area with relevant detail and a clear line of argument. "
+        f"Tighten the supporting evidence to strengthen it further."
+        for cat in categories
+    ]
+    return "\n".join(lines) + (
+        "\n\nOverall Assessment:\nA solid submission that meets most of the brief; the analysis is sound but uneven.\n\n"
+        "Actionable Next Steps:\n1. Add evidence for each recommendation.\n2. Summarise the key findings up front.\n"
+        "3. Proofread for consistency of terminology."
+    )
+
+def repair_response(prompt: str, score: int = 6) -> Optional[str]:
+    """Category lines for a follow-up that asks for only some categories (see utils.repair), else None."""
+    if "these categories only" not in prompt:
+        return None
+    listed = prompt.split("(rate each 0-10):", 1)[1]
+    categories = re.findall(r"^\d+\. (.+)$", listed, re.MULTILINE)
+    return canned_response(dict.fromkeys(categories), score).split("\n\n")[0]
+
+def canned_json_response(categories: dict = DEFAULT_CATEGORIES, score: int = 7) -> str:
+    return json.dumps({
+        "categories": {cat: {"score": score, "explanation": "Relevant and clear; tighten the evidence."} for cat in categories},
+        "overall_assessment": "A solid submission that meets most of the brief.",
+        "next_steps": ["Add evidence for each recommendation.", "Summarise the key findings up front."],
+    })
+
+def completion_content(body: dict, response: Optional[str] = None) -> str:
+    """The canned answer to a chat completions request body: repair, JSON or free-text evaluation."""
+    prompt = body["messages"][-1]["content"] if body.get("messages") else ""
+    return repair_response(prompt) or (canned_json_response() if body.get("response_format")
+                                       else response or canned_response())
+
+def completion_usage(body: dict, content: str) -> dict:
+    usage = {"prompt_tokens": len(str(body.get("messages", ""))) // 4, "completion_tokens": len(content) // 4}
+    usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+    return usage
+
+def batch_results(lines: Iterable[str], response: Optional[str] = None,
+                  error_rate: float = 0.0) -> Tuple[List[str], List[str]]:
+    """Answer the requests of a batch job file: (output file lines, error file lines), as the Batch API writes them."""
+    output, errors = [], []
+    for n, line in enumerate(line for line in lines if line.strip()):
+        request = json.loads(line)
+        result = {"id": f"batch_req_{n}", "custom_id": request["custom_id"], "error": None}
+        if random.random() < error_rate:
+            result["response"] = {"status_code": 500, "request_id": f"req_{n}",
+                                  "body": {"error": {"message": "stub failure", "type": "server_error"}}}
+            errors.append(json.dumps(result))
+            continue
+        body = request["body"]
+        content = completion_content(body, response)
+        result["response"] = {"status_code": 200, "request_id": f"req_{n}", "body": {
+            "id": f"chatcmpl-{n}", "object": "chat.completion", "created": int(time.time()), "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": completion_usage(body, content),
+        }}
+        output.append(json.dumps(result))
+    return output, errors
+
+class StubLLMServer:
+    """Serves /v1/chat/completions (and a minimal Files and Batches API) from a background thread; usable as a context manager."""
+
+    def __init__(self, latency_s: float = 0.5, jitter_s: float = 0.0, response: Optional[str] = None,
+                 stream_chunk_chars: int = 20, stream_delay_s: float = 0.005, host: str = "127.0.0.1", port: int = 0,
+                 error_rate: float = 0.0, slow_rate: float = 0.0, slow_latency_s: float = 10.0,
+                 batch_latency_s: float = 1.0):
+        self.latency_s = latency_s
+        self.jitter_s = jitter_s
+        # Failure injection: a share of requests fail (429 with Retry-After, or 503), a share land in a slow tail.
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency_s = slow_latency_s
+        self.errors = 0
+        self.response = response or canned_response()
+        self.stream_chunk_chars = stream_chunk_chars
+        self.stream_delay_s = stream_delay_s
+        self.requests = 0
+        # Batch jobs finish this long after they are created; files and batches are kept in memory.
+        self.batch_latency_s = batch_latency_s
+        self.files = {}
+        self.batches = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _delay(self) -> float:
+        if random.random() < self.slow_rate:
+            return self.slow_latency_s
+        return max(0.0, self.latency_s + random.uniform(-self.jitter_s, self.jitter_s))
+
+    def _add_file(self, filename: str, data: bytes, purpose: str) -> dict:
+        file = {"id": f"file-{next(self._ids)}", "object": "file", "bytes": len(data), "created_at": int(time.time()),
+                "filename": filename, "purpose": purpose, "status": "processed"}
+        self.files[file["id"]] = (file, data)
+        return file
+
+    def _create_batch(self, request: dict) -> dict:
+        batch = {"id": f"batch_{next(self._ids)}", "object": "batch", "endpoint": request["endpoint"],
+                 "input_file_id": request["input_file_id"], "completion_window": request["completion_window"],
+                 "status": "in_progress", "created_at": int(time.time()), "output_file_id": None,
+                 "error_file_id": None, "metadata": request.get("metadata"),
+                 "request_counts": {"total": 0, "completed": 0, "failed": 0}}
+        self.batches[batch["id"]] = batch
+        timer = threading.Timer(self.batch_latency_s, self._finish_batch, (batch,))
+        timer.daemon = True
+        timer.start()
+        return batch
+
+    def _finish_batch(self, batch: dict):
+        lines = self.files[batch["input_file_id"]][1].decode("utf-8").splitlines()
+        output, errors = batch_results(lines, self.response, self.error_rate)
+        with self._lock:
+            self.requests += len(output) + len(errors)
+            self.errors += len(errors)
+        if output:
+            batch["output_file_id"] = self._add_file("batch_output.jsonl", "\n".join(output).encode(), "batch_output")["id"]
+        if errors:
+            batch["error_file_id"] = self._add_file("batch_errors.jsonl", "\n".join(errors).encode(), "batch_output")["id"]
+        batch["request_counts"] = {"total": len(output) + len(errors), "completed": len(output), "failed": len(errors)}
+        batch.update(status="completed", completed_at=int(time.time()))
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                try:
+                    if self.path.rstrip("/").endswith("/files"):
+                        self._upload()
+                    elif self.path.rstrip("/").endswith("/batches"):
+                        self._send_json(stub._create_batch(json.loads(self._read())))
+                    else:
+                        self._respond()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client gave up on this request (a timed-out attempt or a losing hedge)
+
+            def do_GET(self):
+                parts = self.path.split("?")[0].rstrip("/").split("/")
+                if parts[-2:-1] == ["batches"] and parts[-1] in stub.batches:
+                    self._send_json(stub.batches[parts[-1]])
+                elif parts[-3:-2] == ["files"] and parts[-1] == "content" and parts[-2] in stub.files:
+                    self._send_bytes(stub.files[parts[-2]][1], "application/octet-stream")
+                else:
+                    self._send_status(404, {"error": {"message": f"{self.path} not found", "type": "invalid_request_error"}})
+
+            def _read(self) -> bytes:
+                return self.rfile.read(int(self.headers["Content-Length"]))
+
+            def _upload(self):
+                # multipart/form-data with `purpose` and `file` fields, parsed as a MIME message.
+                message = BytesParser(policy=policy.HTTP).parsebytes(
+                    f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + self._read())
+                fields = {part.get_param("name", header="content-disposition"): part for part in message.iter_parts()}
+                file = fields["file"]
+                self._send_json(stub._add_file(file.get_filename() or "upload.jsonl", file.get_payload(decode=True),
+                                               fields["purpose"].get_content().strip()))
+
+            def _respond(self):
+                body = json.loads(self._read())
+                failing = random.random() < stub.error_rate
+                with stub._lock:
+                    stub.requests += 1
+                    stub.errors += failing
+                if failing:
+                    self._send_error()
+                    return
+                content = completion_content(body, stub.response)
+                usage = completion_usage(body, content)
+                time.sleep(stub._delay())
+                if body.get("stream"):
+                    self._stream(content, usage)
+                else:
+                    self._send_json({
+                        "id": "stub", "object": "chat.completion", "created": int(time.time()), "model": body.get("model"),
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                        "usage": usage,
+                    })
+
+            def _send_error(self):
+                status, headers = random.choice([(429, {"Retry-After": "0.2"}), (503, {})])
+                self._send_status(status, {"error": {"message": "stub failure", "type": "server_error"}}, headers)
+
+            def _send_json(self, payload: dict):
+                self._send_status(200, payload)
+
+            def _send_status(self, status: int, payload: dict, headers: Optional[dict] = None):
+                self._send_bytes(json.dumps(payload).encode(), "application/json", status, headers)
+
+            def _send_bytes(self, data: bytes, content_type: str, status: int = 200, headers: Optional[dict] = None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, content: str, usage: dict):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                step = stub.stream_chunk_chars
+                for i in range(0, len(content), step):
+                    chunk = {"id": "stub", "object": "chat.completion.chunk", "created": 0, "model": "stub",
+                             "choices": [{"index": 0, "delta": {"content": content[i:i + step]}, "finish_reason": None}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                    time.sleep(stub.stream_delay_s)
+                final = {"id": "stub", "object": "chat.completion.chunk", "created": 0, "model": "stub",
+                         "choices": [], "usage": usage}
+                self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode())
+                self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
+
+    def start(self) -> "StubLLMServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StubLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds before each response starts")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform +/- jitter on the latency, in seconds")
+    parser.add_argument("--response-file", help="Text file with the canned completion to return")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 429/503")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Share of requests delayed by --slow-latency")
+    parser.add_argument("--slow-latency", type=float, default=10.0, help="Seconds before a slow response starts")
+    parser.add_argument("--batch-latency", type=float, default=1.0, help="Seconds before a batch job completes")
+    parser.add_argument("--batch-input", help="Answer this batch job file offline instead of serving")
+    parser.add_argument("--batch-output", help="Result file for --batch-input; failed requests go next to it in "
+                                               "<name>.errors.jsonl")
+    args = parser.parse_args()
+
+    response = None
+    if args.response_file:
+        with open(args.response_file, encoding="utf-8") as f:
+            response = f.read()
+    if args.batch_input:
+        with open(args.batch_input, encoding="utf-8") as f:
+            output, errors = batch_results(f, response, args.error_rate)
+        output_path = Path(args.batch_output or Path(args.batch_input).with_suffix(".results.jsonl"))
+        output_path.write_text("".join(line + "\n" for line in output), encoding="utf-8")
+        if errors:
+            output_path.with_suffix(".errors.jsonl").write_text("".join(line + "\n" for line in errors), encoding="utf-8")
+        print(f"Answered {len(output)} requests ({len(errors)} failed) into {output_path}")
+        return
+    server = StubLLMServer(args.latency, args.jitter, response, port=args.port, error_rate=args.error_rate,
+                           slow_rate=args.slow_rate, slow_latency_s=args.slow_latency,
+                           batch_latency_s=args.batch_latency)
+    print(f"Stub LLM listening on {server.base_url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+import json
+
+import pytest
+
+from utils.ai import build_response_format
+from utils.helpers import DEFAULT_CATEGORIES
+from utils.llm import MODEL, chat_request
+from utils.routing import FAST_MODEL
+
+RESPONSE_FORMAT = build_response_format(DEFAULT_CATEGORIES)
+
+@pytest.mark.parametrize("model", ["gpt-4o", "gpt-4o-mini", "gpt-4o-2024-08-06", "gpt-4.1-mini", FAST_MODEL])
+def test_structured_output_models_get_the_strict_schema(model):
+    body = chat_request("Grade this", model, response_format=RESPONSE_FORMAT)
+    assert body["response_format"] == RESPONSE_FORMAT
+    assert body["response_format"]["json_schema"]["strict"] is True
+    assert body["messages"] == [{"role": "user", "content": "Grade this"}]
+
+@pytest.mark.parametrize("model", [MODEL, "gpt-4-turbo-preview", "gpt-4-turbo", "gpt-3.5-turbo"])
+def test_other_models_get_json_mode_with_the_schema_in_a_system_message(model):
+    body = chat_request("Grade this", model, response_format=RESPONSE_FORMAT)
+    assert body["response_format"] == {"type": "json_object"}
+    system, user = body["messages"]
+    assert system["role"] == "system" and "JSON" in system["content"]
+    assert json.dumps(RESPONSE_FORMAT["json_schema"]["schema"]) in system["content"]
+    assert user == {"role": "user", "content": "Grade this"}
+
+@pytest.mark.parametrize("model", [MODEL, FAST_MODEL])
+def test_plain_text_requests_have_no_response_format(model):
+    body = chat_request("Grade this", model)
+    assert "response_format" not in body
+    assert body["messages"] == [{"role": "user", "content": "Grade this"}]
+
+def test_json_mode_is_passed_through():
+    body = chat_request("Answer in JSON", MODEL, response_format={"type": "json_object"})
+    assert body["response_format"] == {"type": "json_object"}
+    assert len(body["messages"]) == 1
@@ -0,0 +1,74 @@
+import re
+
+import fitz
+import pytest
+
+from utils.pdf import _normalize_page, extract_selected_text, extract_text_from_bytes
+
+def joined_then_collapsed(pages):
+    # The original extraction: join every non-blank page, then collapse and filter the whole text.
+    text = "".join(f"\n--- Page {i} ---\n{page}" for i, page in enumerate(pages, 1) if page.strip())
+    text = re.sub(r'\n\s*\n', '\n\n', text)
+    return re.sub(r'[^\w\s\.\,\!\?\;\:\-\(\)\[\]\"\'/]', '', text)
+
+PAGES = [
+    "Introduction\nThe essay argues that...\n",
+    "Ends in blank lines\n\n\n",
+    "Whitespace-only lines \n \t\n  \n",
+    "A bullet before the break\n•\n\n",
+    "   \n\n",  # blank page
+    "\n\nStarts with blank lines\n",
+    "No trailing newline",
+    "Trailing spaces  ",
+    "Last page\n",
+]
+
+@pytest.mark.parametrize("start", range(len(PAGES)))
+def test_page_breaks_match_collapsing_the_joined_text(start):
+    pages = PAGES[start:] + PAGES[:start]
+    chunks = [_normalize_page(i, page) for i, page in enumerate(pages, 1) if page.strip()]
+    expected = joined_then_collapsed(pages)
+    # Blank lines ending the document are the one difference: they are cut to a single newline.
+    assert "".join(chunks).rstrip() == expected.rstrip()
+    assert "".join(chunks[:-1]) == expected[:len("".join(chunks[:-1]))]
+
+def pdf_bytes(doc) -> bytes:
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+def essay(pages: int) -> "fitz.Document":
+    doc = fitz.open()
+    for i in range(pages):
+        doc.new_page().insert_textbox(fitz.Rect(54, 54, 558, 738), f"Section {i + 1}\n" + "Body text of the essay. " * 60,
+                                      fontsize=9)
+    return doc
+
+def test_text_drawn_through_form_xobjects_is_selected():
+    source = essay(3)
+    doc = fitz.open()
+    for i in range(len(source)):
+        doc.new_page().show_pdf_page(fitz.Rect(0, 0, 612, 792), source, i)
+    data = pdf_bytes(doc)
+    full = extract_text_from_bytes(data, 15)
+    assert full and extract_selected_text(data, 15, len(full)) == full
+
+def test_cid_font_pages_that_fit_the_budget_are_selected():
+    doc = fitz.open()
+    for i in range(4):
+        doc.new_page().insert_textbox(fitz.Rect(54, 54, 558, 738), f"第{i + 1}章\n" + "中文文本内容。" * 40,
+                                      fontname="china-s", fontsize=10)
+    data = pdf_bytes(doc)
+    full = extract_text_from_bytes(data, 15)
+    assert full and extract_selected_text(data, 15, len(full)) == full
+
+def test_only_the_pages_that_fit_are_extracted(monkeypatch):
+    data = pdf_bytes(essay(60))
+    page_chars = len(extract_text_from_bytes(data, 1))
+    extracted = []
+    get_text = fitz.Page.get_text
+    monkeypatch.setattr(fitz.Page, "get_text", lambda page, *args, **kwargs: extracted.append(page.number) or
+                        get_text(page, *args, **kwargs))
+    selected = extract_selected_text(data, 15, page_chars * 4 + page_chars // 2)
+    assert selected.count("--- Page") == 4
+    assert len(extracted) <= 5
@@ -1,32 +1,65 @@
-
 import streamlit as st
-from openai import OpenAI
-import os
+import json
 import re
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from utils.helpers import UNPARSED_EXPLANATION
+from utils.llm import get_evaluation_client
 
-def get_ai_feedback(task_outline: str, submission_text: str, categories: dict, evaluation_style: str = "balanced") -> str:
-    if len(submission_text) > 6000:
-        parts = submission_text.split('\n--- Page')
-        truncated = parts[0]
-        for part in parts[1:]:
-            if len(truncated + part) < 6000:
-                truncated += '\n--- Page' + part
-            else:
-                break
-        submission_text = truncated + "\n\n[Content truncated for analysis...]"
-
-    style_instructions = {
-        "strict": "Be highly critical and set very high standards.",
-        "balanced": "Provide fair, constructive evaluation.",
-        "encouraging": "Focus on positive aspects while still providing honest feedback."
-    }
+# Bump whenever the prompt wording or output format changes so cached evaluations are not reused.
+PROMPT_VERSION = "1"
+# Characters of submission text a single-pass prompt carries; page selection fills it, truncation enforces it.
+SUBMISSION_CHAR_BUDGET = 6000
+
+STYLE_INSTRUCTIONS = {
+    "strict": "Be highly critical and set very high standards.",
+    "balanced": "Provide fair, constructive evaluation.",
+    "encouraging": "Focus on positive aspects while still providing honest feedback."
+}
+
+def truncate_submission(submission_text: str, max_chars: int = SUBMISSION_CHAR_BUDGET) -> str:
+    if len(submission_text) <= max_chars:
+        return submission_text
+    parts = submission_text.split('\n--- Page')
+    kept = [parts[0]]
+    length = len(parts[0])
+    for part in parts[1:]:
+        if length + len(part) >= max_chars:
+            break
+        kept.append(part)
+        length += len(part) + len('\n--- Page')
+    return '\n--- Page'.join(kept) + "\n\n[Content truncated for analysis...]"
+
+STRUCTURED_FORMAT = """Respond with a JSON object that matches the provided schema: for every category its score and an
+explanation (2-3 sentences of reasoning followed by one specific suggestion for improvement), an overall
+assessment, and a list of actionable next steps."""
+
+TEXT_FORMAT = """For each category, provide:
+- A numerical score (0-10)
+- 2-3 sentences explaining your reasoning
+- One specific suggestion for improvement
+
+Format:
+Category Name: X/10 - Explanation. Improvement suggestion.
+
+Then provide:
+Overall Assessment:
+Actionable Next Steps:"""
+
+def build_feedback_prompt(task_outline: str, submission_text: str, categories: dict, evaluation_style: str = "balanced",
+                          max_chars: Optional[int] = SUBMISSION_CHAR_BUDGET, structured: bool = False) -> str:
+    if max_chars:
+        submission_text = truncate_submission(submission_text, max_chars)
 
     category_list = "\n".join([f"{i+1}. {cat}" for i, cat in enumerate(categories.keys())])
+    output_format = STRUCTURED_FORMAT if structured else TEXT_FORMAT
 
-    prompt = f"""
-You are an expert evaluator with a {evaluation_style} approach. {style_instructions[evaluation_style]}
+    return f"""
+You are an expert evaluator with a {evaluation_style} approach. {STYLE_INSTRUCTIONS[evaluation_style]}
 
 EVALUATION TASK:
 {task_outline}
@@ -37,53 +70,215 @@ STUDENT SUBMISSION:
 Please evaluate the submission across these categories (rate each 0-10):
 {category_list}
 
-For each category, provide:
-- A numerical score (0-10)
-- 2-3 sentences explaining your reasoning
-- One specific suggestion for improvement
+{output_format}
+"""
 
-Format:
-Category Name: X/10 - Explanation. Improvement suggestion.
+def request_ai_feedback(prompt: str, response_format: Optional[dict] = None) -> str:
+    return get_evaluation_client().submit(prompt, response_format).result()
 
-Then provide:
-Overall Assessment:
-Actionable Next Steps:
-"""
+def get_ai_feedback(task_outline: str, submission_text: str, categories: dict, evaluation_style: str = "balanced") -> str:
+    prompt = build_feedback_prompt(task_outline, submission_text, categories, evaluation_style)
+    with st.spinner("AI is analyzing your work..."):
+        return request_ai_feedback(prompt)
 
-    try:
-        with st.spinner("AI is analyzing your work..."):
-            response = client.chat.completions.create(
-                model="gpt-4-turbo-preview",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.3,
-                max_tokens=2000
-            )
-        return response.choices[0].message.content
-    except Exception as e:
-        return f"ERROR: OpenAI API issue - {str(e)}"
+def stream_ai_feedback(task_outline: str, submission_text: str, categories: dict, evaluation_style: str = "balanced") -> Iterator[str]:
+    prompt = build_feedback_prompt(task_outline, submission_text, categories, evaluation_style)
+    return get_evaluation_client().stream(prompt)
+
+class ParseStats:
+    """Process-wide counters for how often responses (and which categories) fail to parse."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.responses = 0
+        self.structured_responses = 0
+        self.structured_fallbacks = 0
+        self.failed_categories = Counter()
+        self.repairs = 0
+        self.repaired_categories = 0
+
+    def record(self, failed: List[str], structured: bool = False):
+        with self._lock:
+            self.responses += 1
+            self.structured_responses += structured
+            self.failed_categories.update(failed)
+
+    def record_fallback(self):
+        with self._lock:
+            self.structured_fallbacks += 1
+
+    def record_repair(self, repaired: int):
+        with self._lock:
+            self.repairs += 1
+            self.repaired_categories += repaired
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "responses": self.responses,
+                "structured_responses": self.structured_responses,
+                "structured_fallbacks": self.structured_fallbacks,
+                "failed_categories": sum(self.failed_categories.values()),
+                "failed_by_category": dict(self.failed_categories),
+                "repairs": self.repairs,
+                "repaired_categories": self.repaired_categories,
+            }
+
+PARSE_STATS = ParseStats()
+
+@dataclass
+class EvaluationResult:
+    scores: Dict[str, Tuple[int, str]]
+    feedback: dict
+    failed_categories: List[str] = field(default_factory=list)
+    structured: bool = False
+    repaired: List[str] = field(default_factory=list)  # categories scored by a follow-up request (utils.repair)
+
+@lru_cache(maxsize=128)
+def _rubric_pattern(category_names: Tuple[str, ...]) -> re.Pattern:
+    # One pattern per rubric: any category heading, its score, and an explanation that stops at the next
+    # category heading or summary section, so the response is scanned once instead of once per category.
+    names = "|".join(re.escape(cat) for cat in sorted(category_names, key=len, reverse=True))
+    return re.compile(
+        rf"({names}):\s*(\d{{1,2}})\/10\s*[-–]\s*(.+?)"
+        rf"(?=\n[^\n]*?(?:{names}):\s*\d{{1,2}}\/10|\n\w+:|Overall Assessment:|Actionable Next Steps:|$)",
+        re.DOTALL | re.IGNORECASE
+    )
+
+_OVERALL_PATTERN = re.compile(r"Overall Assessment:\s*(.*?)(?=Actionable Next Steps:|$)", re.DOTALL)
+_ACTIONS_PATTERN = re.compile(r"Actionable Next Steps:\s*(.*?)$", re.DOTALL)
+_ACTION_ITEM_PATTERN = re.compile(r"\d+\.\s*(.+?)(?=\n\d+\.|$)", re.DOTALL)
+
+def match_scores(ai_response: str, categories: dict) -> Dict[str, Tuple[int, str]]:
+    """The categories that could be read from a text response; the rest are simply absent."""
+    lookup = {cat.lower(): cat for cat in categories}
+    found = {}
+    for match in _rubric_pattern(tuple(categories)).finditer(ai_response):
+        category = lookup[match.group(1).lower()]
+        if category not in found:
+            found[category] = (min(10, max(0, int(match.group(2)))), match.group(3).strip())
+    return found
 
 def parse_scores_enhanced(ai_response: str, categories: dict) -> dict:
-    scores = {}
-    for category in categories.keys():
-        pattern = rf"{re.escape(category)}:\s*(\d{{1,2}})\/10\s*[-–]\s*(.+?)(?=\n\w+:|Overall Assessment:|Actionable Next Steps:|$)"
-        match = re.search(pattern, ai_response, re.DOTALL | re.IGNORECASE)
-        if match:
-            score = min(10, max(0, int(match.group(1))))
-            explanation = match.group(2).strip()
-            scores[category] = (score, explanation)
-        else:
-            scores[category] = (5, "Score could not be parsed.")
-    return scores
+    found = match_scores(ai_response, categories)
+    failed = [cat for cat in categories if cat not in found]
+    PARSE_STATS.record(failed)
+    return {cat: found.get(cat, (5, UNPARSED_EXPLANATION)) for cat in categories}
 
 def extract_enhanced_feedback(ai_response: str) -> dict:
     feedback = {}
-    overall_match = re.search(r"Overall Assessment:\s*(.*?)(?=Actionable Next Steps:|$)", ai_response, re.DOTALL)
+    overall_match = _OVERALL_PATTERN.search(ai_response)
     feedback["overall"] = overall_match.group(1).strip() if overall_match else "No overall assessment found."
 
-    action_match = re.search(r"Actionable Next Steps:\s*(.*?)$", ai_response, re.DOTALL)
+    action_match = _ACTIONS_PATTERN.search(ai_response)
     if action_match:
-        actions = re.findall(r"\d+\.\s*(.+?)(?=\n\d+\.|$)", action_match.group(1), re.DOTALL)
+        actions = _ACTION_ITEM_PATTERN.findall(action_match.group(1))
         feedback["actions"] = [action.strip() for action in actions]
     else:
         feedback["actions"] = ["Review the detailed feedback above."]
     return feedback
+
+@lru_cache(maxsize=128)
+def _response_format(category_names: Tuple[str, ...]) -> dict:
+    entry = {
+        "type": "object",
+        "properties": {"score": {"type": "integer"}, "explanation": {"type": "string"}},
+        "required": ["score", "explanation"],
+        "additionalProperties": False
+    }
+    schema = {
+        "type": "object",
+        "properties": {
+            "categories": {
+                "type": "object",
+                "properties": {cat: entry for cat in category_names},
+                "required": list(category_names),
+                "additionalProperties": False
+            },
+            "overall_assessment": {"type": "string"},
+            "next_steps": {"type": "array", "items": {"type": "string"}}
+        },
+        "required": ["categories", "overall_assessment", "next_steps"],
+        "additionalProperties": False
+    }
+    return {"type": "json_schema", "json_schema": {"name": "scorescope_evaluation", "strict": True, "schema": schema}}
+
+def build_response_format(categories: dict) -> dict:
+    return _response_format(tuple(categories))
+
+def parse_structured_response(ai_response: str, categories: dict) -> Optional[EvaluationResult]:
+    try:
+        data = json.loads(ai_response)
+        graded = data["categories"]
+    except (ValueError, KeyError, TypeError):
+        return None
+
+    scores, failed = {}, []
+    for cat in categories:
+        entry = graded.get(cat) if isinstance(graded, dict) else None
+        try:
+            scores[cat] = (min(10, max(0, int(entry["score"]))), str(entry["explanation"]).strip())
+        except (TypeError, KeyError, ValueError):
+            scores[cat] = (5, UNPARSED_EXPLANATION)
+            failed.append(cat)
+
+    actions = [str(step).strip() for step in data.get("next_steps") or [] if str(step).strip()]
+    feedback = {
+        "overall": str(data.get("overall_assessment") or "").strip() or "No overall assessment found.",
+        "actions": actions or ["Review the detailed feedback above."],
+    }
+    return EvaluationResult(scores, feedback, failed, structured=True)
+
+def parse_evaluation(ai_response: str, categories: dict) -> EvaluationResult:
+    # Structured responses are parsed once from JSON; anything else goes through the single-scan text parser.
+    if ai_response.lstrip().startswith("{"):
+        result = parse_structured_response(ai_response, categories)
+        if result:
+            PARSE_STATS.record(result.failed_categories, structured=True)
+            return result
+        PARSE_STATS.record_fallback()
+    scores = parse_scores_enhanced(ai_response, categories)
+    return EvaluationResult(scores, extract_enhanced_feedback(ai_response), failed_categories(scores))
+
+def failed_categories(scores: dict) -> List[str]:
+    return [cat for cat, (_, explanation) in scores.items() if explanation == UNPARSED_EXPLANATION]
+
+class ScoreStreamParser:
+    """Incremental counterpart of parse_scores_enhanced: feed completion deltas, get each category as its line completes."""
+
+    def __init__(self, categories: dict):
+        self.categories = categories
+        names = "|".join(re.escape(cat) for cat in sorted(categories, key=len, reverse=True))
+        self._pattern = re.compile(rf"({names}):\s*(\d{{1,2}})\/10\s*[-–]\s*(.+)", re.IGNORECASE)
+        self._lookup = {cat.lower(): cat for cat in categories}
+        self._chunks = []
+        self._pending = ""
+        self.scores = {}
+        self.in_summary = False
+
+    @property
+    def text(self) -> str:
+        return "".join(self._chunks)
+
+    def feed(self, chunk: str) -> List[Tuple[str, Tuple[int, str]]]:
+        self._chunks.append(chunk)
+        *lines, self._pending = (self._pending + chunk).split("\n")
+        return [parsed for parsed in map(self._parse_line, lines) if parsed]
+
+    def _parse_line(self, line: str):
+        if "Overall Assessment:" in line:
+            self.in_summary = True
+        match = self._pattern.search(line)
+        if not match:
+            return None
+        category = self._lookup[match.group(1).lower()]
+        if category in self.scores:
+            return None
+        self.scores[category] = (min(10, max(0, int(match.group(2)))), match.group(3).strip())
+        return category, self.scores[category]
+
+    def finish(self) -> dict:
+        self._parse_line(self._pending)
+        self._pending = ""
+        PARSE_STATS.record([cat for cat in self.categories if cat not in self.scores])
+        return {cat: self.scores.get(cat, (5, UNPARSED_EXPLANATION)) for cat in self.categories}
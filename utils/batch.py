@@ -0,0 +1,432 @@
+import argparse
+import csv
+import json
+import os
+import statistics
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from utils.pdf import PAGE_SELECTION_VERSION, extract_selected_text, extract_text_from_bytes, text_cache_key
+from utils.ai import PARSE_STATS, PROMPT_VERSION, SUBMISSION_CHAR_BUDGET, build_feedback_prompt, build_response_format, \
+    failed_categories, parse_evaluation
+from utils.cohort import cohort_key, get_cohort_analytics
+from utils.chunked import DEFAULT_CHUNK_TOKENS, chunked_feedback
+from utils.llm import MODEL, AsyncEvaluationClient
+from utils.repair import repair_scores
+from utils.cache import EvaluationCache, ExtractedTextCache, evaluation_cache_key
+from utils.helpers import DEFAULT_CATEGORIES, calculate_weighted_score
+from utils.resilience import LLM_STATS, RetryPolicy
+from utils.routing import ROUTING_STATS, RoutingPolicy, route_completion
+from utils.similarity import get_similarity_index, minhash, near_duplicate_evaluation
+from utils.upload import hash_path
+from utils.visuals import render_radar_charts, write_chart_report
+
+def discover_submissions(source: str) -> List[Dict[str, str]]:
+    """Collect submissions from a folder of PDFs or a CSV/JSONL manifest with `path` and optional `submission_id`."""
+    source_path = Path(source)
+    if source_path.is_dir():
+        return [
+            {"submission_id": str(path.relative_to(source_path)), "path": str(path)}
+            for path in sorted(source_path.rglob("*.pdf"))
+        ]
+
+    with open(source_path, newline="", encoding="utf-8") as f:
+        if source_path.suffix == ".jsonl":
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+
+    submissions = []
+    for row in rows:
+        path = Path(row["path"])
+        if not path.is_absolute():
+            path = source_path.parent / path
+        submissions.append({"submission_id": row.get("submission_id") or row["path"], "path": str(path)})
+    return submissions
+
+def _extract_submission(path: str, max_pages: int, use_cache: bool, char_budget: Optional[int] = None,
+                        page_workers: Optional[int] = 1) -> dict:
+    # Runs in a worker: hash in chunks and extract by path, never holding the whole file in memory.
+    started = time.perf_counter()
+    file_hash = hash_path(path)
+    text_key = text_cache_key(file_hash, char_budget)
+    text_cache = ExtractedTextCache() if use_cache else None
+    text = text_cache.get(text_key, max_pages) if text_cache else None
+    if text is None:
+        if char_budget:
+            text = extract_selected_text(path, max_pages, char_budget)
+        else:
+            text = extract_text_from_bytes(path, max_pages, workers=page_workers)
+        if text_cache:
+            text_cache.put(text_key, max_pages, text)
+    # The MinHash signature is computed here too, so it stays off the main process.
+    return {"file_hash": file_hash, "text": text, "signature": minhash(text) if text.strip() else None,
+            "extract_s": time.perf_counter() - started}
+
+def _extraction_pool(documents: int, extract_workers: Optional[int], full_text: bool) -> Tuple[Executor, Optional[int]]:
+    """The executor a job's documents are extracted on, and the page workers each document gets.
+
+    Each document normally gets a worker process and is read page by page. A job of fewer full-text documents
+    than workers reads them one at a time instead, each spreading its pages over the PDF worker pool.
+    """
+    if full_text and documents < (extract_workers or os.cpu_count()):
+        return ThreadPoolExecutor(max_workers=1), None
+    return ProcessPoolExecutor(max_workers=extract_workers), 1
+
+def scored_fields(scores: dict, feedback: dict, categories: dict) -> dict:
+    """The score, weighted score and feedback fields of a graded submission's result record."""
+    return {
+        "scores": {cat: score for cat, (score, _) in scores.items()},
+        "weighted_score": calculate_weighted_score(scores, categories),
+        "unparsed_categories": failed_categories(scores),
+        "feedback": feedback,
+    }
+
+class ResultWriter:
+    """Appends one record per submission to a JSONL or CSV file, flushing after each write."""
+
+    def __init__(self, path: str, categories: dict):
+        self.path = Path(path)
+        self.categories = list(categories)
+        self.is_csv = self.path.suffix == ".csv"
+        self._file = None
+        self._writer = None
+
+    @property
+    def fieldnames(self) -> List[str]:
+        return ["submission_id", "path", "file_hash", "status", "error", "weighted_score", *self.categories,
+                "overall", "actions", "extract_s", "evaluate_s", "latency_s", "timestamp"]
+
+    def completed_ids(self) -> set:
+        return {record["submission_id"] for record in self.completed_records()}
+
+    def completed_records(self) -> List[dict]:
+        """Successful records, with `scores` as a category mapping whichever format the file uses."""
+        if not self.path.exists():
+            return []
+        with open(self.path, newline="", encoding="utf-8") as f:
+            if self.is_csv:
+                rows = [{**row, "scores": {cat: float(row[cat]) for cat in self.categories if row.get(cat)}}
+                        for row in csv.DictReader(f)]
+            else:
+                rows = [json.loads(line) for line in f if line.strip()]
+        return [row for row in rows if row.get("status") == "ok"]
+
+    def discard(self, submission_ids: set):
+        """Rewrite the file without any record of these submissions, before they are graded again."""
+        if not submission_ids or not self.path.exists():
+            return
+        with open(self.path, newline="", encoding="utf-8") as f:
+            if self.is_csv:
+                reader = csv.DictReader(f)
+                fieldnames = reader.fieldnames or self.fieldnames
+                kept = [row for row in reader if row["submission_id"] not in submission_ids]
+            else:
+                kept = [line for line in f if line.strip() and json.loads(line)["submission_id"] not in submission_ids]
+        replacement = self.path.with_name(self.path.name + ".tmp")
+        with open(replacement, "w", newline="", encoding="utf-8") as f:
+            if self.is_csv:
+                writer = csv.DictWriter(f, fieldnames=fieldnames)
+                writer.writeheader()
+                writer.writerows(kept)
+            else:
+                f.writelines(kept)
+        os.replace(replacement, self.path)
+
+    def __enter__(self):
+        is_new = not self.path.exists() or self.path.stat().st_size == 0
+        self._file = open(self.path, "a", newline="", encoding="utf-8")
+        if self.is_csv:
+            self._writer = csv.DictWriter(self._file, fieldnames=self.fieldnames, extrasaction="ignore")
+            if is_new:
+                self._writer.writeheader()
+        return self
+
+    def __exit__(self, *exc):
+        self._file.close()
+
+    def write(self, record: dict):
+        if self.is_csv:
+            row = {**record, **record.get("scores", {})}
+            row["overall"] = record.get("feedback", {}).get("overall", "")
+            row["actions"] = " | ".join(record.get("feedback", {}).get("actions", []))
+            self._writer.writerow(row)
+        else:
+            self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+@dataclass
+class BatchReport:
+    total: int = 0
+    skipped: int = 0
+    succeeded: int = 0
+    near_duplicates: int = 0
+    failures: Dict[str, str] = field(default_factory=dict)
+    latencies: List[float] = field(default_factory=list)
+    wall_time_s: float = 0.0
+
+    @property
+    def throughput_per_min(self) -> float:
+        processed = self.succeeded + len(self.failures)
+        return processed / self.wall_time_s * 60 if self.wall_time_s else 0.0
+
+    def percentile(self, pct: float) -> float:
+        if not self.latencies:
+            return 0.0
+        if len(self.latencies) == 1:
+            return self.latencies[0]
+        return statistics.quantiles(self.latencies, n=100, method="inclusive")[int(pct) - 1]
+
+    def summary(self) -> str:
+        lines = [
+            f"Submissions: {self.total} ({self.skipped} already completed, {self.succeeded} succeeded, {len(self.failures)} failed)",
+            f"Wall time: {self.wall_time_s:.1f}s • Throughput: {self.throughput_per_min:.1f} submissions/min",
+        ]
+        if self.latencies:
+            lines.append(
+                f"Latency: p50 {self.percentile(50):.2f}s • p95 {self.percentile(95):.2f}s • max {max(self.latencies):.2f}s"
+            )
+        if self.near_duplicates:
+            lines.append(f"Near-duplicates: {self.near_duplicates} reused the evaluation of a near-identical submission")
+        for submission_id, error in self.failures.items():
+            lines.append(f"FAILED {submission_id}: {error}")
+        return "\n".join(lines)
+
+def run_batch(submissions: List[Dict[str, str]], task_outline: str, output_path: str,
+              categories: Optional[dict] = None, evaluation_style: str = "balanced", max_pages: int = 15,
+              extract_workers: Optional[int] = None, concurrency: int = 8, rpm: int = 500, tpm: int = 150_000,
+              resume: bool = True, use_cache: bool = True, chunk_tokens: Optional[int] = None,
+              structured: bool = False, route: bool = False, retry_policy: Optional[RetryPolicy] = None,
+              repair: bool = True, reuse_near_duplicates: bool = True) -> BatchReport:
+    categories = categories or DEFAULT_CATEGORIES
+    started = time.perf_counter()
+
+    client = AsyncEvaluationClient(max_concurrency=concurrency, rpm=rpm, tpm=tpm, retry_policy=retry_policy)
+    try:
+        report = _run_pipeline(client, EvaluationCache() if use_cache else None, submissions, task_outline,
+                               output_path, categories, evaluation_style, max_pages, extract_workers, resume,
+                               chunk_tokens, structured, route, repair, reuse_near_duplicates)
+    finally:
+        client.close()
+    report.wall_time_s = time.perf_counter() - started
+    return report
+
+def _run_pipeline(client: AsyncEvaluationClient, cache: Optional[EvaluationCache], submissions: List[Dict[str, str]],
+                  task_outline: str, output_path: str, categories: dict, evaluation_style: str, max_pages: int,
+                  extract_workers: Optional[int], resume: bool, chunk_tokens: Optional[int],
+                  structured: bool = False, route: bool = False, repair: bool = True,
+                  reuse_near_duplicates: bool = True) -> BatchReport:
+    report = BatchReport(total=len(submissions))
+    prompt_version = f"{PROMPT_VERSION}+full{chunk_tokens}" if chunk_tokens else f"{PROMPT_VERSION}+{PAGE_SELECTION_VERSION}"
+    # Single-pass prompts get the pages that best fill the budget; chunked grading reads every page in order.
+    char_budget = None if chunk_tokens else SUBMISSION_CHAR_BUDGET
+    # Structured output applies to single-pass requests; chunked parts and the reduce step stay free text.
+    structured = structured and not chunk_tokens
+    response_format = build_response_format(categories) if structured else None
+    if structured:
+        prompt_version += "+json"
+    # Tiered routing applies to single-pass requests, like structured output.
+    policy = RoutingPolicy() if route and not chunk_tokens else None
+
+    cohorts = get_cohort_analytics()
+    cohort = cohort_key(task_outline, categories)
+    index = get_similarity_index()
+
+    def cache_key_for(file_hash: str) -> str:
+        return evaluation_cache_key(file_hash, task_outline, categories, evaluation_style, max_pages,
+                                    model=policy.cache_model if policy else MODEL, prompt_version=prompt_version)
+
+    async def evaluate(text: str) -> tuple:
+        # The LLM stage of one submission: grade it, then re-ask for any categories that failed to parse.
+        async def repair_unparsed(scores: dict, model: Optional[str] = None) -> tuple:
+            return await repair_scores(client, task_outline, text, scores, evaluation_style, model)
+
+        evaluation = decision = None
+        if chunk_tokens:
+            ai_response = await chunked_feedback(client, task_outline, text, categories, evaluation_style, chunk_tokens)
+        else:
+            prompt = build_feedback_prompt(task_outline, text, categories, evaluation_style, structured=structured)
+            if policy:
+                ai_response, evaluation, decision = await route_completion(
+                    client, prompt, categories, response_format, policy, repair_unparsed if repair else None)
+            else:
+                ai_response = await client.complete(prompt, response_format=response_format)
+        if evaluation is None and not ai_response.startswith("ERROR"):
+            evaluation = parse_evaluation(ai_response, categories)
+            if repair and evaluation.failed_categories:
+                evaluation.scores, evaluation.repaired = await repair_unparsed(evaluation.scores)
+        return ai_response, evaluation, decision
+
+    with ResultWriter(output_path, categories) as writer, ExitStack() as stack:
+        done_ids = writer.completed_ids() if resume else set()
+        pending = [s for s in submissions if s["submission_id"] not in done_ids]
+        report.skipped = len(submissions) - len(pending)
+
+        extract_pool, page_workers = _extraction_pool(len(pending), extract_workers, char_budget is None)
+        stack.enter_context(extract_pool)
+        futures = {
+            extract_pool.submit(_extract_submission, s["path"], max_pages, cache is not None, char_budget,
+                                page_workers): (s, {}, None)
+            for s in pending
+        }
+
+        def finish(submission: dict, record: dict, error: Optional[str] = None, result: Optional[dict] = None):
+            if result:
+                record.update(scored_fields(result["scores"], result["feedback"], categories),
+                              latency_s=round(record["extract_s"] + record["evaluate_s"], 3))
+                cohorts.record(cohort, record["file_hash"], result["scores"])
+            record.update(submission_id=submission["submission_id"], path=submission["path"],
+                          status="failed" if error else "ok", error=error,
+                          timestamp=datetime.now().isoformat())
+            if error:
+                report.failures[submission["submission_id"]] = error
+            else:
+                report.succeeded += 1
+                report.latencies.append(record["latency_s"])
+            writer.write(record)
+
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                submission, record, evaluate_started = futures.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    finish(submission, record, f"{type(e).__name__}: {e}")
+                    continue
+
+                if isinstance(result, dict):
+                    record.update(file_hash=result["file_hash"], extract_s=round(result["extract_s"], 3))
+                    if not result["text"].strip():
+                        finish(submission, record, "No extractable text in PDF")
+                        continue
+                    matches = []
+                    if result["signature"] is not None:
+                        matches = index.query(cohort, result["signature"], exclude=result["file_hash"])
+                        index.add(cohort, result["file_hash"], result["signature"], submission["submission_id"])
+                        if matches:
+                            record.update(similar_submissions=len(matches), max_similarity=matches[0][2])
+                    cached = cache.get(cache_key_for(result["file_hash"])) if cache else None
+                    if cached:
+                        record.update(cached=True, evaluate_s=0.0)
+                        finish(submission, record, result=cached)
+                        continue
+                    # A re-exported or lightly edited copy of a submission already graded reuses its evaluation.
+                    reused = near_duplicate_evaluation(
+                        matches, lambda file_hash: cache.get(cache_key_for(file_hash))
+                    ) if cache and reuse_near_duplicates else None
+                    if reused:
+                        record.update(near_duplicate_of=reused["label"], near_duplicate_similarity=reused["similarity"],
+                                      evaluate_s=0.0)
+                        report.near_duplicates += 1
+                        cache.put(cache_key_for(result["file_hash"]), reused["ai_response"], reused["scores"],
+                                  reused["feedback"])
+                        finish(submission, record, result=reused)
+                        continue
+                    future = client.run(evaluate(result["text"]))
+                    futures[future] = (submission, record, time.perf_counter())
+                    continue
+
+                ai_response, evaluation, decision = result
+                if decision:
+                    record.update(model=decision.model, escalated=decision.escalated,
+                                  escalation_reasons=decision.reasons, llm_cost_usd=decision.cost_usd)
+                record["evaluate_s"] = round(time.perf_counter() - evaluate_started, 3)
+                if ai_response.startswith("ERROR"):
+                    finish(submission, record, ai_response)
+                    continue
+
+                record["repaired_categories"] = evaluation.repaired
+                if cache:
+                    cache.put(cache_key_for(record["file_hash"]), ai_response, evaluation.scores, evaluation.feedback)
+                finish(submission, record, result={"scores": evaluation.scores, "feedback": evaluation.feedback})
+
+    return report
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Grade a folder or manifest of PDF submissions headlessly.")
+    parser.add_argument("source", help="Directory of PDFs, or a CSV/JSONL manifest with a `path` column")
+    parser.add_argument("--task-file", required=True, help="Text file containing the task outline")
+    parser.add_argument("--output", required=True, help="Results file (.jsonl or .csv), appended to and resumed from")
+    parser.add_argument("--categories", help="JSON file mapping category names to weights")
+    parser.add_argument("--style", default="balanced", choices=["balanced", "strict", "encouraging"])
+    parser.add_argument("--max-pages", type=int, default=15)
+    parser.add_argument("--extract-workers", type=int, default=None)
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent LLM requests")
+    parser.add_argument("--rpm", type=int, default=500, help="Provider requests-per-minute limit")
+    parser.add_argument("--tpm", type=int, default=150_000, help="Provider tokens-per-minute limit")
+    parser.add_argument("--full-document", nargs="?", type=int, const=DEFAULT_CHUNK_TOKENS, default=None,
+                        metavar="CHUNK_TOKENS", help="Grade long submissions in parts of CHUNK_TOKENS instead of truncating")
+    parser.add_argument("--structured", action="store_true",
+                        help="Request schema-constrained JSON output (single-pass requests only)")
+    parser.add_argument("--route", action="store_true",
+                        help="Grade with the fast model first and escalate borderline results (single-pass requests only)")
+    parser.add_argument("--no-repair", action="store_true",
+                        help="Leave categories that fail to parse at the default score instead of re-asking for them")
+    parser.add_argument("--retries", type=int, default=3, help="Retries per LLM request after a timeout or 429/5xx")
+    parser.add_argument("--timeout", type=float, default=90.0, help="Seconds before an LLM request attempt is abandoned")
+    parser.add_argument("--hedge", action="store_true",
+                        help="Send a duplicate of any LLM request slower than the recent p95 and keep the first reply")
+    parser.add_argument("--no-near-duplicates", action="store_true",
+                        help="Grade near-identical copies of already graded submissions instead of reusing their evaluation")
+    parser.add_argument("--clusters", metavar="CSV",
+                        help="Also write groups of near-identical submissions for this task and rubric to this CSV")
+    parser.add_argument("--charts", metavar="HTML",
+                        help="Also write a radar chart for every graded submission to this HTML report")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore and do not populate the evaluation cache")
+    parser.add_argument("--no-resume", action="store_true", help="Re-grade submissions already in the output file")
+    args = parser.parse_args(argv)
+
+    with open(args.task_file, encoding="utf-8") as f:
+        task_outline = f.read()
+    categories = None
+    if args.categories:
+        with open(args.categories, encoding="utf-8") as f:
+            categories = json.load(f)
+
+    report = run_batch(
+        discover_submissions(args.source), task_outline, args.output,
+        categories=categories, evaluation_style=args.style, max_pages=args.max_pages,
+        extract_workers=args.extract_workers, concurrency=args.concurrency, rpm=args.rpm, tpm=args.tpm,
+        resume=not args.no_resume, use_cache=not args.no_cache, chunk_tokens=args.full_document,
+        structured=args.structured, route=args.route,
+        retry_policy=RetryPolicy(max_attempts=args.retries + 1, attempt_timeout_s=args.timeout, hedge=args.hedge),
+        repair=not args.no_repair, reuse_near_duplicates=not args.no_near_duplicates,
+    )
+    print(report.summary())
+    llm = LLM_STATS.snapshot()
+    print(f"LLM calls: {llm['calls']} • p50 {llm['p50_s']:.2f}s / p95 {llm['p95_s']:.2f}s / p99 {llm['p99_s']:.2f}s • "
+          f"{llm['retries']} retries ({llm['timeouts']} timeouts) • {llm['hedges']} hedged, {llm['hedge_wins']} won")
+    parse_stats = PARSE_STATS.snapshot()
+    if parse_stats["repairs"]:
+        print(f"Repaired {parse_stats['repaired_categories']} unparsed categories in {parse_stats['repairs']} follow-up requests")
+    if args.route:
+        routing = ROUTING_STATS.snapshot()
+        print(f"Routing: {routing['escalations']}/{routing['evaluations']} escalated • "
+              f"p50 model time {routing['p50_latency_s']:.2f}s • ~${routing['cost_usd']:.2f}")
+    if args.clusters:
+        clusters = get_similarity_index().clusters(cohort_key(task_outline, categories or DEFAULT_CATEGORIES))
+        with open(args.clusters, "w", newline="", encoding="utf-8") as f:
+            cluster_writer = csv.writer(f)
+            cluster_writer.writerow(["cluster_id", "label", "file_hash", "similarity"])
+            for cluster_id, members in enumerate(clusters, 1):
+                for member in members:
+                    cluster_writer.writerow([cluster_id, member["label"], member["file_hash"], member["similarity"]])
+        print(f"Wrote {len(clusters)} clusters of near-identical submissions "
+              f"({sum(map(len, clusters))} submissions) to {args.clusters}")
+    if args.charts:
+        records = ResultWriter(args.output, categories or DEFAULT_CATEGORIES).completed_records()
+        charts = render_radar_charts([r["scores"] for r in records], max_workers=args.extract_workers)
+        write_chart_report(args.charts, [(f"{r['submission_id']} • {r['weighted_score']}/10", chart)
+                                         for r, chart in zip(records, charts)])
+        print(f"Wrote {len(charts)} radar charts to {args.charts}")
+    return 1 if report.failures else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,439 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from utils.ai import PROMPT_VERSION, SUBMISSION_CHAR_BUDGET, build_feedback_prompt, build_response_format, \
+    parse_evaluation
+from utils.batch import BatchReport, ResultWriter, _extract_submission, discover_submissions, scored_fields
+from utils.cache import CACHE_DIR, EvaluationCache, SQLiteStore, evaluation_cache_key
+from utils.cohort import cohort_key, get_cohort_analytics
+from utils.helpers import DEFAULT_CATEGORIES
+from utils.llm import MAX_TOKENS, MODEL, chat_request, estimate_tokens
+from utils.pdf import PAGE_SELECTION_VERSION
+from utils.routing import MODEL_PRICES
+from utils.similarity import get_similarity_index, near_duplicate_evaluation
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+COMPLETION_WINDOW = "24h"
+# Provider limits per job file are 50,000 requests and 200 MB; larger cohorts are split across several batches.
+MAX_REQUESTS_PER_FILE = 50_000
+MAX_FILE_BYTES = 190 * 1024 * 1024
+# Batch requests are billed at half the interactive price.
+BATCH_PRICE_FACTOR = 0.5
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+JOBS_DIR = CACHE_DIR / "batch_jobs"
+
+@dataclass
+class BatchJob:
+    job_id: str
+    task_outline: str
+    categories: dict
+    evaluation_style: str
+    prompt_version: str
+    output_path: str                   # the results file graded submissions are ingested into
+    max_pages: int = 15
+    # Without resume, submissions already in the results file were sent again and their old records are replaced.
+    resume: bool = True
+    model: str = MODEL
+    # custom_id (the file hash) -> result records of the submissions with that file; identical files are sent once
+    requests: Dict[str, List[dict]] = field(default_factory=dict)
+    files: List[str] = field(default_factory=list)     # job files, one provider batch each
+    batches: List[dict] = field(default_factory=list)  # id, status, output/error file ids and counts per batch
+    status: str = "prepared"           # prepared, submitted, completed (every batch has finished), ingested
+    ingested: List[str] = field(default_factory=list)  # submission ids this job has written, skipped if ingested again
+    created_at: float = field(default_factory=time.time)
+    estimated_cost_usd: float = 0.0    # upper bound: every completion at MAX_TOKENS
+    cost_usd: Optional[float] = None   # from the usage the provider reported
+
+class BatchJobStore(SQLiteStore):
+    """Offline batch jobs from preparation to ingestion, so any process can track or ingest one."""
+
+    def __init__(self, path: Path = CACHE_DIR / "batch_jobs.sqlite"):
+        super().__init__(path)
+
+    def _create_tables(self, conn: sqlite3.Connection):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                job TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+
+    def get(self, job_id: str) -> Optional[BatchJob]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT job FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return BatchJob(**json.loads(row[0])) if row else None
+
+    def put(self, job: BatchJob):
+        with self._lock, self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?)",
+                         (job.job_id, job.status, json.dumps(asdict(job)), job.created_at, time.time()))
+
+    def recent(self, limit: int = 20) -> List[BatchJob]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT job FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [BatchJob(**json.loads(row[0])) for row in rows]
+
+def batch_cost_usd(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1000 * BATCH_PRICE_FACTOR
+
+def _openai_client():
+    # The SDK is imported on first use, as in utils.llm.
+    from openai import OpenAI
+
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+def _finish(writer: ResultWriter, report: BatchReport, record: dict, categories: dict, cohort: str,
+            error: Optional[str] = None, scores: Optional[dict] = None, feedback: Optional[dict] = None):
+    if scores:
+        record.update(scored_fields(scores, feedback, categories))
+        get_cohort_analytics().record(cohort, record["file_hash"], scores)
+    record.update(status="failed" if error else "ok", error=error, timestamp=datetime.now().isoformat())
+    if error:
+        report.failures[record["submission_id"]] = error
+    else:
+        report.succeeded += 1
+    writer.write(record)
+
+def _write_job_files(job_dir: Path, lines: List[str]) -> List[str]:
+    files, chunk, size = [], [], 0
+    for line in lines + [None]:
+        if chunk and (line is None or len(chunk) >= MAX_REQUESTS_PER_FILE or size + len(line) + 1 > MAX_FILE_BYTES):
+            path = job_dir / f"requests-{len(files)}.jsonl"
+            path.write_text("".join(entry + "\n" for entry in chunk), encoding="utf-8")
+            files.append(str(path))
+            chunk, size = [], 0
+        if line is not None:
+            chunk.append(line)
+            size += len(line) + 1
+    return files
+
+def prepare_batch_job(submissions: List[Dict[str, str]], task_outline: str, output_path: str,
+                      categories: Optional[dict] = None, evaluation_style: str = "balanced", max_pages: int = 15,
+                      extract_workers: Optional[int] = None, resume: bool = True, use_cache: bool = True,
+                      structured: bool = False, reuse_near_duplicates: bool = True,
+                      store: Optional["BatchJobStore"] = None) -> Tuple[BatchJob, BatchReport]:
+    """Extract submissions and write chat completions batch job files for the ones that need grading.
+
+    Prompts are built exactly as for interactive grading. Submissions already graded, cached, or near-identical
+    to a cached one are written to the results file straight away, as run_batch would.
+    """
+    categories = categories or DEFAULT_CATEGORIES
+    store = store or get_batch_job_store()
+    started = time.perf_counter()
+    report = BatchReport(total=len(submissions))
+    prompt_version = f"{PROMPT_VERSION}+{PAGE_SELECTION_VERSION}" + ("+json" if structured else "")
+    response_format = build_response_format(categories) if structured else None
+    job = BatchJob(uuid.uuid4().hex[:12], task_outline, categories, evaluation_style, prompt_version, str(output_path),
+                   max_pages, resume)
+    cache = EvaluationCache() if use_cache else None
+    cohort = cohort_key(task_outline, categories)
+    index = get_similarity_index()
+
+    def cache_key_for(file_hash: str) -> str:
+        return evaluation_cache_key(file_hash, task_outline, categories, evaluation_style, max_pages,
+                                    model=job.model, prompt_version=prompt_version)
+
+    lines = []
+    with ResultWriter(output_path, categories) as writer, \
+            ProcessPoolExecutor(max_workers=extract_workers) as extract_pool:
+        done_ids = writer.completed_ids() if resume else set()
+        pending = [s for s in submissions if s["submission_id"] not in done_ids]
+        report.skipped = len(submissions) - len(pending)
+        futures = [(s, extract_pool.submit(_extract_submission, s["path"], max_pages, use_cache, SUBMISSION_CHAR_BUDGET))
+                   for s in pending]
+
+        for submission, future in futures:
+            record = {"submission_id": submission["submission_id"], "path": submission["path"]}
+            try:
+                result = future.result()
+            except Exception as e:
+                _finish(writer, report, record, categories, cohort, f"{type(e).__name__}: {e}")
+                continue
+            record.update(file_hash=result["file_hash"], extract_s=round(result["extract_s"], 3))
+            if not result["text"].strip():
+                _finish(writer, report, record, categories, cohort, "No extractable text in PDF")
+                continue
+
+            matches = []
+            if result["signature"] is not None:
+                matches = index.query(cohort, result["signature"], exclude=result["file_hash"])
+                index.add(cohort, result["file_hash"], result["signature"], submission["submission_id"])
+            cached = cache.get(cache_key_for(result["file_hash"])) if cache else None
+            if not cached and cache and reuse_near_duplicates:
+                cached = near_duplicate_evaluation(matches, lambda file_hash: cache.get(cache_key_for(file_hash)))
+                if cached:
+                    record.update(near_duplicate_of=cached["label"], near_duplicate_similarity=cached["similarity"])
+                    report.near_duplicates += 1
+                    cache.put(cache_key_for(result["file_hash"]), cached["ai_response"], cached["scores"],
+                              cached["feedback"])
+            if cached:
+                record.setdefault("cached", True)
+                _finish(writer, report, record, categories, cohort, scores=cached["scores"], feedback=cached["feedback"])
+                continue
+
+            if result["file_hash"] not in job.requests:
+                prompt = build_feedback_prompt(task_outline, result["text"], categories, evaluation_style,
+                                               structured=structured)
+                lines.append(json.dumps({
+                    "custom_id": result["file_hash"], "method": "POST", "url": BATCH_ENDPOINT,
+                    "body": chat_request(prompt, job.model, response_format=response_format),
+                }))
+                job.estimated_cost_usd += batch_cost_usd(job.model, estimate_tokens(prompt), MAX_TOKENS)
+            job.requests.setdefault(result["file_hash"], []).append(record)
+
+    job_dir = JOBS_DIR / job.job_id
+    job_dir.mkdir(parents=True, exist_ok=True)
+    job.files = _write_job_files(job_dir, lines)
+    if not job.files:
+        job.status = "ingested"  # nothing left to send
+    store.put(job)
+    report.wall_time_s = time.perf_counter() - started
+    return job, report
+
+def _batch_state(batch) -> dict:
+    counts = batch.request_counts
+    return {"id": batch.id, "status": batch.status, "output_file_id": batch.output_file_id,
+            "error_file_id": batch.error_file_id,
+            "request_counts": {"total": counts.total, "completed": counts.completed, "failed": counts.failed}
+            if counts else None}
+
+def submit_batch_job(job: BatchJob, client=None, store: Optional["BatchJobStore"] = None) -> BatchJob:
+    """Upload each job file and start a batch for it; files already submitted are left alone, so this can resume."""
+    client = client or _openai_client()
+    store = store or get_batch_job_store()
+    for path in job.files[len(job.batches):]:
+        with open(path, "rb") as f:
+            uploaded = client.files.create(file=f, purpose="batch")
+        batch = client.batches.create(input_file_id=uploaded.id, endpoint=BATCH_ENDPOINT,
+                                      completion_window=COMPLETION_WINDOW, metadata={"scorescope_job": job.job_id})
+        job.batches.append(_batch_state(batch))
+        job.status = "submitted"
+        store.put(job)  # after every batch, so a failed submit does not start the earlier ones twice
+    return job
+
+def refresh_batch_job(job: BatchJob, client=None, store: Optional["BatchJobStore"] = None) -> BatchJob:
+    client = client or _openai_client()
+    store = store or get_batch_job_store()
+    for n, state in enumerate(job.batches):
+        if state["status"] not in TERMINAL_STATUSES:
+            job.batches[n] = _batch_state(client.batches.retrieve(state["id"]))
+    if job.status == "submitted" and len(job.batches) == len(job.files) \
+            and all(state["status"] in TERMINAL_STATUSES for state in job.batches):
+        job.status = "completed"
+    store.put(job)
+    return job
+
+def wait_for_batch_job(job: BatchJob, poll_interval_s: float = 60.0, client=None,
+                       store: Optional["BatchJobStore"] = None) -> BatchJob:
+    client = client or _openai_client()
+    while job.status == "submitted":
+        job = refresh_batch_job(job, client, store)
+        if job.status == "submitted":
+            time.sleep(poll_interval_s)
+    return job
+
+def _completion(result: Optional[dict]) -> Tuple[Optional[str], Optional[str], dict]:
+    # (content, error, usage) of one line of a batch output or error file.
+    if result is None:
+        return None, "No result in the batch output", {}
+    if result.get("error"):
+        return None, f"Batch request failed: {result['error'].get('message', result['error'])}", {}
+    response = result.get("response") or {}
+    body = response.get("body") or {}
+    if response.get("status_code") != 200:
+        message = (body.get("error") or {}).get("message", "")
+        return None, f"Batch request failed with status {response.get('status_code')}: {message}", {}
+    return body["choices"][0]["message"]["content"], None, body.get("usage") or {}
+
+def _download_results(job: BatchJob, client) -> List[str]:
+    paths = []
+    for n, state in enumerate(job.batches):
+        for kind in ("output", "error"):
+            file_id = state.get(f"{kind}_file_id")
+            if file_id:
+                path = Path(job.files[n]).with_name(f"{kind}-{n}.jsonl")
+                path.write_text(client.files.content(file_id).text, encoding="utf-8")
+                paths.append(str(path))
+    return paths
+
+def ingest_batch_job(job: BatchJob, result_files: Optional[List[str]] = None, client=None, use_cache: bool = True,
+                     store: Optional["BatchJobStore"] = None) -> BatchReport:
+    """Parse, weight and record a finished job's results into its results file, the cache and cohort analytics.
+
+    `result_files` are local batch output and error files (from a stand-in, say); otherwise every batch's
+    files are downloaded next to the job files. Submissions this job has already written are skipped, so a
+    job can be ingested again; for a job prepared without resume, older records of its submissions are replaced.
+    """
+    store = store or get_batch_job_store()
+    if result_files is None:
+        result_files = _download_results(job, client or _openai_client())
+    results = {}
+    for path in result_files:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    result = json.loads(line)
+                    results[result["custom_id"]] = result
+
+    categories = job.categories
+    cache = EvaluationCache() if use_cache else None
+    cohort = cohort_key(job.task_outline, categories)
+    report = BatchReport(total=sum(map(len, job.requests.values())))
+    prompt_tokens = completion_tokens = 0
+    ingested = set(job.ingested)
+    writer = ResultWriter(job.output_path, categories)
+    if not job.resume:
+        writer.discard({record["submission_id"] for records in job.requests.values() for record in records}
+                       - ingested)
+    with writer:
+        for custom_id, records in job.requests.items():
+            ai_response, error, usage = _completion(results.get(custom_id))
+            prompt_tokens += usage.get("prompt_tokens", 0)
+            completion_tokens += usage.get("completion_tokens", 0)
+            pending = [record for record in records if record["submission_id"] not in ingested]
+            report.skipped += len(records) - len(pending)
+            if not pending:
+                continue
+            evaluation = parse_evaluation(ai_response, categories) if ai_response is not None else None
+            if evaluation and cache:
+                cache.put(evaluation_cache_key(custom_id, job.task_outline, categories, job.evaluation_style,
+                                               job.max_pages, model=job.model, prompt_version=job.prompt_version),
+                          ai_response, evaluation.scores, evaluation.feedback)
+            for record in pending:
+                _finish(writer, report, dict(record, batch_job=job.job_id), categories, cohort, error,
+                        evaluation.scores if evaluation else None, evaluation.feedback if evaluation else None)
+            job.ingested.extend(record["submission_id"] for record in pending)
+
+    job.status = "ingested"
+    job.cost_usd = round(batch_cost_usd(job.model, prompt_tokens, completion_tokens), 6)
+    store.put(job)
+    # Turnaround: from preparing the job to having its results.
+    report.wall_time_s = time.time() - job.created_at
+    return report
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+def get_batch_job_store() -> BatchJobStore:
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = BatchJobStore()
+        return _default_store
+
+def _describe(job: BatchJob) -> str:
+    submissions = sum(map(len, job.requests.values()))
+    lines = [f"Job {job.job_id} • {job.status} • {len(job.requests)} requests for {submissions} submissions • "
+             f"created {datetime.fromtimestamp(job.created_at):%Y-%m-%d %H:%M} • results in {job.output_path}"]
+    for state in job.batches:
+        counts = state["request_counts"] or {}
+        lines.append(f"  batch {state['id']}: {state['status']} "
+                     f"({counts.get('completed', 0)}/{counts.get('total', 0)} done, {counts.get('failed', 0)} failed)")
+    if job.cost_usd is not None:
+        lines.append(f"  cost ~${job.cost_usd:.2f} (~${job.cost_usd / BATCH_PRICE_FACTOR:.2f} at interactive prices)")
+    return "\n".join(lines)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Grade submissions offline through the chat completions Batch API, at batch prices.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    grading = argparse.ArgumentParser(add_help=False)
+    grading.add_argument("source", help="Directory of PDFs, or a CSV/JSONL manifest with a `path` column")
+    grading.add_argument("--task-file", required=True, help="Text file containing the task outline")
+    grading.add_argument("--output", required=True, help="Results file (.jsonl or .csv), appended to and resumed from")
+    grading.add_argument("--categories", help="JSON file mapping category names to weights")
+    grading.add_argument("--style", default="balanced", choices=["balanced", "strict", "encouraging"])
+    grading.add_argument("--max-pages", type=int, default=15)
+    grading.add_argument("--extract-workers", type=int, default=None)
+    grading.add_argument("--structured", action="store_true", help="Request schema-constrained JSON output")
+    grading.add_argument("--no-near-duplicates", action="store_true",
+                         help="Grade near-identical copies of already graded submissions instead of reusing their evaluation")
+    grading.add_argument("--no-cache", action="store_true", help="Ignore and do not populate the evaluation cache")
+    grading.add_argument("--no-resume", action="store_true", help="Re-grade submissions already in the output file")
+    waiting = argparse.ArgumentParser(add_help=False)
+    waiting.add_argument("--poll-interval", type=float, default=60.0, help="Seconds between job status checks")
+
+    commands.add_parser("prepare", parents=[grading], help="Write the batch job files without submitting them")
+    commands.add_parser("run", parents=[grading, waiting], help="Prepare, submit, wait for and ingest a job")
+    commands.add_parser("submit", help="Upload a prepared job and start its batches").add_argument("job_id")
+    commands.add_parser("status", help="Show a job, or the most recent jobs").add_argument("job_id", nargs="?")
+    ingest = commands.add_parser("ingest", parents=[waiting], help="Record a finished job's results")
+    ingest.add_argument("job_id")
+    ingest.add_argument("--result-file", action="append",
+                        help="Ingest this local result (or error) file instead of downloading the job's; repeatable")
+    ingest.add_argument("--wait", action="store_true", help="Wait for the job to finish first")
+    ingest.add_argument("--no-cache", action="store_true", help="Do not add the results to the evaluation cache")
+    args = parser.parse_args(argv)
+
+    store = get_batch_job_store()
+    if args.command in ("prepare", "run"):
+        with open(args.task_file, encoding="utf-8") as f:
+            task_outline = f.read()
+        categories = None
+        if args.categories:
+            with open(args.categories, encoding="utf-8") as f:
+                categories = json.load(f)
+        job, report = prepare_batch_job(
+            discover_submissions(args.source), task_outline, args.output, categories=categories,
+            evaluation_style=args.style, max_pages=args.max_pages, extract_workers=args.extract_workers,
+            resume=not args.no_resume, use_cache=not args.no_cache, structured=args.structured,
+            reuse_near_duplicates=not args.no_near_duplicates, store=store,
+        )
+        print(f"Submissions: {report.total} ({report.skipped} already completed, {report.succeeded} answered from the"
+              f" cache ({report.near_duplicates} near-duplicates), {len(report.failures)} failed)")
+        for submission_id, error in report.failures.items():
+            print(f"FAILED {submission_id}: {error}")
+        print(f"Job {job.job_id}: {len(job.requests)} requests in {len(job.files)} file(s) • estimated at most "
+              f"${job.estimated_cost_usd:.2f} (${job.estimated_cost_usd / BATCH_PRICE_FACTOR:.2f} at interactive prices)")
+        for path in job.files:
+            print(f"  {path}")
+        if args.command == "prepare" or not job.files:
+            return 1 if report.failures else 0
+    else:
+        job = store.get(args.job_id) if args.job_id else None
+        if args.job_id and job is None:
+            parser.error(f"no batch job {args.job_id}")
+
+    if args.command == "status":
+        for shown in [refresh_batch_job(job, store=store) if job.batches else job] if job else store.recent():
+            print(_describe(shown))
+        return 0
+    if args.command in ("submit", "run"):
+        job = submit_batch_job(job, store=store)
+        print(_describe(job))
+        if args.command == "submit":
+            return 0
+    if args.command == "ingest" and job.status == "prepared" and not args.result_file:
+        parser.error(f"job {job.job_id} has not been submitted; submit it or pass --result-file")
+    if args.command == "run" or (args.wait and not args.result_file):
+        job = wait_for_batch_job(job, args.poll_interval, store=store)
+    elif job.status == "submitted" and not args.result_file:
+        job = refresh_batch_job(job, store=store)
+        if job.status == "submitted":
+            print(_describe(job))
+            print("Not finished yet; try again later or pass --wait")
+            return 2
+
+    report = ingest_batch_job(job, args.result_file if args.command == "ingest" else None,
+                              use_cache=not getattr(args, "no_cache", False), store=store)
+    print(report.summary())
+    print(_describe(job))
+    return 1 if report.failures else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
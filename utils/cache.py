@@ -0,0 +1,230 @@
+import abc
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+from utils.ai import PROMPT_VERSION
+from utils.llm import MODEL
+
+CACHE_DIR = Path(os.getenv("SCORESCOPE_CACHE_DIR", ".scorescope_cache"))
+
+def evaluation_cache_key(file_hash: str, task_outline: str, categories: dict, evaluation_style: str, max_pages: int,
+                         model: str = MODEL, prompt_version: str = PROMPT_VERSION) -> str:
+    # The page limit decides which pages are graded, so it is part of the key.
+    payload = json.dumps({
+        "file": file_hash,
+        "max_pages": max_pages,
+        "task": hashlib.sha256(task_outline.strip().encode("utf-8")).hexdigest(),
+        "categories": sorted(categories.items()),
+        "style": evaluation_style,
+        "model": model,
+        "prompt": prompt_version,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class SQLiteStore(abc.ABC):
+    """Base of the on-disk stores: one WAL-mode SQLite file with hit/miss counters; subclasses create their tables."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self._create_tables(conn)
+
+    @abc.abstractmethod
+    def _create_tables(self, conn: sqlite3.Connection):
+        ...
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _count(self, conn: sqlite3.Connection, name: str):
+        conn.execute("INSERT INTO counters VALUES (?, 1) ON CONFLICT(name) DO UPDATE SET value = value + 1", (name,))
+
+    def _record(self, conn: sqlite3.Connection, hit: bool):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        self._count(conn, "hits" if hit else "misses")
+
+    def _stats(self, table: str) -> dict:
+        with self._connect() as conn:
+            count, total = conn.execute(f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {table}").fetchone()
+            counters = dict(conn.execute("SELECT name, value FROM counters"))
+        return {
+            "entries": count,
+            "bytes": total,
+            "hits": self.hits,
+            "misses": self.misses,
+            "total_hits": counters.get("hits", 0),
+            "total_misses": counters.get("misses", 0),
+        }
+
+class EvaluationCache(SQLiteStore):
+    """SQLite-backed store of raw LLM responses and parsed results, evicted by age, entry count and size."""
+
+    def __init__(self, path: Path = CACHE_DIR / "evaluations.sqlite", max_entries: int = 50_000,
+                 max_bytes: int = 512 * 1024 * 1024, max_age_s: float = 30 * 24 * 3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        super().__init__(path)
+
+    def _create_tables(self, conn: sqlite3.Connection):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS evaluations (
+                key TEXT PRIMARY KEY,
+                ai_response TEXT NOT NULL,
+                scores TEXT NOT NULL,
+                feedback TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS evaluations_accessed ON evaluations (accessed_at)")
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT ai_response, scores, feedback FROM evaluations WHERE key = ? AND created_at >= ?",
+                (key, now - self.max_age_s)
+            ).fetchone()
+            self._record(conn, hit=row is not None)
+            if row is None:
+                return None
+            conn.execute("UPDATE evaluations SET accessed_at = ? WHERE key = ?", (now, key))
+        ai_response, scores, feedback = row
+        return {
+            "ai_response": ai_response,
+            "scores": {cat: tuple(value) for cat, value in json.loads(scores).items()},
+            "feedback": json.loads(feedback),
+        }
+
+    def put(self, key: str, ai_response: str, scores: dict, feedback: dict):
+        scores_json = json.dumps(scores)
+        feedback_json = json.dumps(feedback)
+        size = len(ai_response) + len(scores_json) + len(feedback_json)
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO evaluations VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, ai_response, scores_json, feedback_json, size, now, now)
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        conn.execute("DELETE FROM evaluations WHERE created_at < ?", (now - self.max_age_s,))
+        count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM evaluations").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        # Drop least recently used rows until both limits hold again.
+        excess_entries, excess_bytes = count - self.max_entries, total - self.max_bytes
+        doomed = []
+        for key, size in conn.execute("SELECT key, size FROM evaluations ORDER BY accessed_at"):
+            if excess_entries <= 0 and excess_bytes <= 0:
+                break
+            doomed.append((key,))
+            excess_entries -= 1
+            excess_bytes -= size
+        conn.executemany("DELETE FROM evaluations WHERE key = ?", doomed)
+
+    def stats(self) -> dict:
+        return self._stats("evaluations")
+
+class ExtractedTextCache(SQLiteStore):
+    """Compressed extracted PDF text keyed on content hash and page limit, evicted LRU under a byte cap."""
+
+    def __init__(self, path: Path = CACHE_DIR / "extracted_text.sqlite",
+                 max_bytes: int = int(os.getenv("SCORESCOPE_TEXT_CACHE_BYTES", 256 * 1024 * 1024))):
+        self.max_bytes = max_bytes
+        super().__init__(path)
+
+    def _create_tables(self, conn: sqlite3.Connection):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS texts (
+                file_hash TEXT NOT NULL,
+                max_pages INTEGER NOT NULL,
+                text BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (file_hash, max_pages)
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS texts_accessed ON texts (accessed_at)")
+
+    def get(self, file_hash: str, max_pages: int) -> Optional[str]:
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT text FROM texts WHERE file_hash = ? AND max_pages = ?", (file_hash, max_pages)
+            ).fetchone()
+            self._record(conn, hit=row is not None)
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE texts SET accessed_at = ? WHERE file_hash = ? AND max_pages = ?",
+                (time.time(), file_hash, max_pages)
+            )
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    def put(self, file_hash: str, max_pages: int, text: str):
+        blob = zlib.compress(text.encode("utf-8"), 6)
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO texts VALUES (?, ?, ?, ?, ?)",
+                (file_hash, max_pages, blob, len(blob), time.time())
+            )
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM texts").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            doomed = []
+            for key_hash, key_pages, size in conn.execute(
+                "SELECT file_hash, max_pages, size FROM texts ORDER BY accessed_at"
+            ):
+                if total <= self.max_bytes:
+                    break
+                doomed.append((key_hash, key_pages))
+                total -= size
+            conn.executemany("DELETE FROM texts WHERE file_hash = ? AND max_pages = ?", doomed)
+
+    def stats(self) -> dict:
+        return self._stats("texts")
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_evaluation_cache() -> EvaluationCache:
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = EvaluationCache()
+        return _default_cache
+
+_default_text_cache = None
+
+def get_text_cache() -> ExtractedTextCache:
+    global _default_text_cache
+    with _default_cache_lock:
+        if _default_text_cache is None:
+            _default_text_cache = ExtractedTextCache()
+        return _default_text_cache
@@ -0,0 +1,131 @@
+import asyncio
+import os
+from typing import List, Optional
+
+from utils.ai import STYLE_INSTRUCTIONS, build_feedback_prompt, parse_scores_enhanced, extract_enhanced_feedback
+from utils.helpers import UNPARSED_EXPLANATION as UNPARSED
+from utils.llm import AsyncEvaluationClient, estimate_tokens, get_evaluation_client
+
+DEFAULT_CHUNK_TOKENS = 3000
+# Parts of one document graded at once; every call still shares the client's SCORESCOPE_LLM_* limits.
+DEFAULT_CHUNK_CONCURRENCY = int(os.getenv("SCORESCOPE_CHUNK_CONCURRENCY", "4"))
+# Per-part answers only need the category lines, so they get a smaller completion budget than a full evaluation.
+CHUNK_MAX_TOKENS = 1200
+PAGE_MARKER = '\n--- Page'
+
+def split_into_chunks(submission_text: str, max_tokens: int = DEFAULT_CHUNK_TOKENS) -> List[str]:
+    """Greedily pack whole pages into chunks of at most `max_tokens`; an oversized page is split on its own."""
+    pages = submission_text.split(PAGE_MARKER)
+    pages = [pages[0]] + [PAGE_MARKER + page for page in pages[1:]]
+    max_chars = max_tokens * 4
+
+    chunks, current, current_tokens = [], [], 0
+    for page in pages:
+        if not page.strip():
+            continue
+        page_tokens = estimate_tokens(page)
+        if current and current_tokens + page_tokens > max_tokens:
+            chunks.append("".join(current))
+            current, current_tokens = [], 0
+        if page_tokens > max_tokens:
+            chunks.extend(page[i:i + max_chars] for i in range(0, len(page), max_chars))
+            continue
+        current.append(page)
+        current_tokens += page_tokens
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+def build_chunk_prompt(task_outline: str, chunk: str, index: int, total: int, categories: dict,
+                       evaluation_style: str = "balanced") -> str:
+    excerpt = (
+        f"[Part {index} of {total} of a longer submission. Score each category only on the evidence in this part; "
+        f"other parts are assessed separately.]\n{chunk}"
+    )
+    return build_feedback_prompt(task_outline, excerpt, categories, evaluation_style, max_chars=None)
+
+def build_reduce_prompt(task_outline: str, part_scores: List[dict], categories: dict,
+                        evaluation_style: str = "balanced") -> str:
+    parts = []
+    for index, scores in enumerate(part_scores, 1):
+        lines = [f"{cat}: {score}/10 - {explanation}" for cat, (score, explanation) in scores.items()
+                 if explanation != UNPARSED]
+        parts.append(f"Part {index}:\n" + ("\n".join(lines) or "(no usable scores)"))
+    category_list = "\n".join([f"{i+1}. {cat}" for i, cat in enumerate(categories.keys())])
+
+    return f"""
+You are an expert evaluator with a {evaluation_style} approach. {STYLE_INSTRUCTIONS[evaluation_style]}
+
+EVALUATION TASK:
+{task_outline}
+
+The submission was too long to read at once, so it was assessed in {len(part_scores)} consecutive parts.
+Per-part results:
+
+{chr(10).join(parts)}
+
+Combine these into a single evaluation of the whole submission across these categories (rate each 0-10):
+{category_list}
+
+Requirements met in any part count as met. Weigh the parts by how much evidence each provides rather than averaging blindly.
+
+Format:
+Category Name: X/10 - Explanation. Improvement suggestion.
+
+Then provide:
+Overall Assessment:
+Actionable Next Steps:
+"""
+
+def merge_part_scores(part_scores: List[dict], weights: List[int], categories: dict) -> dict:
+    # Deterministic fallback when the reduce call fails: evidence-weighted mean of the parsed part scores.
+    merged = {}
+    for cat in categories:
+        scored = [(scores[cat][0], weight) for scores, weight in zip(part_scores, weights)
+                  if scores[cat][1] != UNPARSED]
+        if not scored:
+            merged[cat] = (5, UNPARSED)
+            continue
+        mean = sum(score * weight for score, weight in scored) / sum(weight for _, weight in scored)
+        merged[cat] = (round(mean), f"Combined from {len(scored)} of {len(part_scores)} parts of the submission.")
+    return merged
+
+async def chunked_feedback(client: AsyncEvaluationClient, task_outline: str, submission_text: str, categories: dict,
+                           evaluation_style: str = "balanced", chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+                           max_concurrency: int = DEFAULT_CHUNK_CONCURRENCY) -> str:
+    chunks = split_into_chunks(submission_text, chunk_tokens)
+    if len(chunks) <= 1:
+        prompt = build_feedback_prompt(task_outline, submission_text, categories, evaluation_style, max_chars=None)
+        return await client.complete(prompt)
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def evaluate(index: int, chunk: str) -> str:
+        async with semaphore:
+            prompt = build_chunk_prompt(task_outline, chunk, index, len(chunks), categories, evaluation_style)
+            return await client.complete(prompt, max_tokens=CHUNK_MAX_TOKENS)
+
+    responses = await asyncio.gather(*(evaluate(i, chunk) for i, chunk in enumerate(chunks, 1)))
+    usable = [(response, estimate_tokens(chunk)) for response, chunk in zip(responses, chunks)
+              if not response.startswith("ERROR")]
+    if not usable:
+        return responses[0]
+    part_scores = [parse_scores_enhanced(response, categories) for response, _ in usable]
+
+    reduced = await client.complete(build_reduce_prompt(task_outline, part_scores, categories, evaluation_style))
+    if not reduced.startswith("ERROR"):
+        return reduced
+
+    merged = merge_part_scores(part_scores, [weight for _, weight in usable], categories)
+    last_feedback = extract_enhanced_feedback(usable[-1][0])
+    lines = [f"{cat}: {score}/10 - {explanation}" for cat, (score, explanation) in merged.items()]
+    actions = "\n".join(f"{i}. {action}" for i, action in enumerate(last_feedback["actions"], 1))
+    return "\n".join(lines) + f"\n\nOverall Assessment:\n{last_feedback['overall']}\n\nActionable Next Steps:\n{actions}"
+
+def get_chunked_ai_feedback(task_outline: str, submission_text: str, categories: dict,
+                            evaluation_style: str = "balanced", chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+                            max_concurrency: int = DEFAULT_CHUNK_CONCURRENCY,
+                            client: Optional[AsyncEvaluationClient] = None) -> str:
+    client = client or get_evaluation_client()
+    return client.run(chunked_feedback(client, task_outline, submission_text, categories, evaluation_style,
+                                       chunk_tokens, max_concurrency)).result()
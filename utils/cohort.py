@@ -0,0 +1,175 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.cache import CACHE_DIR, SQLiteStore
+from utils.helpers import UNPARSED_EXPLANATION
+
+SCORE_LEVELS = 11  # integer scores 0..10
+SUMMARY_PERCENTILES = (25, 50, 75, 90)
+# Below this many graded submissions a cohort benchmark is noise; callers fall back to a fixed target.
+MIN_COHORT_SIZE = 5
+
+def cohort_key(task_outline: str, categories: dict) -> str:
+    # A cohort is every submission graded against the same task and rubric, whatever the file or style.
+    payload = json.dumps({
+        "task": hashlib.sha256(task_outline.strip().encode("utf-8")).hexdigest(),
+        "categories": sorted(categories.items()),
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class CohortHistogram:
+    """Score counts per category (rows) and score level (columns); every statistic is derived from it."""
+
+    def __init__(self, categories: List[str], counts: Optional[np.ndarray] = None):
+        self.categories = list(categories)
+        self._rows = {cat: i for i, cat in enumerate(self.categories)}
+        self.counts = counts if counts is not None else np.zeros((len(self.categories), SCORE_LEVELS), dtype=np.int64)
+
+    def add(self, scores: Dict[str, int]):
+        for cat, score in scores.items():
+            row = self._rows.get(cat)
+            if row is None:
+                row = self._rows[cat] = len(self.categories)
+                self.categories.append(cat)
+                self.counts = np.vstack([self.counts, np.zeros(SCORE_LEVELS, dtype=np.int64)])
+            self.counts[row, score] += 1
+
+    @property
+    def sizes(self) -> np.ndarray:
+        return self.counts.sum(axis=1)
+
+    def means(self) -> np.ndarray:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.counts @ np.arange(SCORE_LEVELS) / self.sizes
+
+    def percentiles(self, pcts: Iterable[float]) -> np.ndarray:
+        """Nearest-rank percentiles, shape (len(pcts), categories); NaN for categories with no scores."""
+        sizes = self.sizes
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cdf = np.cumsum(self.counts, axis=1) / sizes[:, None]
+        q = np.asarray(list(pcts), dtype=float)[:, None, None] / 100
+        result = np.argmax(cdf[None, :, :] >= q - 1e-12, axis=2).astype(float)
+        result[:, sizes == 0] = np.nan
+        return result
+
+    def summary(self) -> pd.DataFrame:
+        table = pd.DataFrame({"n": self.sizes, "mean": np.round(self.means(), 2)}, index=self.categories)
+        for pct, values in zip(SUMMARY_PERCENTILES, self.percentiles(SUMMARY_PERCENTILES)):
+            table[f"p{pct}"] = values
+        table.index.name = "category"
+        return table
+
+    def distribution(self) -> pd.DataFrame:
+        return pd.DataFrame(self.counts, index=self.categories, columns=range(SCORE_LEVELS))
+
+class CohortAnalytics(SQLiteStore):
+    """Per-cohort score histograms, persisted in SQLite and mirrored in memory.
+
+    Each distinct submission (file hash) counts once per cohort. New results update the stored and the
+    in-memory histogram incrementally, so statistics never rescan individual evaluations.
+    """
+
+    def __init__(self, path: Path = CACHE_DIR / "cohorts.sqlite"):
+        self._histograms: Dict[str, CohortHistogram] = {}
+        super().__init__(path)
+
+    def _create_tables(self, conn: sqlite3.Connection):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cohort_members (
+                cohort TEXT NOT NULL,
+                file_hash TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (cohort, file_hash)
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cohort_histogram (
+                cohort TEXT NOT NULL,
+                category TEXT NOT NULL,
+                score INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (cohort, category, score)
+            )
+        """)
+
+    def _load(self, cohort: str) -> CohortHistogram:
+        histogram = self._histograms.get(cohort)
+        if histogram is None:
+            with self._connect() as conn:
+                rows = conn.execute(
+                    "SELECT category, score, count FROM cohort_histogram WHERE cohort = ?", (cohort,)
+                ).fetchall()
+            categories = list(dict.fromkeys(category for category, _, _ in rows))
+            histogram = CohortHistogram(categories)
+            rows_by_category = {cat: i for i, cat in enumerate(categories)}
+            for category, score, count in rows:
+                histogram.counts[rows_by_category[category], score] = count
+            self._histograms[cohort] = histogram
+        return histogram
+
+    def record(self, cohort: str, file_hash: str, scores: Dict[str, Tuple[int, str]]) -> bool:
+        return self.record_many(cohort, [(file_hash, scores)]) > 0
+
+    def record_many(self, cohort: str, results: Iterable[Tuple[str, Dict[str, Tuple[int, str]]]]) -> int:
+        """Add graded submissions to a cohort in one transaction; returns how many were new to it."""
+        now = time.time()
+        added = []
+        with self._lock:
+            histogram = self._load(cohort)
+            with self._connect() as conn:
+                for file_hash, scores in results:
+                    inserted = conn.execute(
+                        "INSERT OR IGNORE INTO cohort_members VALUES (?, ?, ?)", (cohort, file_hash, now)
+                    ).rowcount
+                    if not inserted:
+                        continue
+                    # Placeholder scores for unparsed categories would bias the cohort towards 5/10.
+                    parsed = {cat: int(score) for cat, (score, explanation) in scores.items()
+                              if explanation != UNPARSED_EXPLANATION}
+                    conn.executemany("""
+                        INSERT INTO cohort_histogram VALUES (?, ?, ?, 1)
+                        ON CONFLICT(cohort, category, score) DO UPDATE SET count = count + 1
+                    """, [(cohort, cat, score) for cat, score in parsed.items()])
+                    added.append(parsed)
+            for parsed in added:
+                histogram.add(parsed)
+        return len(added)
+
+    def histogram(self, cohort: str) -> CohortHistogram:
+        # A snapshot, so readers never see a half-applied update from another session.
+        with self._lock:
+            histogram = self._load(cohort)
+            return CohortHistogram(histogram.categories, histogram.counts.copy())
+
+    def size(self, cohort: str) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM cohort_members WHERE cohort = ?", (cohort,)).fetchone()[0]
+
+    def benchmark(self, cohort: str, categories: Iterable[str], percentile: float = 50) -> Optional[Dict[str, float]]:
+        """Per-category cohort percentile for the radar chart, or None while the cohort is too small."""
+        with self._lock:
+            histogram = self._load(cohort)
+            if not len(histogram.categories) or histogram.sizes.min() < MIN_COHORT_SIZE:
+                return None
+            values = dict(zip(histogram.categories, histogram.percentiles([percentile])[0]))
+        if any(cat not in values or np.isnan(values[cat]) for cat in categories):
+            return None
+        return {cat: float(values[cat]) for cat in categories}
+
+_default_cohorts = None
+_default_cohorts_lock = threading.Lock()
+
+def get_cohort_analytics() -> CohortAnalytics:
+    global _default_cohorts
+    with _default_cohorts_lock:
+        if _default_cohorts is None:
+            _default_cohorts = CohortAnalytics()
+        return _default_cohorts
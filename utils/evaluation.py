@@ -0,0 +1,317 @@
+import asyncio
+import time
+from dataclasses import dataclass, fields
+from typing import BinaryIO, Callable, Optional, Union
+
+from utils.ai import PROMPT_VERSION, SUBMISSION_CHAR_BUDGET, build_feedback_prompt, build_response_format, parse_evaluation, \
+    extract_enhanced_feedback, failed_categories, ScoreStreamParser
+from utils.cache import get_evaluation_cache, evaluation_cache_key
+from utils.chunked import DEFAULT_CHUNK_TOKENS, get_chunked_ai_feedback, split_into_chunks
+from utils.helpers import calculate_weighted_score
+from utils.jobs import Job
+from utils.llm import MODEL, estimate_tokens, get_evaluation_client
+from utils.pdf import PAGE_SELECTION_VERSION, cached_pdf_text
+from utils.repair import get_repaired_scores
+from utils.resubmission import MAX_INCREMENTAL_CHAIN, MAX_INCREMENTAL_RATIO, RESUBMISSION_STATS, Draft, \
+    SubmissionDiff, build_incremental_prompt, diff_submissions, draft_key, get_draft_store, parse_incremental
+from utils.routing import RoutingPolicy, route_completion
+from utils.singleflight import SingleFlight
+from utils.timing import StageTimer
+from utils.upload import ingest_upload
+
+EVALUATION_FLIGHTS = SingleFlight("evaluation")
+
+class EvaluationError(Exception):
+    """An evaluation that cannot produce scores; the message is shown to the user as-is."""
+
+@dataclass
+class EvaluationRequest:
+    file_name: str
+    upload: Union[bytes, BinaryIO]  # read once, by ingest_upload on the job worker
+    task_outline: str
+    categories: dict
+    evaluation_style: str = "balanced"
+    max_pages: int = 15
+    full_document: bool = True
+    chunk_tokens: int = DEFAULT_CHUNK_TOKENS
+    structured: bool = False
+    stream: bool = True
+    routed: bool = True
+    repair: bool = True  # re-ask for categories that fail to parse instead of defaulting them
+    user_id: Optional[str] = None  # resubmissions are recognised per user and graded against the previous draft
+    incremental: bool = True
+    reuse_near_duplicates: bool = True  # reuse the cached evaluation of a near-identical submission for the task
+
+    def describe(self) -> dict:
+        # Everything the results view needs, without the upload (asdict would deep-copy it).
+        return {f.name: getattr(self, f.name) for f in fields(self) if f.name != "upload"}
+
+def _stream_into_job(job: Job, prompt: str, categories: dict, model: Optional[str] = None) -> tuple:
+    # (response, parser): the parser has read every category line, or is None if the request failed.
+    parser = ScoreStreamParser(categories)
+    job.partial_scores, job.partial_summary = {}, ""
+    try:
+        for chunk in get_evaluation_client().stream(prompt, model):
+            parser.feed(chunk)
+            job.partial_scores = dict(parser.scores)
+            if parser.in_summary:
+                job.partial_summary = parser.text.split("Overall Assessment:", 1)[1]
+    except Exception as e:
+        return f"ERROR: OpenAI API issue - {str(e)}", None
+    return parser.text, parser
+
+def _call_model(job: Job, prompt: str, categories: dict, model: Optional[str], response_format: Optional[dict],
+                stream: bool) -> tuple:
+    # (response, scores): scores only when streamed, which parses as it goes.
+    if stream:
+        ai_response, parser = _stream_into_job(job, prompt, categories, model)
+        return ai_response, parser and parser.finish()
+    return get_evaluation_client().submit(prompt, response_format, model).result(), None
+
+def _routed_call(job: Job, timer: StageTimer, prompt: str, categories: dict, response_format: Optional[dict],
+                 stream: bool, policy: RoutingPolicy, repair: Callable[[dict, Optional[str]], dict]) -> tuple:
+    """route_completion for one job: each model call is timed as its own stage and, if `stream`, streamed into the job.
+
+    Returns (response, scores, feedback, decision); scores and feedback are None when the final call failed.
+    """
+    client = get_evaluation_client()
+
+    def call(prompt: str, response_format: Optional[dict], model: str, stage: str) -> str:
+        with timer.stage(stage):
+            if stream:
+                return _stream_into_job(job, prompt, categories, model)[0]
+            return client.submit(prompt, response_format, model).result()
+
+    async def complete(prompt: str, response_format: Optional[dict], model: str, stage: str) -> str:
+        # The job's calls block on the client's loop, so they are made from a worker thread.
+        return await asyncio.to_thread(call, prompt, response_format, model, stage)
+
+    async def repair_unparsed(scores: dict, model: str) -> tuple:
+        repaired_scores = await asyncio.to_thread(repair, scores, model)
+        unparsed = failed_categories(repaired_scores)
+        return repaired_scores, [cat for cat in failed_categories(scores) if cat not in unparsed]
+
+    ai_response, evaluation, decision = client.run(
+        route_completion(client, prompt, categories, response_format, policy, repair_unparsed, complete)).result()
+    if evaluation is None:
+        return ai_response, None, None, decision
+    return ai_response, evaluation.scores, evaluation.feedback, decision
+
+def _regrade_draft(timer: StageTimer, request: EvaluationRequest, previous: Draft, diff: SubmissionDiff,
+                   full_prompt: str) -> Optional[tuple]:
+    """Grade a resubmission from its previous draft's evaluation and what changed since.
+
+    A draft with no material change keeps every score; otherwise only the changed passages are re-assessed.
+    Returns (response, scores, feedback, resubmission report), or None if the follow-up request failed.
+    """
+    full_tokens = estimate_tokens(full_prompt) + previous.full_completion_tokens
+    report = {"mode": "reused", "changed_ratio": round(diff.changed_ratio, 3),
+              "changed_passages": len(diff.hunks) + len(diff.removed), "rescored": [], "tokens_used": 0}
+    if not diff.material:
+        ai_response, scores, feedback_data, seconds = previous.ai_response, previous.scores, previous.feedback, 0.0
+    else:
+        with timer.stage("llm_call"):
+            started = time.perf_counter()
+            prompt = build_incremental_prompt(request.task_outline, request.categories, request.evaluation_style,
+                                              previous, diff)
+            ai_response = get_evaluation_client().submit(prompt).result()
+            seconds = time.perf_counter() - started
+        if ai_response.startswith("ERROR"):
+            return None
+        with timer.stage("parsing"):
+            scores, feedback_data, rescored = parse_incremental(ai_response, request.categories, previous)
+        report.update(mode="incremental", rescored=rescored,
+                      tokens_used=estimate_tokens(prompt) + estimate_tokens(ai_response))
+    report.update(tokens_saved=full_tokens - report["tokens_used"],
+                  seconds_saved=round(previous.full_llm_s - seconds, 2))
+    RESUBMISSION_STATS.record(report["mode"], report["tokens_saved"], report["seconds_saved"])
+    return ai_response, scores, feedback_data, report
+
+def _similar_submissions(timer: StageTimer, request: EvaluationRequest, file_hash: str, submission_text: str) -> list:
+    """Indexed submissions for the same task and rubric whose text is near-identical, best first; indexes this one."""
+    from utils.cohort import cohort_key  # NumPy stays off the start-up path
+    from utils.similarity import SIMILAR_THRESHOLD, get_similarity_index, minhash
+
+    with timer.stage("similarity"):
+        signature = minhash(submission_text)
+        if signature is None:
+            return []
+        index = get_similarity_index()
+        cohort = cohort_key(request.task_outline, request.categories)
+        matches = index.query(cohort, signature, SIMILAR_THRESHOLD, exclude=file_hash)
+        index.add(cohort, file_hash, signature, request.file_name)
+    return matches
+
+def run_evaluation(job: Job, request: EvaluationRequest) -> dict:
+    """The full analysis pipeline for one submission, run on a job worker; progress is published on `job`."""
+    timer = StageTimer(on_stage=lambda stage: setattr(job, "stage", stage))
+    categories = request.categories
+
+    with timer.stage("hashing"):
+        upload = ingest_upload(request.upload)
+        file_hash = upload.file_hash
+
+    with timer.stage("cache_lookup"):
+        cache = get_evaluation_cache()
+        # Full documents are read page by page; otherwise the pages that best fill the prompt budget are chosen.
+        char_budget = None if request.full_document else SUBMISSION_CHAR_BUDGET
+        if request.full_document:
+            prompt_version = f"{PROMPT_VERSION}+full{request.chunk_tokens}"
+        else:
+            prompt_version = f"{PROMPT_VERSION}+{PAGE_SELECTION_VERSION}"
+        if request.structured:
+            prompt_version += "+json"
+        policy = RoutingPolicy() if request.routed else None
+
+        def key_for(evaluated_hash: str, model: Optional[str] = None) -> str:
+            return evaluation_cache_key(evaluated_hash, request.task_outline, categories, request.evaluation_style,
+                                        request.max_pages, model=model or (policy.cache_model if policy else MODEL),
+                                        prompt_version=prompt_version)
+
+        def cached_evaluation(evaluated_hash: str) -> Optional[dict]:
+            # Map-reduce grading always runs on the strong model, so a long document's result is keyed on it whatever
+            # the routing; whether a full-document request is chunked is only known once its text is extracted.
+            found = cache.get(key_for(evaluated_hash))
+            if found is None and policy and request.full_document:
+                found = cache.get(key_for(evaluated_hash, MODEL))
+            return found
+
+        cache_key = key_for(file_hash)
+        cached = cached_evaluation(file_hash)
+        # A resubmission of the same assignment is graded against the user's last graded draft of it.
+        drafts = get_draft_store() if request.user_id and request.incremental else None
+        draft_id = draft_key(request.user_id, request.task_outline, categories, request.evaluation_style,
+                             request.max_pages, prompt_version) if drafts else None
+        previous = drafts.get(draft_id) if drafts and not cached else None
+
+    def evaluate() -> tuple:
+        with timer.stage("pdf_extraction"):
+            try:
+                submission_text = cached_pdf_text(file_hash, request.max_pages, upload.source, char_budget)
+            except Exception as e:
+                raise EvaluationError(f"PDF processing error: {str(e)}")
+        if not submission_text:
+            raise EvaluationError("Failed to extract text from PDF. Please try again with a different file.")
+
+        diff = None
+        if previous:
+            with timer.stage("diffing"):
+                diff = diff_submissions(previous.text, submission_text)
+
+        # Re-exported or lightly edited copies reuse an existing evaluation; a user's own drafts are diffed instead.
+        matches = _similar_submissions(timer, request, file_hash, submission_text)
+        similarity = {"similar_submissions": len(matches), "max_similarity": matches[0][2]} if matches else None
+        reused = None
+        if not previous and request.reuse_near_duplicates:
+            from utils.similarity import near_duplicate_evaluation
+
+            reused = near_duplicate_evaluation(matches, cached_evaluation)
+            if reused:
+                similarity.update(reused_from=reused["file_hash"], reused_similarity=reused["similarity"])
+
+        with timer.stage("prompt_build"):
+            chunked = request.full_document and len(split_into_chunks(submission_text, request.chunk_tokens)) > 1
+            prompt = build_feedback_prompt(request.task_outline, submission_text, categories, request.evaluation_style,
+                                           max_chars=char_budget,
+                                           structured=request.structured)
+
+        repaired = []
+
+        def repair(scores: dict, model: Optional[str] = None) -> dict:
+            # A short follow-up for just the unparsed categories, on the model that missed them.
+            repaired.clear()  # an escalation replaces the scores an earlier repair filled in
+            if not request.repair or not failed_categories(scores):
+                return scores
+            with timer.stage("repair"):
+                scores, repaired[:] = get_repaired_scores(request.task_outline, submission_text, scores,
+                                                          request.evaluation_style, model)
+            return scores
+
+        stream = request.stream and not request.structured
+        response_format = build_response_format(categories) if request.structured else None
+        scores = feedback_data = routing = resubmission = None
+        llm_started = time.perf_counter()
+        # Long incremental chains are re-anchored with a full grade so drift from the original cannot build up.
+        regraded = None
+        if diff and previous.chain < MAX_INCREMENTAL_CHAIN and diff.changed_ratio <= MAX_INCREMENTAL_RATIO \
+                and diff.changed_text_chars <= SUBMISSION_CHAR_BUDGET:
+            regraded = _regrade_draft(timer, request, previous, diff, prompt)
+        if regraded:
+            ai_response, scores, feedback_data, resubmission = regraded
+        elif reused:
+            ai_response, scores, feedback_data = reused["ai_response"], reused["scores"], reused["feedback"]
+        elif chunked:
+            # Map-reduce grading of long documents stays on the strong model.
+            with timer.stage("llm_call"):
+                ai_response = get_chunked_ai_feedback(request.task_outline, submission_text, categories,
+                                                      request.evaluation_style, request.chunk_tokens)
+        elif policy:
+            ai_response, scores, feedback_data, decision = _routed_call(job, timer, prompt, categories,
+                                                                        response_format, stream, policy, repair)
+            routing = decision.as_dict()
+        else:
+            with timer.stage("llm_call"):
+                ai_response, scores = _call_model(job, prompt, categories, None, response_format, stream)
+        if ai_response.startswith("ERROR"):
+            raise EvaluationError(ai_response)
+
+        with timer.stage("parsing"):
+            if scores is None:
+                evaluation = parse_evaluation(ai_response, categories)
+                scores, feedback_data = evaluation.scores, evaluation.feedback
+            elif feedback_data is None:
+                feedback_data = extract_enhanced_feedback(ai_response)
+        if not (regraded or reused) and (not policy or chunked):
+            scores = repair(scores)
+
+        if regraded:
+            # Derived from this user's earlier draft, so kept out of the shared evaluation cache.
+            chain = previous.chain + (resubmission["mode"] == "incremental")
+            draft = Draft(file_hash, submission_text, ai_response, scores, feedback_data, chain,
+                          previous.full_llm_s, previous.full_completion_tokens)
+        else:
+            cache.put(key_for(file_hash, MODEL) if chunked else cache_key, ai_response, scores, feedback_data)
+            draft = Draft(file_hash, submission_text, ai_response, scores, feedback_data,
+                          full_llm_s=time.perf_counter() - llm_started, full_completion_tokens=estimate_tokens(ai_response))
+            if diff:
+                resubmission = {"mode": "full", "changed_ratio": round(diff.changed_ratio, 3),
+                                "changed_passages": len(diff.hunks) + len(diff.removed)}
+                RESUBMISSION_STATS.record("full", 0, 0.0)
+        if drafts:
+            drafts.put(draft_id, draft)
+        return ai_response, scores, feedback_data, {"routing": routing, "repaired": repaired,
+                                                    "resubmission": resubmission, "similarity": similarity}
+
+    coalesced = False
+    details = {"routing": None, "repaired": [], "resubmission": None, "similarity": None}
+    with upload:
+        if cached:
+            ai_response = cached["ai_response"]
+            scores = cached["scores"]
+            feedback_data = cached["feedback"]
+        else:
+            # Identical submissions already being evaluated (in any session) are waited on instead of re-run.
+            # A resubmission's result depends on the user's own previous draft, so it is only shared with itself.
+            flight_key = (cache_key, draft_id) if previous else cache_key
+            (ai_response, scores, feedback_data, details), ran = EVALUATION_FLIGHTS.do(
+                flight_key, evaluate, wait_context=lambda: timer.stage("coalesced_wait"))
+            coalesced = not ran
+
+    with timer.stage("weighting"):
+        from utils.cohort import cohort_key, get_cohort_analytics  # NumPy/pandas stay off the start-up path
+
+        weighted_score = calculate_weighted_score(scores, categories)
+        get_cohort_analytics().record(cohort_key(request.task_outline, categories), file_hash, scores)
+
+    return {
+        "request": request.describe(),
+        "ai_response": ai_response,
+        "scores": scores,
+        "feedback": feedback_data,
+        "weighted_score": weighted_score,
+        "cached": bool(cached),
+        "coalesced": coalesced,
+        **details,
+        "stage_timings": timer.as_dict(),
+        "processing_time": timer.total,
+    }
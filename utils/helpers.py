@@ -1,7 +1,19 @@
-
 import hashlib
 from typing import Dict, Tuple
 
+# Default categories with weights
+DEFAULT_CATEGORIES = {
+    "Requirements Fulfillment": 25,
+    "Content Quality & Depth": 20,
+    "Clarity & Communication": 18,
+    "Structure & Organization": 15,
+    "Critical Thinking": 12,
+    "Presentation & Format": 10
+}
+
+# Placeholder explanation for a category the model's response did not score.
+UNPARSED_EXPLANATION = "Score could not be parsed."
+
 def get_score_color_class(score: int) -> str:
     if score >= 8:
         return "score-excellent"
@@ -13,9 +25,14 @@ def get_score_color_class(score: int) -> str:
         return "score-poor"
 
 def calculate_weighted_score(scores: Dict[str, Tuple[int, str]], weights: Dict[str, int]) -> float:
-    total_weighted = sum(scores[cat][0] * weights[cat] for cat in weights.keys())
-    total_weights = sum(weights.values())
+    # Unparsed categories carry a placeholder 5/10, so they are left out rather than dragging the score to the middle.
+    parsed = {cat: weight for cat, weight in weights.items() if scores[cat][1] != UNPARSED_EXPLANATION} or weights
+    total_weighted = sum(scores[cat][0] * parsed[cat] for cat in parsed)
+    total_weights = sum(parsed.values())
     return round(total_weighted / total_weights, 2)
 
+def get_bytes_hash(data: bytes) -> str:
+    return hashlib.md5(data).hexdigest()
+
 def get_file_hash(uploaded_file) -> str:
-    return hashlib.md5(uploaded_file.getvalue()).hexdigest()
+    return get_bytes_hash(uploaded_file.getvalue())
@@ -0,0 +1,130 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from utils.cache import CACHE_DIR, SQLiteStore
+
+# The progress chart never draws more than this many points per series, however long the history.
+HISTORY_CHART_POINTS = 500
+HISTORY_PAGE_SIZE = 25
+
+def lttb_indices(values: Sequence[float], threshold: int) -> List[int]:
+    """Largest-Triangle-Three-Buckets: indices of `threshold` points that keep the visual shape of the series."""
+    n = len(values)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+
+    every = (n - 2) / (threshold - 2)
+    selected = [0]
+    anchor = 0
+    for i in range(threshold - 2):
+        start, end = int(i * every) + 1, int((i + 1) * every) + 1
+        next_start, next_end = end, min(int((i + 2) * every) + 1, n)
+        avg_x = (next_start + next_end - 1) / 2
+        avg_y = sum(values[next_start:next_end]) / (next_end - next_start)
+
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((anchor - avg_x) * (values[j] - values[anchor]) - (anchor - j) * (avg_y - values[anchor]))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        anchor = best
+    selected.append(n - 1)
+    return selected
+
+class HistoryStore(SQLiteStore):
+    """Per-user evaluation history in SQLite, capped per user and by age."""
+
+    def __init__(self, path: Path = CACHE_DIR / "history.sqlite", max_rows_per_user: int = 10_000,
+                 max_age_s: float = 365 * 24 * 3600):
+        self.max_rows_per_user = max_rows_per_user
+        self.max_age_s = max_age_s
+        super().__init__(path)
+
+    def _create_tables(self, conn: sqlite3.Connection):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                job_id TEXT NOT NULL UNIQUE,
+                created_at REAL NOT NULL,
+                overall_score REAL NOT NULL,
+                scores TEXT NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS history_user ON history (user_id, id)")
+
+    def record(self, user_id: str, job_id: str, overall_score: float, scores: Dict[str, tuple]):
+        # Keyed on the job, so redrawing the same results never adds a second row.
+        row_scores = json.dumps({cat: score for cat, (score, _) in scores.items()})
+        with self._lock, self._connect() as conn:
+            inserted = conn.execute(
+                "INSERT OR IGNORE INTO history (user_id, job_id, created_at, overall_score, scores) VALUES (?, ?, ?, ?, ?)",
+                (user_id, job_id, time.time(), overall_score, row_scores)
+            ).rowcount
+            if inserted:
+                self._evict(conn, user_id)
+
+    def _evict(self, conn: sqlite3.Connection, user_id: str):
+        conn.execute("DELETE FROM history WHERE created_at < ?", (time.time() - self.max_age_s,))
+        conn.execute("""
+            DELETE FROM history WHERE user_id = ? AND id <= (
+                SELECT id FROM history WHERE user_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?
+            )
+        """, (user_id, user_id, self.max_rows_per_user))
+
+    def count(self, user_id: str) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM history WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+    def page(self, user_id: str, page: int = 0, page_size: int = HISTORY_PAGE_SIZE) -> List[dict]:
+        """One page of history rows, newest first."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT created_at, overall_score, scores FROM history WHERE user_id = ? ORDER BY id DESC LIMIT ? OFFSET ?",
+                (user_id, page_size, page * page_size)
+            ).fetchall()
+        return [
+            {"timestamp": datetime.fromtimestamp(created_at).strftime("%Y-%m-%d %H:%M"), "overall_score": overall,
+             **json.loads(scores)}
+            for created_at, overall, scores in rows
+        ]
+
+    def series(self, user_id: str, max_points: Optional[int] = HISTORY_CHART_POINTS) -> Dict[str, list]:
+        """Column-oriented history for charting, oldest first, downsampled with LTTB on the overall score."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT overall_score, scores FROM history WHERE user_id = ? ORDER BY id", (user_id,)
+            ).fetchall()
+        overall = [row[0] for row in rows]
+        keep = lttb_indices(overall, max_points) if max_points else range(len(rows))
+
+        columns = {"submission": [], "overall_score": []}
+        for position, i in enumerate(keep):
+            columns["submission"].append(i + 1)
+            columns["overall_score"].append(overall[i])
+            for cat, score in json.loads(rows[i][1]).items():
+                columns.setdefault(cat, [None] * position).append(score)
+            for values in columns.values():
+                if len(values) <= position:
+                    values.append(None)
+        return columns
+
+_default_history = None
+_default_history_lock = threading.Lock()
+
+def get_history_store() -> HistoryStore:
+    global _default_history
+    with _default_history_lock:
+        if _default_history is None:
+            _default_history = HistoryStore(
+                max_rows_per_user=int(os.getenv("SCORESCOPE_HISTORY_MAX_ROWS", "10000")),
+                max_age_s=float(os.getenv("SCORESCOPE_HISTORY_RETENTION_DAYS", "365")) * 24 * 3600,
+            )
+        return _default_history
@@ -0,0 +1,102 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+class JobRejected(Exception):
+    """Raised when a submission is refused because the queue or the session is at capacity."""
+
+@dataclass
+class Job:
+    job_id: str
+    session_id: str
+    status: str = "queued"  # queued -> running -> done | failed
+    stage: Optional[str] = None
+    partial_scores: dict = field(default_factory=dict)
+    partial_summary: str = ""
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    submitted_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("done", "failed")
+
+class JobManager:
+    """Runs jobs on a shared worker pool, independent of any Streamlit script run.
+
+    Jobs are kept for `retention_s` after finishing so reruns and reconnects can still fetch the result.
+    Submissions beyond `max_workers + max_queued` active jobs, or `max_per_session` for one session, are rejected.
+    """
+
+    def __init__(self, max_workers: int = 4, max_queued: int = 32, max_per_session: int = 2, retention_s: float = 3600):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.max_per_session = max_per_session
+        self.retention_s = retention_s
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scorescope-job")
+
+    def submit(self, session_id: str, fn: Callable, *args) -> Job:
+        """Queue `fn(job, *args)`; its return value becomes `job.result` and any exception fails the job."""
+        with self._lock:
+            self._prune()
+            active = [job for job in self._jobs.values() if not job.done]
+            if len(active) >= self.max_workers + self.max_queued:
+                raise JobRejected("ScoreScope is busy right now. Please try again in a minute.")
+            if sum(job.session_id == session_id for job in active) >= self.max_per_session:
+                raise JobRejected(f"You already have {self.max_per_session} evaluations running. "
+                                  "Please wait for one to finish.")
+            job = Job(uuid.uuid4().hex[:12], session_id)
+            self._jobs[job.job_id] = job
+        self._pool.submit(self._run, job, fn, args)
+        return job
+
+    def _run(self, job: Job, fn: Callable, args: tuple):
+        job.status = "running"
+        try:
+            job.result = fn(job, *args)
+            job.status = "done"
+        except Exception as e:
+            job.error = str(e) or type(e).__name__
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+
+    def _prune(self):
+        cutoff = time.time() - self.retention_s
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.done and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs_for(self, session_id: str) -> List[Job]:
+        with self._lock:
+            return [job for job in self._jobs.values() if job.session_id == session_id]
+
+    def stats(self) -> dict:
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {status: statuses.count(status) for status in ("queued", "running", "done", "failed")}
+
+_default_manager = None
+_default_manager_lock = threading.Lock()
+
+def get_job_manager() -> JobManager:
+    # One pool per process so every session shares the same worker and queue limits.
+    global _default_manager
+    with _default_manager_lock:
+        if _default_manager is None:
+            _default_manager = JobManager(
+                max_workers=int(os.getenv("SCORESCOPE_JOB_WORKERS", "4")),
+                max_queued=int(os.getenv("SCORESCOPE_JOB_QUEUE", "32")),
+                max_per_session=int(os.getenv("SCORESCOPE_JOBS_PER_SESSION", "2")),
+            )
+        return _default_manager
@@ -0,0 +1,261 @@
+import asyncio
+import json
+import math
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Coroutine, Iterator, Optional
+
+from utils.resilience import LLM_STATS, AttemptTimeout, RetryPolicy, hedged, with_retries
+
+MODEL = "gpt-4-turbo-preview"
+MAX_TOKENS = 2000
+TEMPERATURE = 0.3
+# Model name prefixes that accept strict json_schema response formats; older models only take JSON mode.
+STRUCTURED_OUTPUT_MODELS = ("gpt-4o", "gpt-4.1")
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English prose; good enough for quota planning.
+    return math.ceil(len(text) / 4)
+
+class TokenBucket:
+    def __init__(self, capacity: float, period_s: float = 60.0):
+        self.capacity = capacity
+        self.rate = capacity / period_s
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+class RateLimiter:
+    """Admits a request only when both the requests-per-minute and tokens-per-minute buckets allow it."""
+
+    def __init__(self, rpm: int, tpm: int):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: int):
+        # Holding the lock while sleeping keeps admission FIFO, so large prompts are not starved.
+        async with self._lock:
+            while True:
+                delay = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+                if delay <= 0:
+                    self.requests.consume(1)
+                    self.tokens.consume(tokens)
+                    return
+                await asyncio.sleep(delay)
+
+    def reconcile(self, estimated: int, actual: int):
+        # Give back (or charge) the difference once the provider reports real usage.
+        self.tokens.refund(estimated - actual)
+
+def chat_request(prompt: str, model: str = MODEL, max_tokens: int = MAX_TOKENS, temperature: float = TEMPERATURE,
+                 response_format: Optional[dict] = None) -> dict:
+    """The chat completions request body for one evaluation prompt, as sent live or in a batch job file.
+
+    A json_schema response format is sent as-is only to models that support structured outputs; others get JSON
+    mode with the schema in a system message, and their answers go through parse_evaluation's fallback as usual.
+    """
+    messages = [{"role": "user", "content": prompt}]
+    if response_format and response_format["type"] == "json_schema" and not model.startswith(STRUCTURED_OUTPUT_MODELS):
+        schema = json.dumps(response_format["json_schema"]["schema"])
+        messages.insert(0, {"role": "system", "content": f"Respond with a JSON object matching this JSON schema: {schema}"})
+        response_format = {"type": "json_object"}
+    # Only sent when set, so plain-text requests stay identical to before.
+    extra = {"response_format": response_format} if response_format else {}
+    return dict(model=model, messages=messages, temperature=temperature, max_tokens=max_tokens, **extra)
+
+_STREAM_END = object()
+
+async def _close_stream(opened: tuple):
+    await opened[0].close()
+
+class AsyncEvaluationClient:
+    """Runs chat completions on a private event loop so any thread can submit work and wait on a Future."""
+
+    def __init__(self, model: str = MODEL, max_tokens: int = MAX_TOKENS, max_concurrency: int = 8,
+                 rpm: int = 500, tpm: int = 150_000, temperature: float = TEMPERATURE,
+                 retry_policy: Optional[RetryPolicy] = None):
+        self.model = model
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.max_tokens = max_tokens
+        self.max_concurrency = max_concurrency
+        self.rpm = rpm
+        self.tpm = tpm
+        self.temperature = temperature
+        self._loop = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._start_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="scorescope-llm", daemon=True)
+                self._thread.start()
+                asyncio.run_coroutine_threadsafe(self._setup(), self._loop).result()
+        return self._loop
+
+    async def _setup(self):
+        # The SDK is imported with the first request rather than at start-up.
+        from openai import AsyncOpenAI
+
+        # Retries and timeouts are ours (see utils.resilience); the SDK's own timeout is only a backstop.
+        self._client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0,
+                                   timeout=self.retry_policy.attempt_timeout_s + 5)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._limiter = RateLimiter(self.rpm, self.tpm)
+
+    async def complete(self, prompt: str, max_tokens: Optional[int] = None,
+                       response_format: Optional[dict] = None, model: Optional[str] = None) -> str:
+        max_tokens = max_tokens or self.max_tokens
+        model = model or self.model
+        estimated = estimate_tokens(prompt) + max_tokens
+        request = chat_request(prompt, model, max_tokens, self.temperature, response_format)
+        async with self._semaphore:
+            started = time.perf_counter()
+            try:
+                response = await with_retries(lambda: self._attempt(self._create(estimated, model, request),
+                                                                    model), self.retry_policy)
+            except Exception as e:
+                LLM_STATS.record_call(time.perf_counter() - started, failed=True)
+                return f"ERROR: OpenAI API issue - {str(e)}"
+            LLM_STATS.record_call(time.perf_counter() - started)
+        if response.usage:
+            self._limiter.reconcile(estimated, response.usage.total_tokens)
+        return response.choices[0].message.content
+
+    def _attempt(self, request: Callable[[], Awaitable], key: str, discard=None) -> Awaitable:
+        # One attempt: the request (hedged once the latency window allows it) under the per-attempt timeout.
+        policy = self.retry_policy
+        delay = LLM_STATS.hedge_delay(key, policy.hedge_percentile) if policy.hedge else None
+        return asyncio.wait_for(hedged(request, delay, discard), policy.attempt_timeout_s)
+
+    def _create(self, estimated: int, model: str, request: dict) -> Callable[[], Awaitable]:
+        async def create():
+            await self._limiter.acquire(estimated)
+            started = time.perf_counter()
+            response = await self._client.chat.completions.create(**request)
+            LLM_STATS.record_first_token(model, time.perf_counter() - started)
+            return response
+        return create
+
+    def _open_stream(self, estimated: int, key: str, request: dict) -> Callable[[], Awaitable]:
+        # Opens a stream and waits for its first chunk, so a hedge races on time to first token.
+        async def open_stream():
+            await self._limiter.acquire(estimated)
+            started = time.perf_counter()
+            stream = await self._client.chat.completions.create(**request)
+            iterator = stream.__aiter__()
+            try:
+                first = await iterator.__anext__()
+            except BaseException:
+                await stream.close()
+                raise
+            LLM_STATS.record_first_token(key, time.perf_counter() - started)
+            return stream, iterator, first
+        return open_stream
+
+    async def _stream_into(self, prompt: str, out: queue.Queue, model: Optional[str] = None):
+        estimated = estimate_tokens(prompt) + self.max_tokens
+        request = dict(chat_request(prompt, model or self.model, self.max_tokens, self.temperature),
+                       stream=True, stream_options={"include_usage": True})
+        key = f"{request['model']}:stream"
+        started = time.perf_counter()
+        try:
+            async with self._semaphore:
+                # Retried and hedged only up to the first chunk; once text has reached the caller it cannot be.
+                stream, iterator, chunk = await with_retries(
+                    lambda: self._attempt(self._open_stream(estimated, key, request), key, _close_stream),
+                    self.retry_policy)
+                try:
+                    while True:
+                        if chunk.usage:
+                            self._limiter.reconcile(estimated, chunk.usage.total_tokens)
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            out.put(chunk.choices[0].delta.content)
+                        try:
+                            chunk = await asyncio.wait_for(iterator.__anext__(), self.retry_policy.stream_idle_timeout_s)
+                        except StopAsyncIteration:
+                            break
+                        except asyncio.TimeoutError:
+                            raise AttemptTimeout(f"stream stalled for {self.retry_policy.stream_idle_timeout_s:g}s")
+                finally:
+                    await stream.close()
+            LLM_STATS.record_call(time.perf_counter() - started)
+        except Exception as e:
+            LLM_STATS.record_call(time.perf_counter() - started, failed=True)
+            out.put(e)
+        finally:
+            out.put(_STREAM_END)
+
+    def run(self, coro: Coroutine) -> Future:
+        # Schedules a coroutine that uses complete()/stream internals on this client's loop.
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def submit(self, prompt: str, response_format: Optional[dict] = None, model: Optional[str] = None) -> Future:
+        return self.run(self.complete(prompt, response_format=response_format, model=model))
+
+    def stream(self, prompt: str, model: Optional[str] = None) -> Iterator[str]:
+        # Yields completion text deltas as they arrive; provider errors are re-raised in the caller's thread.
+        out = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(self._stream_into(prompt, out, model), self._ensure_loop())
+        try:
+            while True:
+                item = out.get()
+                if item is _STREAM_END:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            future.cancel()
+
+    def close(self):
+        with self._start_lock:
+            if self._loop is None:
+                return
+            asyncio.run_coroutine_threadsafe(self._client.close(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = None
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+def get_evaluation_client() -> AsyncEvaluationClient:
+    # One client per process so every Streamlit session shares the same quota.
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = AsyncEvaluationClient(
+                max_concurrency=int(os.getenv("SCORESCOPE_LLM_CONCURRENCY", "8")),
+                rpm=int(os.getenv("SCORESCOPE_LLM_RPM", "500")),
+                tpm=int(os.getenv("SCORESCOPE_LLM_TPM", "150000")),
+                retry_policy=RetryPolicy(
+                    max_attempts=int(os.getenv("SCORESCOPE_LLM_ATTEMPTS", "4")),
+                    attempt_timeout_s=float(os.getenv("SCORESCOPE_LLM_TIMEOUT_S", "90")),
+                    hedge=os.getenv("SCORESCOPE_LLM_HEDGE", "0") == "1",
+                ),
+            )
+        return _default_client
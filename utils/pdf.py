@@ -1,29 +1,259 @@
-
-import fitz  # PyMuPDF
+import multiprocessing
+import os
 import re
+import statistics
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Tuple, Union
 import streamlit as st
 
-@st.cache_data(ttl=300)
-def extract_text_from_pdf(file_hash: str, uploaded_file, max_pages: int = 15) -> str:
+from utils.cache import get_text_cache
+from utils.singleflight import SingleFlight
+from utils.upload import ingest_upload
+
+PAGES_PER_TASK = 8
+# Documents shorter than this are extracted in-process. With the pool warm, a page range costs ~1.5 ms a page
+# plus ~2 ms to open the document and send its text back, so two ranges on two cores already beat one pass
+# (benchmarks/bench_pdf_extraction.py); starting the pool costs ~1 s once per process.
+PARALLEL_MIN_PAGES = 2 * PAGES_PER_TASK
+
+# Applied per page while the page text is still hot, instead of as two passes over the joined document.
+# (A single alternation pattern with a replacement callback benchmarked ~2.5x slower than these two.)
+_BLANK_LINES = re.compile(r'\n\s*\n')
+_DISALLOWED_CHARS = re.compile(r'[^\w\s\.\,\!\?\;\:\-\(\)\[\]\"\'/]')
+
+# Page selection: pages are ranked from their content streams and those of their Form XObjects (~0.1 ms a page,
+# against ~1.4 ms to extract a page's text); only the pages walked in ranked order are extracted, and their real
+# text decides what fits the budget. CID fonts inflate the estimate, but evenly across a document's pages.
+# Bump PAGE_SELECTION_VERSION whenever the ranking changes, so cached texts and evaluations are not reused.
+PAGE_SELECTION_VERSION = "pages3"
+MIN_PAGE_TEXT_BYTES = 40
+HEADING_SCALE = 1.2     # a font this much larger than the body size marks a section heading
+HEADING_BONUS = 1.25
+LINK_DENSE_PAGE = 8     # a contents or reference list is mostly links
+_SKIP_SECTIONS = re.compile(
+    r'^\s*(?:\d+[\.\s]*)?(?:table of contents|contents|references|bibliography|works cited|'
+    r'acknowledge?ments?|index)\s*:?\s*$', re.IGNORECASE)
+_TEXT_OBJECTS = re.compile(rb'BT(.*?)ET', re.DOTALL)
+_STRING_OPERANDS = re.compile(rb'\((?:\\.|[^\\)])*\)|<[0-9A-Fa-f\s]*>')
+_FONT_SIZES = re.compile(rb'/[^\s/]+\s+(\d+(?:\.\d+)?)\s+Tf')
+
+PdfSource = Union[bytes, str]
+
+# Concurrent extractions of the same document (across sessions) share one pass.
+EXTRACTION_FLIGHTS = SingleFlight("extraction")
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool() -> ProcessPoolExecutor:
+    # Spawned rather than forked so workers never inherit the Streamlit server's threads.
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+def _open(source: PdfSource) -> "fitz.Document":
+    import fitz  # PyMuPDF, imported on first use to keep it off the app's start-up path
+
+    if isinstance(source, str):
+        return fitz.open(source)
+    return fitz.open(stream=source, filetype="pdf")
+
+def _normalize_page(page_number: int, page_text: str) -> str:
+    # Collapsed with the next page's leading newline in place, so blank lines at the end of a page merge into
+    # the page break as they would in the joined text; only blank lines ending the document come out shorter.
+    chunk = f"\n--- Page {page_number} ---\n{page_text}\n"
+    return _DISALLOWED_CHARS.sub('', _BLANK_LINES.sub('\n\n', chunk)[:-1])
+
+def _iter_pages(doc: "fitz.Document", start: int, stop: int) -> Iterator[Tuple[int, str]]:
+    # Yields (page index, normalized chunk); blank pages give an empty chunk so callers can still count them.
+    for i in range(start, min(stop, len(doc))):
+        page_text = doc.load_page(i).get_text()
+        yield i, _normalize_page(i + 1, page_text) if page_text.strip() else ""
+
+def iter_page_text(source: PdfSource, start: int, stop: int) -> Iterator[str]:
+    doc = _open(source)
     try:
-        doc = fitz.open(stream=uploaded_file.read(), filetype="pdf")
-        full_text = ""
-        progress_bar = st.progress(0)
-        total_pages = min(len(doc), max_pages)
+        for _, chunk in _iter_pages(doc, start, stop):
+            if chunk:
+                yield chunk
+    finally:
+        doc.close()
+
+@dataclass
+class PageProfile:
+    index: int
+    text_bytes: int         # bytes of text operands in the content streams, a proxy for the page's character count
+    max_font: float         # largest font size set on the page
+    links: int
+    section: Optional[str]  # outline heading this page falls under, if the document has an outline
+
+def _profile_page(doc: "fitz.Document", index: int, section: Optional[str]) -> PageProfile:
+    page = doc.load_page(index)
+    # Text drawn through Form XObjects is shown, and its fonts set, in the XObject's stream, not the page's.
+    xrefs = page.get_contents() + [xref for xref, *_ in page.get_xobjects()]
+    content = b"".join(doc.xref_stream(xref) or b"" for xref in xrefs)
+    text_bytes, sizes = 0, [0.0]
+    for text_object in _TEXT_OBJECTS.finditer(content):
+        body = text_object.group(1)
+        # Hex strings take two digits per byte.
+        text_bytes += sum(len(s) - 2 if s[:1] == b"(" else (len(s) - 2) // 2 for s in _STRING_OPERANDS.findall(body))
+        sizes.extend(float(size) for size in _FONT_SIZES.findall(body))
+    return PageProfile(index, text_bytes, max(sizes), len(page.get_links()), section)
+
+def _outline_sections(doc: "fitz.Document", page_count: int) -> List[Optional[str]]:
+    # Top-level outline entries, spread over the pages each one covers.
+    sections: List[Optional[str]] = [None] * page_count
+    starts = sorted((page - 1, title) for level, title, page in doc.get_toc() if level == 1 and page >= 1)
+    for (start, title), (end, _) in zip(starts, starts[1:] + [(page_count, None)]):
+        for i in range(max(start, 0), min(end, page_count)):
+            sections[i] = title
+    return sections
 
-        for i in range(total_pages):
-            page_text = doc.load_page(i).get_text()
-            if page_text.strip():
-                full_text += f"\n--- Page {i + 1} ---\n{page_text}"
-            progress_bar.progress((i + 1) / total_pages)
+def rank_pages(doc: "fitz.Document") -> List[PageProfile]:
+    """Pages worth grading, most informative first; blank, contents and reference pages are left out."""
+    page_count = len(doc)
+    sections = _outline_sections(doc, page_count)
+    profiles = [_profile_page(doc, i, sections[i]) for i in range(page_count)]
+    body_size = statistics.median([p.max_font for p in profiles if p.text_bytes >= MIN_PAGE_TEXT_BYTES] or [0.0])
 
-        progress_bar.empty()
+    def score(profile: PageProfile) -> float:
+        if profile.text_bytes < MIN_PAGE_TEXT_BYTES or profile.links >= LINK_DENSE_PAGE:
+            return 0.0
+        if profile.section and _SKIP_SECTIONS.match(profile.section):
+            return 0.0
+        starts_section = body_size and profile.max_font >= body_size * HEADING_SCALE
+        return profile.text_bytes * (HEADING_BONUS if starts_section else 1.0)
+
+    scored = sorted(((score(p), p) for p in profiles), key=lambda item: (-item[0], item[1].index))
+    return [profile for value, profile in scored if value > 0]
+
+def extract_selected_text(source: PdfSource, max_pages: int, char_budget: int, on_progress=None) -> str:
+    """The most informative pages that fit `char_budget` characters, in page order.
+
+    Pages are extracted in ranked order until the budget or `max_pages` is reached; a page that does not fit the
+    remaining budget is passed over, without being extracted once the pages already read show (at their lowest
+    ratio of characters to estimated bytes) that it cannot fit. A page that opens with a contents or references heading is dropped, which
+    catches documents with no outline. If no page qualifies, the first pages are used.
+    """
+    doc = _open(source)
+    try:
+        ranked = rank_pages(doc)
+        chosen = {}
+        used = 0
+        best = None
+        chars_per_byte = None
+        for profile in ranked:
+            if len(chosen) >= max_pages or used >= char_budget:
+                break
+            if chars_per_byte and profile.text_bytes * chars_per_byte > char_budget - used:
+                continue
+            _, chunk = next(_iter_pages(doc, profile.index, profile.index + 1))
+            if not chunk:
+                continue
+            best = best or chunk
+            ratio = len(chunk) / profile.text_bytes
+            chars_per_byte = min(chars_per_byte or ratio, ratio)
+            first_line = chunk.split("---\n", 1)[-1].strip().split("\n", 1)[0]
+            if _SKIP_SECTIONS.match(first_line) or used + len(chunk) > char_budget:
+                continue
+            chosen[profile.index] = chunk
+            used += len(chunk)
+            if on_progress:
+                on_progress(min(used / char_budget, 1.0))
+        if chosen:
+            return "".join(chosen[i] for i in sorted(chosen))
+        if best:
+            # Not even one page fits: the best page, cut to the budget, beats sending nothing.
+            return best[:char_budget]
+        # Nothing ranked with text (short pages, say): the document from the start, as extracted without a budget.
+        return "".join(chunk for _, chunk in _iter_pages(doc, 0, max_pages))[:char_budget]
+    finally:
+        doc.close()
+
+def _extract_page_range(path: str, start: int, stop: int) -> List[str]:
+    # Runs in a worker process, which opens the document itself instead of receiving its bytes.
+    return list(iter_page_text(path, start, stop))
+
+def iter_pdf_text(source: PdfSource, max_pages: int = 15, workers: Optional[int] = 1, on_progress=None) -> Iterator[str]:
+    """Yield normalized page chunks in page order, fanning page ranges out to worker processes.
+
+    `workers=None` switches to the process pool automatically for documents of PARALLEL_MIN_PAGES or more.
+    """
+    doc = _open(source)
+    try:
+        total_pages = min(len(doc), max_pages)
+        if workers is None:
+            workers = os.cpu_count() if total_pages >= PARALLEL_MIN_PAGES else 1
+        if workers <= 1 or total_pages <= PAGES_PER_TASK:
+            for i, chunk in _iter_pages(doc, 0, total_pages):
+                if chunk:
+                    yield chunk
+                if on_progress:
+                    on_progress((i + 1) / total_pages)
+            return
+    finally:
         doc.close()
 
-        full_text = re.sub(r'\n\s*\n', '\n\n', full_text)
-        full_text = re.sub(r'[^\w\s\.\,\!\?\;\:\-\(\)\[\]\"\'/]', '', full_text)
+    spooled = None
+    if not isinstance(source, str):
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as spooled:
+            spooled.write(source)
+    path = spooled.name if spooled else source
+
+    try:
+        pool = _get_pool()
+        ranges = deque((start, min(start + PAGES_PER_TASK, total_pages)) for start in range(0, total_pages, PAGES_PER_TASK))
+        # Keep at most `workers` ranges in flight and hand results back strictly in page order.
+        in_flight = deque()
+        while ranges or in_flight:
+            while ranges and len(in_flight) < workers:
+                start, stop = ranges.popleft()
+                in_flight.append((stop, pool.submit(_extract_page_range, path, start, stop)))
+            stop, future = in_flight.popleft()
+            yield from future.result()
+            if on_progress:
+                on_progress(stop / total_pages)
+    finally:
+        if spooled:
+            os.unlink(spooled.name)
+
+def extract_text_from_bytes(data: PdfSource, max_pages: int = 15, on_progress=None, workers: Optional[int] = 1) -> str:
+    return "".join(iter_pdf_text(data, max_pages, workers, on_progress))
+
+def text_cache_key(file_hash: str, char_budget: Optional[int] = None) -> str:
+    # With a budget only the selected pages are extracted: a different text, so a different stored key.
+    return f"{file_hash}:{PAGE_SELECTION_VERSION}:{char_budget}" if char_budget else file_hash
 
-        return full_text
+@st.cache_data(ttl=3600, max_entries=64, show_spinner=False)
+def cached_pdf_text(file_hash: str, max_pages: int, _data: PdfSource, char_budget: Optional[int] = None) -> str:
+    # Keyed on the content hash, page limit and budget only; `_data` is excluded from the cache key.
+    # No UI calls in here, so a cache hit never replays widgets.
+    text_key = text_cache_key(file_hash, char_budget)
+    text_cache = get_text_cache()
+    text = text_cache.get(text_key, max_pages)
+    if text is None:
+        text, _ = EXTRACTION_FLIGHTS.do(
+            (text_key, max_pages), lambda: _extract_and_store(text_key, max_pages, _data, char_budget))
+    return text
+
+def _extract_and_store(text_key: str, max_pages: int, data: PdfSource, char_budget: Optional[int] = None) -> str:
+    if char_budget:
+        text = extract_selected_text(data, max_pages, char_budget)
+    else:
+        text = extract_text_from_bytes(data, max_pages, workers=None)
+    get_text_cache().put(text_key, max_pages, text)
+    return text
+
+def extract_text_from_pdf(file_hash: str, uploaded_file, max_pages: int = 15) -> str:
+    try:
+        with ingest_upload(uploaded_file) as upload:
+            return cached_pdf_text(file_hash, max_pages, upload.source)
     except Exception as e:
         st.error(f"PDF processing error: {str(e)}")
         return None
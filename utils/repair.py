@@ -0,0 +1,60 @@
+from typing import List, Optional, Tuple
+
+from utils.ai import PARSE_STATS, STYLE_INSTRUCTIONS, SUBMISSION_CHAR_BUDGET, failed_categories, match_scores, \
+    truncate_submission
+from utils.llm import AsyncEvaluationClient, get_evaluation_client
+
+# A repair answer is one line per category, so its completion budget is sized per category.
+REPAIR_TOKENS_PER_CATEGORY = 150
+
+def build_repair_prompt(task_outline: str, submission_text: str, scores: dict, missing: List[str],
+                        evaluation_style: str = "balanced", max_chars: int = SUBMISSION_CHAR_BUDGET) -> str:
+    # The scores already read are listed (without their explanations) so the new ones stay on the same scale.
+    graded = ", ".join(f"{cat}: {score}/10" for cat, (score, _) in scores.items() if cat not in missing)
+    context = f"\nThe submission has already been scored on: {graded}.\n" if graded else ""
+    category_list = "\n".join(f"{i + 1}. {cat}" for i, cat in enumerate(missing))
+
+    return f"""
+You are an expert evaluator with a {evaluation_style} approach. {STYLE_INSTRUCTIONS[evaluation_style]}
+
+EVALUATION TASK:
+{task_outline}
+
+STUDENT SUBMISSION:
+{truncate_submission(submission_text, max_chars)}
+{context}
+Score the submission on these categories only (rate each 0-10):
+{category_list}
+
+For each one give a single line and nothing else:
+Category Name: X/10 - 2-3 sentences explaining your reasoning. One specific suggestion for improvement.
+"""
+
+def merge_repaired_scores(scores: dict, ai_response: str, missing: List[str]) -> Tuple[dict, List[str]]:
+    """`scores` with every missing category the repair response answered filled in, and those categories."""
+    found = match_scores(ai_response, dict.fromkeys(missing))
+    return {cat: found.get(cat, entry) for cat, entry in scores.items()}, [cat for cat in missing if cat in found]
+
+async def repair_scores(client: AsyncEvaluationClient, task_outline: str, submission_text: str, scores: dict,
+                        evaluation_style: str = "balanced", model: Optional[str] = None) -> Tuple[dict, List[str]]:
+    """Ask again for just the categories that failed to parse, instead of re-running the whole evaluation.
+
+    Returns the merged scores and the categories repaired; a failed repair request leaves `scores` as they were.
+    """
+    missing = failed_categories(scores)
+    if not missing:
+        return scores, []
+    prompt = build_repair_prompt(task_outline, submission_text, scores, missing, evaluation_style)
+    ai_response = await client.complete(prompt, max_tokens=REPAIR_TOKENS_PER_CATEGORY * len(missing), model=model)
+    if ai_response.startswith("ERROR"):
+        repaired_scores, repaired = scores, []
+    else:
+        repaired_scores, repaired = merge_repaired_scores(scores, ai_response, missing)
+    PARSE_STATS.record_repair(len(repaired))
+    return repaired_scores, repaired
+
+def get_repaired_scores(task_outline: str, submission_text: str, scores: dict, evaluation_style: str = "balanced",
+                        model: Optional[str] = None,
+                        client: Optional[AsyncEvaluationClient] = None) -> Tuple[dict, List[str]]:
+    client = client or get_evaluation_client()
+    return client.run(repair_scores(client, task_outline, submission_text, scores, evaluation_style, model)).result()
@@ -0,0 +1,164 @@
+import asyncio
+import email.utils
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Statuses worth another attempt: timeouts, conflicts, rate limits and server errors.
+RETRYABLE_STATUSES = {408, 409, 429}
+LATENCY_WINDOW = 500
+# Hedging waits until the latency window says something about this model.
+MIN_HEDGE_SAMPLES = 20
+
+@dataclass
+class RetryPolicy:
+    max_attempts: int = 4
+    base_delay_s: float = 0.5
+    max_delay_s: float = 20.0
+    attempt_timeout_s: float = 90.0     # a whole non-streamed attempt, or a stream's wait for its first token
+    stream_idle_timeout_s: float = 30.0  # longest gap between tokens once a stream has started
+    hedge: bool = False
+    hedge_percentile: float = 95
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        # Full jitter, but never sooner than the provider asked for.
+        delay = random.uniform(0, min(self.max_delay_s, self.base_delay_s * 2 ** attempt))
+        return max(delay, min(retry_after, self.max_delay_s)) if retry_after else delay
+
+class AttemptTimeout(Exception):
+    """An attempt (or a stream's first token) took longer than the policy allows."""
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (AttemptTimeout, asyncio.TimeoutError)):
+        return True
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUSES or status >= 500
+    # Connection failures and SDK-side timeouts carry no status code.
+    return type(exc).__name__ in {"APIConnectionError", "APITimeoutError"}
+
+def retry_after_s(exc: BaseException) -> Optional[float]:
+    """The provider's Retry-After hint, in seconds, if the error carries one."""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        parsed = email.utils.parsedate_to_datetime(value)
+        return max(0.0, parsed.timestamp() - time.time()) if parsed else None
+
+class ResilienceStats:
+    """Process-wide counters and latency windows for LLM calls, including retries and hedges."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._first_token: Dict[str, Deque[float]] = {}
+
+    def record_call(self, latency_s: float, failed: bool = False):
+        with self._lock:
+            self.calls += 1
+            self.failures += failed
+            if not failed:
+                self._latencies.append(latency_s)
+
+    def record_first_token(self, key: str, seconds: float):
+        # Keyed by model and mode: a non-streamed call's first token arrives with the whole response.
+        with self._lock:
+            self._first_token.setdefault(key, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+    def record_retry(self, timed_out: bool):
+        with self._lock:
+            self.retries += 1
+            self.timeouts += timed_out
+
+    def record_hedge(self, won: bool):
+        with self._lock:
+            self.hedges += 1
+            self.hedge_wins += won
+
+    def hedge_delay(self, key: str, percentile: float) -> Optional[float]:
+        """How long to wait for a first token before hedging: the recent p95 (or given percentile) for `key`."""
+        with self._lock:
+            samples = sorted(self._first_token.get(key, ()))
+        if len(samples) < MIN_HEDGE_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * percentile / 100))]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            counts = {"calls": self.calls, "failures": self.failures, "retries": self.retries,
+                      "timeouts": self.timeouts, "hedges": self.hedges, "hedge_wins": self.hedge_wins}
+
+        def pct(p: float) -> float:
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))], 3) if latencies else 0.0
+
+        return {**counts, "p50_s": pct(50), "p95_s": pct(95), "p99_s": pct(99)}
+
+LLM_STATS = ResilienceStats()
+
+async def with_retries(attempt: Callable[[], Awaitable[T]], policy: RetryPolicy,
+                       stats: ResilienceStats = LLM_STATS) -> T:
+    """Run `attempt` until it succeeds, retrying retryable errors with backoff; the last error is re-raised."""
+    for attempt_number in range(policy.max_attempts):
+        try:
+            return await attempt()
+        except Exception as e:
+            if attempt_number == policy.max_attempts - 1 or not is_retryable(e):
+                raise
+            stats.record_retry(timed_out=isinstance(e, (AttemptTimeout, asyncio.TimeoutError)))
+            await asyncio.sleep(policy.backoff(attempt_number, retry_after_s(e)))
+
+async def hedged(request: Callable[[], Awaitable[T]], delay_s: Optional[float],
+                 discard: Optional[Callable[[T], Awaitable[None]]] = None, stats: ResilienceStats = LLM_STATS) -> T:
+    """Start `request`; if it has not finished after `delay_s`, start a second copy and take whichever wins.
+
+    The loser is cancelled, or passed to `discard` if it had already finished (an open stream, say). If one
+    copy fails the other is still awaited; the error is raised only if both fail.
+    """
+    tasks = [asyncio.ensure_future(request())]
+    try:
+        if delay_s is None:
+            return await tasks[0]
+        done, _ = await asyncio.wait(tasks, timeout=delay_s)
+        if done:
+            return tasks[0].result()
+
+        tasks.append(asyncio.ensure_future(request()))
+        pending, error = set(tasks), None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winners = [task for task in done if task.exception() is None]
+            if winners:
+                stats.record_hedge(won=winners[0] is tasks[1])
+                for loser in winners[1:]:
+                    if discard:
+                        await discard(loser.result())
+                return winners[0].result()
+            error = next(iter(done)).exception()
+        stats.record_hedge(won=False)
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,243 @@
+import difflib
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from utils.ai import STYLE_INSTRUCTIONS, extract_enhanced_feedback, match_scores
+from utils.cache import CACHE_DIR, SQLiteStore
+
+# Below this share of changed text a draft is the same submission (typo fixes, reflowed lines): every score is kept.
+MATERIAL_CHANGE_RATIO = 0.02
+# Above it the draft is mostly new and is graded from scratch, as it is after this many incremental grades in a row.
+MAX_INCREMENTAL_RATIO = 0.5
+MAX_INCREMENTAL_CHAIN = 5
+DIFF_CONTEXT_LINES = 1
+REMOVED_EXCERPT_CHARS = 300
+
+_PAGE_MARKER = re.compile(r"^--- Page (\d+) ---$")
+
+def draft_key(user_id: str, task_outline: str, categories: dict, evaluation_style: str, max_pages: int,
+              prompt_version: str) -> str:
+    """Drafts of the same assignment: one user, task and rubric, graded the same way."""
+    payload = json.dumps({
+        "max_pages": max_pages,
+        "user": user_id,
+        "task": hashlib.sha256(task_outline.strip().encode("utf-8")).hexdigest(),
+        "categories": sorted(categories.items()),
+        "style": evaluation_style,
+        "prompt": prompt_version,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+@dataclass
+class Draft:
+    file_hash: str
+    text: str
+    ai_response: str
+    scores: Dict[str, Tuple[int, str]]
+    feedback: dict
+    chain: int = 0                    # incremental grades since the last full one
+    full_llm_s: float = 0.0           # model time and completion size of that full grade, the baseline for savings
+    full_completion_tokens: int = 0
+
+class DraftStore(SQLiteStore):
+    """The latest graded draft per user and assignment, so a resubmission can be diffed against it."""
+
+    def __init__(self, path: Path = CACHE_DIR / "drafts.sqlite", max_entries: int = 20_000,
+                 max_age_s: float = 180 * 24 * 3600):
+        self.max_entries = max_entries
+        self.max_age_s = max_age_s
+        super().__init__(path)
+
+    def _create_tables(self, conn: sqlite3.Connection):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS drafts (
+                key TEXT PRIMARY KEY,
+                file_hash TEXT NOT NULL,
+                draft BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS drafts_created ON drafts (created_at)")
+
+    def get(self, key: str) -> Optional[Draft]:
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT draft FROM drafts WHERE key = ? AND created_at >= ?",
+                               (key, time.time() - self.max_age_s)).fetchone()
+            self._record(conn, hit=row is not None)
+        if row is None:
+            return None
+        data = json.loads(zlib.decompress(row[0]))
+        data["scores"] = {cat: tuple(value) for cat, value in data["scores"].items()}
+        return Draft(**data)
+
+    def put(self, key: str, draft: Draft):
+        blob = zlib.compress(json.dumps(draft.__dict__).encode("utf-8"), 6)
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO drafts VALUES (?, ?, ?, ?, ?)",
+                         (key, draft.file_hash, blob, len(blob), now))
+            conn.execute("DELETE FROM drafts WHERE created_at < ?", (now - self.max_age_s,))
+            conn.execute("""
+                DELETE FROM drafts WHERE key IN (
+                    SELECT key FROM drafts ORDER BY created_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+
+    def stats(self) -> dict:
+        return self._stats("drafts")
+
+@dataclass
+class SubmissionDiff:
+    changed_chars: int
+    total_chars: int
+    hunks: List[str] = field(default_factory=list)    # revised or added passages, with a line of context
+    removed: List[str] = field(default_factory=list)  # passages only the previous draft had
+
+    @property
+    def changed_ratio(self) -> float:
+        return self.changed_chars / self.total_chars if self.total_chars else 0.0
+
+    @property
+    def material(self) -> bool:
+        return self.changed_ratio >= MATERIAL_CHANGE_RATIO
+
+    @property
+    def changed_text_chars(self) -> int:
+        return sum(map(len, self.hunks)) + sum(map(len, self.removed))
+
+def _content_lines(text: str) -> Tuple[List[str], List[int]]:
+    # Whitespace-normalised non-empty lines and the page each one is on; page markers only set the page.
+    lines, pages, page = [], [], 1
+    for raw in text.splitlines():
+        line = " ".join(raw.split())
+        marker = _PAGE_MARKER.match(line)
+        if marker:
+            page = int(marker.group(1))
+        elif line:
+            lines.append(line)
+            pages.append(page)
+    return lines, pages
+
+def diff_submissions(previous: str, current: str) -> SubmissionDiff:
+    """Line-level diff of two drafts' extracted text, grouped into passages."""
+    old, _ = _content_lines(previous)
+    new, new_pages = _content_lines(current)
+    matcher = difflib.SequenceMatcher(None, old, new, autojunk=False)
+    diff = SubmissionDiff(0, sum(map(len, old)) + sum(map(len, new)))
+    for group in matcher.get_grouped_opcodes(DIFF_CONTEXT_LINES):
+        changes = [op for op in group if op[0] != "equal"]
+        removed = [line for _, i1, i2, _, _ in changes for line in old[i1:i2]]
+        added = [line for _, _, _, j1, j2 in changes for line in new[j1:j2]]
+        diff.changed_chars += sum(map(len, removed)) + sum(map(len, added))
+        if added:
+            start, stop = group[0][3], group[-1][4]
+            diff.hunks.append(f"[Page {new_pages[start]}]\n" + "\n".join(new[start:stop]))
+        if removed:
+            excerpt = " ".join(removed)
+            diff.removed.append(excerpt[:REMOVED_EXCERPT_CHARS] + ("..." if len(excerpt) > REMOVED_EXCERPT_CHARS else ""))
+    return diff
+
+def build_incremental_prompt(task_outline: str, categories: dict, evaluation_style: str, previous: Draft,
+                             diff: SubmissionDiff) -> str:
+    previous_lines = "\n".join(f"{cat}: {score}/10 - {explanation}" for cat, (score, explanation) in previous.scores.items())
+    revised = "\n\n".join(diff.hunks) or "(none)"
+    removed = "\n".join(f"- {passage}" for passage in diff.removed) or "(none)"
+    category_list = "\n".join([f"{i+1}. {cat}" for i, cat in enumerate(categories.keys())])
+
+    return f"""
+You are an expert evaluator with a {evaluation_style} approach. {STYLE_INSTRUCTIONS[evaluation_style]}
+
+EVALUATION TASK:
+{task_outline}
+
+This is a revised draft of a submission you have already evaluated. Your evaluation of the previous draft:
+{previous_lines}
+
+Overall Assessment (previous draft):
+{previous.feedback.get("overall", "")}
+
+CHANGES IN THIS DRAFT ({diff.changed_ratio:.0%} of the text changed; everything else is exactly as before):
+Revised or added passages (with a line of surrounding context):
+{revised}
+
+Removed passages:
+{removed}
+
+Re-assess the revised submission across these categories (rate each 0-10):
+{category_list}
+
+For each category the changes affect, give a new line:
+Category Name: X/10 - Explanation. Improvement suggestion.
+For each category they do not affect, write only:
+Category Name: unchanged
+
+Then provide:
+Overall Assessment:
+Actionable Next Steps:
+"""
+
+@lru_cache(maxsize=128)
+def _unchanged_pattern(category_names: Tuple[str, ...]) -> re.Pattern:
+    names = "|".join(re.escape(cat) for cat in sorted(category_names, key=len, reverse=True))
+    return re.compile(rf"^[^\n]*?({names}):\s*unchanged\.?\s*$", re.IGNORECASE | re.MULTILINE)
+
+def parse_incremental(ai_response: str, categories: dict, previous: Draft) -> Tuple[dict, dict, List[str]]:
+    """(scores, feedback, re-scored categories): categories left unchanged or unanswered keep their previous scores."""
+    # "unchanged" lines are dropped first so the category above one does not absorb it into its explanation.
+    response = _unchanged_pattern(tuple(categories)).sub("", ai_response)
+    rescored = match_scores(response, categories)
+    scores = {cat: rescored.get(cat, previous.scores.get(cat)) for cat in categories}
+    feedback = extract_enhanced_feedback(response)
+    if "Overall Assessment:" not in response:
+        feedback = previous.feedback
+    return scores, feedback, [cat for cat in categories if cat in rescored]
+
+class ResubmissionStats:
+    """Process-wide tally of how resubmissions were graded and what reusing earlier grades saved."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.resubmissions = 0
+        self.reused = 0
+        self.incremental = 0
+        self.tokens_saved = 0
+        self.seconds_saved = 0.0
+
+    def record(self, mode: str, tokens_saved: int, seconds_saved: float):
+        with self._lock:
+            self.resubmissions += 1
+            self.reused += mode == "reused"
+            self.incremental += mode == "incremental"
+            self.tokens_saved += tokens_saved
+            self.seconds_saved += seconds_saved
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"resubmissions": self.resubmissions, "reused": self.reused, "incremental": self.incremental,
+                    "full": self.resubmissions - self.reused - self.incremental,
+                    "tokens_saved": self.tokens_saved, "seconds_saved": round(self.seconds_saved, 1)}
+
+RESUBMISSION_STATS = ResubmissionStats()
+
+_default_drafts = None
+_default_drafts_lock = threading.Lock()
+
+def get_draft_store() -> DraftStore:
+    global _default_drafts
+    with _default_drafts_lock:
+        if _default_drafts is None:
+            _default_drafts = DraftStore(
+                max_age_s=float(os.getenv("SCORESCOPE_DRAFT_RETENTION_DAYS", "180")) * 24 * 3600,
+            )
+        return _default_drafts
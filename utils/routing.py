@@ -0,0 +1,161 @@
+import os
+import statistics
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from utils.ai import EvaluationResult, failed_categories, parse_evaluation
+from utils.helpers import UNPARSED_EXPLANATION, calculate_weighted_score
+from utils.llm import MODEL, AsyncEvaluationClient, estimate_tokens
+
+FAST_MODEL = os.getenv("SCORESCOPE_FAST_MODEL", "gpt-4o-mini")
+
+# USD per 1K prompt and completion tokens, for the per-evaluation cost estimate.
+MODEL_PRICES = {
+    "gpt-4-turbo-preview": (0.01, 0.03),
+    "gpt-4o": (0.0025, 0.01),
+    "gpt-4o-mini": (0.00015, 0.0006),
+}
+
+# The score bands the results view colours by (see get_score_color_class).
+GRADE_BOUNDARIES = (4, 6, 8)
+
+@dataclass
+class ModelCall:
+    model: str
+    latency_s: float
+    prompt_tokens: int
+    completion_tokens: int
+    cost_usd: float
+
+def model_call(model: str, prompt: str, response: str, latency_s: float) -> ModelCall:
+    # Token counts are estimated from the text, as for rate limiting, so streamed calls are costed the same way.
+    prompt_tokens, completion_tokens = estimate_tokens(prompt), estimate_tokens(response)
+    input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    cost = (prompt_tokens * input_price + completion_tokens * output_price) / 1000
+    return ModelCall(model, round(latency_s, 3), prompt_tokens, completion_tokens, round(cost, 6))
+
+@dataclass
+class RoutingDecision:
+    """Which models graded one evaluation, why it escalated (if it did), and what each call took."""
+    calls: List[ModelCall] = field(default_factory=list)
+    reasons: List[str] = field(default_factory=list)
+
+    @property
+    def escalated(self) -> bool:
+        return len(self.calls) > 1
+
+    @property
+    def model(self) -> str:
+        return self.calls[-1].model if self.calls else ""
+
+    @property
+    def latency_s(self) -> float:
+        return round(sum(call.latency_s for call in self.calls), 3)
+
+    @property
+    def cost_usd(self) -> float:
+        return round(sum(call.cost_usd for call in self.calls), 6)
+
+    def as_dict(self) -> dict:
+        return {"model": self.model, "escalated": self.escalated, "reasons": self.reasons,
+                "latency_s": self.latency_s, "cost_usd": self.cost_usd, "calls": [asdict(c) for c in self.calls]}
+
+class RoutingStats:
+    """Process-wide tally of routing decisions: how often the fast model sufficed, and at what latency and cost."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.evaluations = 0
+        self.escalations = 0
+        self.cost_usd = 0.0
+        self.latencies = []
+
+    def record(self, decision: RoutingDecision):
+        with self._lock:
+            self.evaluations += 1
+            self.escalations += decision.escalated
+            self.cost_usd += decision.cost_usd
+            self.latencies.append(decision.latency_s)
+            del self.latencies[:-1000]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "evaluations": self.evaluations,
+                "escalations": self.escalations,
+                "escalation_rate": round(self.escalations / self.evaluations, 3) if self.evaluations else 0.0,
+                "cost_usd": round(self.cost_usd, 4),
+                "p50_latency_s": round(statistics.median(self.latencies), 3) if self.latencies else 0.0,
+            }
+
+ROUTING_STATS = RoutingStats()
+
+@dataclass
+class RoutingPolicy:
+    """Grade with the fast model first; hand borderline results to the strong model."""
+    fast_model: str = FAST_MODEL
+    strong_model: str = MODEL
+    boundary_margin: float = 0.5  # weighted scores this close to a grade boundary are borderline
+    max_spread: int = 4           # ... as are category scores further apart than this
+
+    @property
+    def cache_model(self) -> str:
+        # The evaluation cache key: a routed result may come from either model.
+        return f"{self.fast_model}>{self.strong_model}"
+
+    def escalation_reasons(self, ai_response: str, scores: Optional[Dict[str, Tuple[int, str]]],
+                           categories: dict) -> List[str]:
+        if ai_response.startswith("ERROR"):
+            return ["fast model request failed"]
+        unparsed = failed_categories(scores)
+        if len(unparsed) == len(scores):
+            return ["no category scores could be parsed"]
+
+        reasons = []
+        if unparsed:
+            reasons.append(f"unparsed categories: {', '.join(unparsed)}")
+        weighted = calculate_weighted_score(scores, categories)
+        near = [b for b in GRADE_BOUNDARIES if abs(weighted - b) < self.boundary_margin]
+        if near:
+            reasons.append(f"overall score {weighted} is within {self.boundary_margin} of the {near[0]}/10 boundary")
+        parsed = [score for score, explanation in scores.values() if explanation != UNPARSED_EXPLANATION]
+        if max(parsed) - min(parsed) > self.max_spread:
+            reasons.append(f"category scores range from {min(parsed)} to {max(parsed)}")
+        return reasons
+
+async def route_completion(client: AsyncEvaluationClient, prompt: str, categories: dict,
+                           response_format: Optional[dict] = None, policy: Optional[RoutingPolicy] = None,
+                           repair: Optional[Callable[[dict, str], Awaitable[Tuple[dict, List[str]]]]] = None,
+                           complete: Optional[Callable[..., Awaitable[str]]] = None
+                           ) -> Tuple[str, Optional[EvaluationResult], RoutingDecision]:
+    """One single-pass evaluation through the model tiers; runs on the client's event loop.
+
+    `repair(scores, model)` (see utils.repair) re-asks a model for categories it left unparsed before deciding
+    whether to escalate. `complete(prompt, response_format=, model=, stage=)` makes each model call in place of
+    `client.complete`, e.g. to stream or time it; `stage` is "llm_call" for the fast model and "escalation" for the
+    strong one. Returns the final response, its parsed evaluation (None if the request
+    failed) and the routing decision.
+    """
+    if complete is None:
+        async def complete(prompt: str, response_format: Optional[dict], model: str, stage: str) -> str:
+            return await client.complete(prompt, response_format=response_format, model=model)
+    policy = policy or RoutingPolicy()
+    decision = RoutingDecision()
+    evaluation = None
+    for stage, model in (("llm_call", policy.fast_model), ("escalation", policy.strong_model)):
+        started = time.perf_counter()
+        ai_response = await complete(prompt, response_format=response_format, model=model, stage=stage)
+        decision.calls.append(model_call(model, prompt, ai_response, time.perf_counter() - started))
+        evaluation = None if ai_response.startswith("ERROR") else parse_evaluation(ai_response, categories)
+        if evaluation and evaluation.failed_categories and repair:
+            evaluation.scores, evaluation.repaired = await repair(evaluation.scores, model)
+            evaluation.failed_categories = failed_categories(evaluation.scores)
+        if model == policy.strong_model:
+            break
+        decision.reasons = policy.escalation_reasons(ai_response, evaluation and evaluation.scores, categories)
+        if not decision.reasons:
+            break
+    ROUTING_STATS.record(decision)
+    return ai_response, evaluation, decision
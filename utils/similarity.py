@@ -0,0 +1,217 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from utils.cache import CACHE_DIR, SQLiteStore
+
+# MinHash signatures over word 5-grams. 16 LSH bands of 8 rows make pairs from ~0.7 Jaccard upward likely
+# candidates (1 - (1 - s^8)^16 is 0.5 at s = 0.7 and 0.996 at s = 0.9); candidates are then checked on
+# the full signature.
+NUM_PERM = 128
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERM // LSH_BANDS
+SHINGLE_WORDS = 5
+# Reported as similar at this estimated Jaccard similarity; an evaluation is reused at the higher one.
+SIMILAR_THRESHOLD = 0.8
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("SCORESCOPE_NEAR_DUPLICATE_THRESHOLD", "0.9"))
+MAX_CANDIDATES = 500
+# Buckets larger than this (a shared template, say) are checked against their first member only in clusters().
+MAX_PAIRWISE_BUCKET = 200
+
+# Permutations are (a * h + b) mod p over 32-bit shingle hashes; with a, b < 2^31 that never overflows uint64.
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+# Fixed seed: signatures must agree across processes and restarts to be comparable.
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, 1 << 31, NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, 1 << 31, NUM_PERM, dtype=np.uint64)
+_SHINGLE_BATCH = 4096
+
+_PAGE_MARKER = re.compile(r"^--- Page \d+ ---$", re.MULTILINE)
+_WORD = re.compile(r"\w+")
+
+def shingle_hashes(text: str) -> np.ndarray:
+    """32-bit hashes of the distinct word 5-grams, ignoring case, punctuation, layout and page markers."""
+    words = _WORD.findall(_PAGE_MARKER.sub(" ", text).lower())
+    if len(words) < SHINGLE_WORDS:
+        grams = {" ".join(words)} if words else set()
+    else:
+        grams = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    return np.fromiter((zlib.crc32(gram.encode("utf-8")) for gram in grams), dtype=np.uint64, count=len(grams))
+
+def minhash(text: str) -> Optional[np.ndarray]:
+    """The MinHash signature of `text` (NUM_PERM uint32 values), or None if it has no words."""
+    hashes = shingle_hashes(text)
+    if not len(hashes):
+        return None
+    signature = np.full(NUM_PERM, _MAX_HASH, dtype=np.uint64)
+    # Batched so a very long document never needs a (shingles x permutations) matrix all at once.
+    for start in range(0, len(hashes), _SHINGLE_BATCH):
+        batch = hashes[start:start + _SHINGLE_BATCH, None]
+        permuted = ((batch * _PERM_A + _PERM_B) % _MERSENNE_PRIME) & _MAX_HASH
+        np.minimum(signature, permuted.min(axis=0), out=signature)
+    return signature.astype(np.uint32)
+
+def estimate_similarity(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+def _band_buckets(signature: np.ndarray) -> List[int]:
+    # One signed 64-bit bucket id per band, so it fits an SQLite INTEGER.
+    return [int.from_bytes(hashlib.blake2b(band.tobytes(), digest_size=8).digest(), "big", signed=True)
+            for band in signature.reshape(LSH_BANDS, LSH_ROWS)]
+
+class SimilarityIndex(SQLiteStore):
+    """Persistent MinHash LSH index of extracted submissions, partitioned by cohort (task and rubric)."""
+
+    def __init__(self, path: Path = CACHE_DIR / "similarity.sqlite"):
+        super().__init__(path)
+
+    def _create_tables(self, conn: sqlite3.Connection):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS signatures (
+                cohort TEXT NOT NULL,
+                file_hash TEXT NOT NULL,
+                label TEXT NOT NULL,
+                signature BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (cohort, file_hash)
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS buckets (
+                cohort TEXT NOT NULL,
+                band INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                file_hash TEXT NOT NULL,
+                PRIMARY KEY (cohort, band, bucket, file_hash)
+            ) WITHOUT ROWID
+        """)
+
+    def add(self, cohort: str, file_hash: str, signature: np.ndarray, label: str = "") -> bool:
+        return self.add_many(cohort, [(file_hash, signature, label)]) == 1
+
+    def add_many(self, cohort: str, entries: Iterable[Tuple[str, np.ndarray, str]]) -> int:
+        """Index (file_hash, signature, label) entries; files already in the cohort are skipped. Returns how many were new."""
+        now = time.time()
+        rows, bucket_rows = [], []
+        for file_hash, signature, label in entries:
+            blob = signature.astype(np.uint32).tobytes()
+            rows.append((cohort, file_hash, label, blob, len(blob), now))
+            bucket_rows.extend((cohort, band, bucket, file_hash) for band, bucket in enumerate(_band_buckets(signature)))
+        with self._lock, self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany("INSERT OR IGNORE INTO signatures VALUES (?, ?, ?, ?, ?, ?)", rows)
+            added = conn.total_changes - before
+            if added:
+                conn.executemany("INSERT OR IGNORE INTO buckets VALUES (?, ?, ?, ?)", bucket_rows)
+        return added
+
+    def query(self, cohort: str, signature: np.ndarray, threshold: float = SIMILAR_THRESHOLD,
+              exclude: Optional[str] = None) -> List[Tuple[str, str, float]]:
+        """(file_hash, label, estimated similarity) of indexed submissions at least `threshold` similar, best first."""
+        params = [value for band, bucket in enumerate(_band_buckets(signature)) for value in (band, bucket)]
+        # Joined from a list of (band, bucket) pairs so each is a primary-key lookup; an OR of them scans the cohort.
+        with self._connect() as conn:
+            candidates = [row[0] for row in conn.execute(
+                f"WITH wanted(band, bucket) AS (VALUES {', '.join(['(?, ?)'] * LSH_BANDS)}) "
+                "SELECT DISTINCT b.file_hash FROM wanted CROSS JOIN buckets b "
+                "ON b.cohort = ? AND b.band = wanted.band AND b.bucket = wanted.bucket LIMIT ?",
+                (*params, cohort, MAX_CANDIDATES)
+            ) if row[0] != exclude]
+            if not candidates:
+                return []
+            rows = conn.execute(
+                f"SELECT file_hash, label, signature FROM signatures WHERE cohort = ? AND file_hash IN "
+                f"({', '.join('?' * len(candidates))})", (cohort, *candidates)
+            ).fetchall()
+        matches = [(file_hash, label, estimate_similarity(signature, np.frombuffer(blob, dtype=np.uint32)))
+                   for file_hash, label, blob in rows]
+        return sorted((m for m in matches if m[2] >= threshold), key=lambda m: m[2], reverse=True)
+
+    def clusters(self, cohort: str, threshold: float = SIMILAR_THRESHOLD) -> List[List[Dict[str, object]]]:
+        """Groups of submissions in a cohort linked by pairwise similarity >= threshold, largest first.
+
+        Each member is {"file_hash", "label", "similarity"}, the similarity being to the cluster's first member.
+        """
+        with self._connect() as conn:
+            groups = [members.split(",") for members, in conn.execute(
+                "SELECT group_concat(file_hash) FROM buckets WHERE cohort = ? GROUP BY band, bucket HAVING COUNT(*) > 1",
+                (cohort,)
+            )]
+            if not groups:
+                return []
+            wanted = sorted({file_hash for group in groups for file_hash in group})
+            signatures, labels = {}, {}
+            for start in range(0, len(wanted), 900):  # under SQLite's bound-parameter limit
+                chunk = wanted[start:start + 900]
+                for file_hash, label, blob in conn.execute(
+                    f"SELECT file_hash, label, signature FROM signatures WHERE cohort = ? AND file_hash IN "
+                    f"({', '.join('?' * len(chunk))})", (cohort, *chunk)
+                ):
+                    signatures[file_hash], labels[file_hash] = np.frombuffer(blob, dtype=np.uint32), label
+
+        parent = {file_hash: file_hash for file_hash in signatures}
+
+        def find(x: str) -> str:
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for group in {tuple(sorted(group)) for group in groups}:
+            matrix = np.stack([signatures[file_hash] for file_hash in group])
+            if len(group) <= MAX_PAIRWISE_BUCKET:
+                similar = (matrix[:, None, :] == matrix[None, :, :]).mean(axis=2) >= threshold
+            else:
+                similar = np.zeros((len(group), len(group)), dtype=bool)
+                similar[0] = (matrix == matrix[0]).mean(axis=1) >= threshold
+            for i, j in zip(*np.nonzero(np.triu(similar, 1))):
+                parent[find(group[i])] = find(group[j])
+
+        members: Dict[str, List[str]] = {}
+        for file_hash in signatures:
+            members.setdefault(find(file_hash), []).append(file_hash)
+        result = []
+        for group in sorted((g for g in members.values() if len(g) > 1), key=len, reverse=True):
+            first = signatures[group[0]]
+            result.append([{"file_hash": file_hash, "label": labels[file_hash],
+                            "similarity": round(estimate_similarity(first, signatures[file_hash]), 3)}
+                           for file_hash in group])
+        return result
+
+    def stats(self) -> dict:
+        return self._stats("signatures")
+
+def near_duplicate_evaluation(matches: List[Tuple[str, str, float]],
+                              lookup: Callable[[str], Optional[dict]]) -> Optional[dict]:
+    """The cached evaluation of the most similar match close enough to count as the same submission.
+
+    `lookup` maps a file hash to its cached evaluation; the result also carries the match's file_hash,
+    label and similarity.
+    """
+    for file_hash, label, similarity in matches:
+        if similarity < NEAR_DUPLICATE_THRESHOLD:
+            break
+        cached = lookup(file_hash)
+        if cached:
+            return {**cached, "file_hash": file_hash, "label": label, "similarity": similarity}
+    return None
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+def get_similarity_index() -> SimilarityIndex:
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = SimilarityIndex()
+        return _default_index
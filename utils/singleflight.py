@@ -0,0 +1,52 @@
+import threading
+from concurrent.futures import Future
+from contextlib import nullcontext
+from typing import Callable, ContextManager, Dict, Hashable, Optional, Tuple
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one: the first caller runs, the rest share its result.
+
+    Only calls that overlap in time are coalesced; once the leader finishes the key is free again, so
+    completed results are left to the caches.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable, wait_context: Optional[Callable[[], ContextManager]] = None) -> Tuple[object, bool]:
+        """Return `(result, ran)`, where `ran` is False when the result came from an identical call already in flight.
+
+        A leader's exception is re-raised in every caller that waited on it.
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            with wait_context() if wait_context else nullcontext():
+                return future.result(), False
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, True
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"leaders": self.leaders, "coalesced": self.coalesced, "in_flight": len(self._inflight)}
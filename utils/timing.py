@@ -0,0 +1,72 @@
+import statistics
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+
+class TimingRegistry:
+    """Process-wide rolling window of stage durations, shared by every session."""
+
+    def __init__(self, window: int = 1000):
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._counts = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self._samples[stage].append(seconds)
+            self._counts[stage] += 1
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            samples = {stage: sorted(values) for stage, values in self._samples.items()}
+            counts = dict(self._counts)
+        summary = {}
+        for stage, values in samples.items():
+            summary[stage] = {
+                "count": counts[stage],
+                "mean_s": round(statistics.fmean(values), 4),
+                "p50_s": round(values[len(values) // 2], 4),
+                "p95_s": round(values[min(len(values) - 1, int(len(values) * 0.95))], 4),
+                "max_s": round(values[-1], 4),
+            }
+        return summary
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+
+TIMINGS = TimingRegistry()
+
+class StageTimer:
+    """Times the stages of one analysis and reports each one to a registry as it finishes.
+
+    Pass an analysis's existing `durations` to time further stages of it, such as rendering its results.
+    """
+
+    def __init__(self, registry: TimingRegistry = TIMINGS, on_stage: Optional[Callable[[str], None]] = None,
+                 durations: Optional[Dict[str, float]] = None):
+        self.registry = registry
+        self.on_stage = on_stage
+        self.durations = {} if durations is None else durations
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        if self.on_stage:
+            self.on_stage(name)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.durations[name] = self.durations.get(name, 0.0) + elapsed
+            self.registry.record(name, elapsed)
+
+    @property
+    def total(self) -> float:
+        return sum(self.durations.values())
+
+    def as_dict(self) -> Dict[str, float]:
+        return {name: round(seconds, 4) for name, seconds in self.durations.items()}
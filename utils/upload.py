@@ -0,0 +1,102 @@
+import hashlib
+import io
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import BinaryIO, Optional, Union
+
+# Uploads of at least this size are spooled to a temp file that PyMuPDF opens by path, rather than kept in memory.
+SPOOL_THRESHOLD = int(os.getenv("SCORESCOPE_SPOOL_MB", "32")) * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+
+@dataclass
+class Upload:
+    """An ingested upload: its content hash and either its bytes or the path of a spooled copy."""
+    file_hash: str
+    size: int
+    data: Optional[bytes] = None
+    path: Optional[str] = None
+
+    @property
+    def source(self) -> Union[bytes, str]:
+        # What utils.pdf opens: the spooled file's path, or the bytes themselves
+        return self.path or self.data
+
+    def close(self):
+        if self.path:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+        self.data = self.path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def hash_path(path: str) -> str:
+    """MD5 of a file on disk, read in chunks; a file that is already on disk needs no spooling."""
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def ingest_upload(file: Union[bytes, BinaryIO], spool_threshold: int = SPOOL_THRESHOLD) -> Upload:
+    """Read an upload once, hashing it on the way and spooling it to disk if it is large.
+
+    Accepts bytes, a BytesIO (such as Streamlit's UploadedFile) or any readable binary stream.
+    """
+    if isinstance(file, io.BytesIO):
+        # getvalue() shares an unmodified BytesIO's buffer; getbuffer() would force a private copy of it.
+        file = file.getvalue()
+    if isinstance(file, (bytes, bytearray)):
+        return _ingest_buffer(file, spool_threshold)
+    return _ingest_stream(file, spool_threshold)
+
+def _ingest_buffer(data: bytes, spool_threshold: int) -> Upload:
+    if len(data) < spool_threshold:
+        return Upload(hashlib.md5(data).hexdigest(), len(data), data=bytes(data))
+
+    digest = hashlib.md5()
+    view = memoryview(data)
+    with tempfile.NamedTemporaryFile(prefix="scorescope-", suffix=".pdf", delete=False) as spool:
+        # One pass over zero-copy slices feeds both the hash and the spool file.
+        for offset in range(0, len(view), CHUNK_SIZE):
+            chunk = view[offset:offset + CHUNK_SIZE]
+            digest.update(chunk)
+            spool.write(chunk)
+    return Upload(digest.hexdigest(), len(data), path=spool.name)
+
+def _ingest_stream(stream: BinaryIO, spool_threshold: int) -> Upload:
+    if stream.seekable():
+        stream.seek(0)
+    digest = hashlib.md5()
+    chunks, size, spool = [], 0, None
+    try:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            size += len(chunk)
+            if spool is None and size >= spool_threshold:
+                spool = tempfile.NamedTemporaryFile(prefix="scorescope-", suffix=".pdf", delete=False)
+                spool.writelines(chunks)
+                chunks = []
+            if spool is None:
+                chunks.append(chunk)
+            else:
+                spool.write(chunk)
+    except BaseException:
+        if spool is not None:
+            spool.close()
+            os.unlink(spool.name)
+        raise
+
+    if spool is None:
+        return Upload(digest.hexdigest(), size, data=b"".join(chunks))
+    spool.close()
+    return Upload(digest.hexdigest(), size, path=spool.name)
@@ -1,8 +1,77 @@
+import hashlib
+import html
+import json
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, List, Optional, Tuple
 
 import plotly.graph_objects as go
-import pandas as pd
 
-def create_enhanced_radar_chart(scores: dict) -> go.Figure:
+FIGURE_CACHE_SIZE = 256
+
+class _FigureCache:
+    """Bounded LRU of built figures, keyed by a hash of the data they plot; JSON is serialized on first request."""
+
+    def __init__(self, max_entries: int = FIGURE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(kind: str, *data) -> str:
+        payload = json.dumps([kind, *data], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _entry(self, key: str, build: Callable[[], go.Figure]) -> list:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        # Built outside the lock; two threads racing on a new key just build the same figure twice.
+        entry = [build(), None]
+        with self._lock:
+            entry = self._entries.setdefault(key, entry)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def figure(self, key: str, build: Callable[[], go.Figure]) -> go.Figure:
+        return self._entry(key, build)[0]
+
+    def json(self, key: str, build: Callable[[], go.Figure]) -> str:
+        entry = self._entry(key, build)
+        if entry[1] is None:
+            entry[1] = entry[0].to_json()
+        return entry[1]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+FIGURES = _FigureCache()
+
+def _radar_key(scores: dict, benchmark: Optional[dict], benchmark_label: str) -> str:
+    # Explanations never reach the chart, so they stay out of the key.
+    return FIGURES.key("radar", [[cat, value[0]] for cat, value in scores.items()],
+                       sorted(benchmark.items()) if benchmark else None, benchmark_label)
+
+def create_enhanced_radar_chart(scores: dict, benchmark: dict = None, benchmark_label: str = "Target Score") -> go.Figure:
+    """Memoized on the plotted values: the returned figure may be shared, so callers must not modify it."""
+    return FIGURES.figure(_radar_key(scores, benchmark, benchmark_label),
+                          lambda: _build_radar_chart(scores, benchmark, benchmark_label))
+
+def radar_chart_json(scores: dict, benchmark: dict = None, benchmark_label: str = "Target Score") -> str:
+    return FIGURES.json(_radar_key(scores, benchmark, benchmark_label),
+                        lambda: _build_radar_chart(scores, benchmark, benchmark_label))
+
+def _build_radar_chart(scores: dict, benchmark: Optional[dict], benchmark_label: str) -> go.Figure:
     categories_list = list(scores.keys())
     values = [scores[cat][0] for cat in categories_list]
 
@@ -17,11 +86,12 @@ def create_enhanced_radar_chart(scores: dict) -> go.Figure:
         fillcolor='rgba(102, 126, 234, 0.3)'
     ))
 
-    benchmark = [7] * len(categories_list)
+    # Cohort percentiles when the caller has them, otherwise a fixed target of 7
+    benchmark_values = [benchmark[cat] for cat in categories_list] if benchmark else [7] * len(categories_list)
     fig.add_trace(go.Scatterpolar(
-        r=benchmark,
+        r=benchmark_values,
         theta=categories_list,
-        name='Target Score',
+        name=benchmark_label,
         line=dict(color='#28a745', width=2, dash='dash'),
         fill=None
     ))
@@ -51,17 +121,24 @@ def create_enhanced_radar_chart(scores: dict) -> go.Figure:
     return fig
 
 def create_score_history_chart(score_history: list) -> go.Figure:
+    """Memoized on the history data, like the radar chart."""
     if not score_history:
         return None
+    return FIGURES.figure(FIGURES.key("history", score_history), lambda: _build_score_history_chart(score_history))
 
+def _build_score_history_chart(score_history: list) -> go.Figure:
+    import pandas as pd  # only needed once there is history to plot; Streamlit itself never loads it
+
+    # Accepts a list of records or a dict of columns; a `submission` column numbers downsampled points.
     df = pd.DataFrame(score_history)
+    x = df.pop('submission') if 'submission' in df.columns else df.index
 
     fig = go.Figure()
 
     for column in df.columns:
         if column != 'timestamp':
             fig.add_trace(go.Scatter(
-                x=df.index,
+                x=x,
                 y=df[column],
                 mode='lines+markers',
                 name=column,
@@ -78,3 +155,39 @@ def create_score_history_chart(score_history: list) -> go.Figure:
     )
 
     return fig
+
+def _radar_json_worker(item: Tuple[dict, Optional[dict], str]) -> str:
+    return radar_chart_json(*item)
+
+def render_radar_charts(results: Iterable[dict], benchmark: dict = None, benchmark_label: str = "Target Score",
+                        max_workers: Optional[int] = None) -> List[str]:
+    """Radar chart JSON for many results at once, built across a process pool.
+
+    `results` are `{category: score}` mappings (or the app's `{category: (score, explanation)}` form).
+    Figure construction is CPU-bound Python, so bulk work runs out of process rather than on threads.
+    """
+    items = [
+        ({cat: value if isinstance(value, (tuple, list)) else (value, "") for cat, value in scores.items()},
+         benchmark, benchmark_label)
+        for scores in results
+    ]
+    if len(items) < 2 or max_workers == 1:
+        return [_radar_json_worker(item) for item in items]
+    # Spawned rather than forked, as in utils.pdf, so workers never inherit the LLM loop or Streamlit threads.
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return list(pool.map(_radar_json_worker, items, chunksize=max(1, len(items) // 32)))
+
+def write_chart_report(path: str, charts: Iterable[Tuple[str, str]], title: str = "ScoreScope Charts"):
+    """Write (heading, figure JSON) pairs to one static HTML page that loads plotly.js once."""
+    from plotly.offline import get_plotlyjs_version
+
+    plotly_js = f"https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>{html.escape(title)}</title>"
+                f"<script src=\"{plotly_js}\"></script></head><body>\n<h1>{html.escape(title)}</h1>\n")
+        for i, (heading, figure_json) in enumerate(charts):
+            # JSON may legally contain "</", which would end the script element early.
+            payload = figure_json.replace("</", "<\\/")
+            f.write(f"<h2>{html.escape(heading)}</h2><div id=\"chart-{i}\"></div>\n"
+                    f"<script>(function(f){{Plotly.newPlot(\"chart-{i}\", f.data, f.layout);}})({payload});</script>\n")
+        f.write("</body></html>\n")